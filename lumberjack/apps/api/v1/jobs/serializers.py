@@ -15,6 +15,16 @@ class JobSerializer(serializers.ModelSerializer):
     def validate(self, attrs):
         if not attrs.get("template") and not attrs.get("settings"):
             raise serializers.ValidationError("Must include either Job Settings or Template")
+
+        settings = (attrs["template"].settings if attrs.get("template") else attrs["settings"]) or {}
+        output_names = [output.get("name") for output in settings.get("outputs", [])]
+        if settings.get("shared_audio") and Job.AUDIO_OUTPUT_NAME in output_names:
+            raise serializers.ValidationError(
+                "Output name {} is reserved for the shared audio".format(Job.AUDIO_OUTPUT_NAME)
+            )
+        if settings.get("progressive") and settings.get("execution_mode", Job.PER_OUTPUT) != Job.PER_OUTPUT:
+            # Playlists are only published while they are transcoded by a task of their own.
+            raise serializers.ValidationError("Progressive publishing is only supported with the per_output mode")
         return attrs
 
     class Meta:
@@ -28,6 +38,7 @@ class JobSerializer(serializers.ModelSerializer):
             "encryption_key",
             "key_url",
             "meta_data",
+            "deadline",
             "id",
             "status",
             "start_time",
@@ -0,0 +1,108 @@
+import os
+import shutil
+import time
+
+from django.conf import settings
+
+from .base import BaseThreadExecutor, Status
+
+
+def get_free_disk_space():
+    try:
+        return shutil.disk_usage(settings.TRANSCODED_VIDEOS_PATH).free
+    except FileNotFoundError:
+        return None
+
+
+def is_disk_available():
+    """Tells whether the node has enough free disk space left to admit another output."""
+    free_space = get_free_disk_space()
+    return free_space is None or free_space >= settings.TRANSCODER_MIN_FREE_DISK
+
+
+def get_directory_size(directory):
+    size = 0
+    for root, _, files in os.walk(directory):
+        for file_name in files:
+            if file_name.endswith(".tmp"):
+                # Still being written by ffmpeg, it can't be uploaded yet.
+                continue
+            try:
+                size += os.stat(os.path.join(root, file_name)).st_size
+            except FileNotFoundError:
+                # Uploaded and removed in the meantime.
+                continue
+    return size
+
+
+class DiskBackPressure(BaseThreadExecutor):
+    """Pauses ffmpeg while the files of its outputs which are waiting to be uploaded pile up on the disk.
+
+    ffmpeg is stopped with SIGSTOP once the backlog of the job grows over UPLOAD_BACKLOG_LIMIT, or once the disk
+    runs low on space while the job has a backlog of its own, and is continued with SIGCONT once the uploaders
+    have caught up on a quarter of it, or have drained it whatever the disk space held by others. It is always
+    continued when stopped, so that it can be terminated. Uploads which don't catch up within TRANSCODER_MAX_PAUSE
+    seconds fail the output rather than leave ffmpeg stopped.
+    """
+
+    RESUME_RATIO = 0.75
+
+    def __init__(self, local_paths, transcoder):
+        super().__init__(thread_name="backpressure", continue_on_exception=True)
+        self.local_paths = local_paths
+        self.transcoder = transcoder
+        self.backlog_limit = settings.UPLOAD_BACKLOG_LIMIT
+        self.min_free_space = settings.TRANSCODER_MIN_FREE_DISK
+        self.max_pause = settings.TRANSCODER_MAX_PAUSE
+        self.is_paused = False
+        self.pause_time = None
+        self.pauses = 0
+        self.paused_duration = 0.0
+        self.max_backlog = 0
+
+    @property
+    def metrics(self):
+        return {
+            "upload_backlog_max_bytes": self.max_backlog,
+            "transcoder_pauses": self.pauses,
+            "transcoder_paused_time": round(self.paused_duration, 3),
+        }
+
+    def run(self):
+        backlog = sum(get_directory_size(path) for path in self.local_paths)
+        self.max_backlog = max(self.max_backlog, backlog)
+        free_space = get_free_disk_space()
+
+        if self.is_paused:
+            if self.has_caught_up(backlog, free_space):
+                self.resume()
+            elif time.time() - self.pause_time > self.max_pause:
+                self._status = Status.Errored
+        elif self.is_behind(backlog, free_space):
+            self.pause()
+
+    def is_behind(self, backlog, free_space):
+        is_disk_low = free_space is not None and free_space < self.min_free_space
+        return backlog > self.backlog_limit or (is_disk_low and backlog > 0)
+
+    def has_caught_up(self, backlog, free_space):
+        if backlog == 0:
+            # Waiting any longer won't free the space held by the cache or other jobs.
+            return True
+        is_disk_low = free_space is not None and free_space * self.RESUME_RATIO < self.min_free_space
+        return backlog <= self.backlog_limit * self.RESUME_RATIO and not is_disk_low
+
+    def pause(self):
+        if self.transcoder.pause():
+            self.is_paused = True
+            self.pause_time = time.time()
+            self.pauses += 1
+
+    def resume(self):
+        self.transcoder.resume()
+        self.is_paused = False
+        self.paused_duration += time.time() - self.pause_time
+
+    def post_stop(self):
+        if self.is_paused:
+            self.resume()
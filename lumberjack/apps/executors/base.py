@@ -57,7 +57,14 @@ class BaseProcessExecutor(BaseExecutor):
 
     def start(self):
         self.pre_start()
-        self._process = self.create_process(self.get_process_command(), stdout=self.STDOUT, stderr=self.STDERR)
+        self._process = self.create_process(
+            self.get_process_command(),
+            stdin=self.get_stdin(),
+            stdout=self.STDOUT,
+            stderr=self.STDERR,
+            preexec_fn=self.get_preexec_fn(),
+            pass_fds=self.get_pass_fds(),
+        )
         self.post_start()
 
     def pre_start(self):
@@ -70,7 +77,18 @@ class BaseProcessExecutor(BaseExecutor):
     def post_start(self):
         pass
 
-    def create_process(self, args, stdout=None, stderr=None, shell=False):
+    def get_stdin(self):
+        return subprocess.DEVNULL
+
+    def get_preexec_fn(self):
+        return None
+
+    def get_pass_fds(self):
+        return ()
+
+    def create_process(
+        self, args, stdin=subprocess.DEVNULL, stdout=None, stderr=None, shell=False, preexec_fn=None, pass_fds=()
+    ):
         """A central point to create subprocesses, so that we can debug the
         command-line arguments.
 
@@ -79,6 +97,9 @@ class BaseProcessExecutor(BaseExecutor):
                 is True; the command line of the subprocess.
           shell: If true, args must be a single string, which will be executed as a
                  shell command.
+          stdin: File descriptor the subprocess reads its input from.
+          preexec_fn: Called in the child process just before the command is executed.
+          pass_fds: File descriptors kept open in the subprocess, under the same numbers.
         Returns:
           The Popen object of the subprocess.
         """
@@ -90,10 +111,12 @@ class BaseProcessExecutor(BaseExecutor):
 
         return subprocess.Popen(
             command,
-            stdin=subprocess.DEVNULL,
+            stdin=stdin,
             stdout=stdout,
             stderr=stderr,
             shell=shell,
+            preexec_fn=preexec_fn,
+            pass_fds=pass_fds,
             universal_newlines=True,
         )
 
@@ -130,6 +153,9 @@ class BaseThreadExecutor(BaseExecutor):
     """A base class for nodes that run a thread.
     The thread repeats some callback in a background thread.
     """
+    # Seconds to wait between calls of the callback.
+    interval = 1
+
     def __init__(self, thread_name: str, continue_on_exception: bool):
         super().__init__()
         self._status = Status.Not_Started
@@ -152,7 +178,7 @@ class BaseThreadExecutor(BaseExecutor):
                     return
 
             # Yield time to other threads.
-            time.sleep(1)
+            time.sleep(self.interval)
 
     @abc.abstractmethod
     def run(self):
@@ -12,20 +12,81 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import os
+import time
+
+from apps.ffmpeg.bandwidth import open_upload_limiter
 from apps.ffmpeg.outputs import OutputFileFactory
 from .base import Status, BaseThreadExecutor
+from .watcher import DirectoryWatcher
 
 
 class CloudUploader(BaseThreadExecutor):
-    def __init__(self, input_dir: str, url: str):
+    """Uploads the files of a local output directory while they are being written.
+
+    Files are uploaded as soon as inotify reports them as written, and the whole directory is walked only every
+    POLL_INTERVAL seconds, to catch up on files which events were missed for. Without inotify, the directory is
+    walked every second.
+    """
+
+    WAIT_TIMEOUT = 1
+    POLL_INTERVAL = 10
+
+    def __init__(self, input_dir: str, url: str, upload_callback=None, job_id=None):
         super().__init__(thread_name="cloud", continue_on_exception=True)
         self._input_dir: str = input_dir
         self.url: str = url
-        self.output = OutputFileFactory.create(self.url)
+        self.limiter = open_upload_limiter(job_id) if job_id else None
+        self.output = OutputFileFactory.create(self.url, limiter=self.limiter)
+        self.upload_callback = upload_callback
+        self.watcher = None
+        self.last_save_time = 0
+        self.is_watchable = DirectoryWatcher.is_available()
+
+    @property
+    def metrics(self):
+        return dict(self.limiter.metrics if self.limiter else {}, **self.output.metrics)
 
     def run(self):
+        if self.watcher is None or self._status != Status.Running:
+            self.save()
+            self.watch()
+        else:
+            file_paths = self.watcher.wait(self.WAIT_TIMEOUT)
+            if file_paths is None or time.time() - self.last_save_time >= self.POLL_INTERVAL:
+                self.save()
+            elif file_paths:
+                self.output.save_files(self._input_dir, file_paths, is_transcode_completed=False)
+
+        if self.upload_callback:
+            self.upload_callback()
+
+    def save(self):
+        self.last_save_time = time.time()
         self.output.save(self._input_dir, is_transcode_completed=self._status == Status.Finished)
 
+    def watch(self):
+        # The directory is polled like without inotify until the transcoder creates it.
+        if not self.is_watchable or self.watcher is not None or not os.path.isdir(self._input_dir):
+            return
+
+        try:
+            self.watcher = DirectoryWatcher(self._input_dir)
+        except OSError:
+            self.is_watchable = False
+            return
+
+        # Waiting for events takes the place of sleeping between uploads, and the directory is walked once more
+        # for files written before it was watched.
+        self.interval = 0
+        self.last_save_time = 0
+
     def post_stop(self):
         # Perform uploading once at last to upload final manifest file.
-        self.run()
+        try:
+            self.run()
+        finally:
+            if self.watcher is not None:
+                self.watcher.close()
+            if self.limiter is not None:
+                self.limiter.close()
@@ -0,0 +1,91 @@
+import threading
+from typing import Optional
+
+from django.conf import settings
+
+from apps.ffmpeg.inputs import get_input_path
+from apps.ffmpeg.prefetch import (
+    RangedDownloader,
+    PrefetchServer,
+    acquire_prefetched_input,
+    get_prefetch_path,
+    release_prefetched_input,
+)
+from .base import Status, BaseExecutor
+
+
+class InputPrefetcher(BaseExecutor):
+    """Downloads the input of a job to local disk with concurrent ranged requests.
+
+    While the download is in progress, ffmpeg reads the input from a local HTTP server which serves the parts
+    already on disk, so that transcoding starts as soon as the head of the input is downloaded. Inputs are
+    downloaded into the entry of the node's input cache when one is given, along with the lease taken on it,
+    which is released when the executor stops. Otherwise the input is shared by the outputs of the job transcoded
+    on the node, each of which holds a lease on it while it runs, and it is removed once the last of them stops,
+    as no later job reads it.
+    """
+
+    # Seconds to wait for the download to stop once it is cancelled, before the input is removed.
+    STOP_TIMEOUT = 5
+
+    def __init__(self, config, cache_entry=None, lease=None):
+        self._status = Status.Not_Started
+        self.stdin = None
+        self.job_id = config.get("id")
+        self.cache_entry = cache_entry
+        self.lease = lease
+        self.input_lease = None
+        self.downloader = RangedDownloader(
+            get_input_path(config.get("input")),
+            self.cache_entry.path if self.cache_entry else get_prefetch_path(self.job_id),
+            part_size=settings.INPUT_PREFETCH_PART_SIZE,
+            max_workers=settings.INPUT_PREFETCH_CONCURRENCY,
+        )
+        self.server = None if self.downloader.is_downloaded() else PrefetchServer(self.downloader)
+        self._thread = threading.Thread(target=self.download, name="prefetch", daemon=True)
+        self._server_thread = None
+
+    @property
+    def input_url(self):
+        if self.server is None:
+            return self.downloader.path
+        return self.server.url
+
+    def start(self):
+        self._status = Status.Running
+        if self.cache_entry is None:
+            self.input_lease = acquire_prefetched_input(self.job_id)
+        if self.server is not None:
+            self._server_thread = threading.Thread(
+                target=self.server.serve_forever, name="prefetch-server", daemon=True
+            )
+            self._server_thread.start()
+        self._thread.start()
+
+    def download(self):
+        try:
+            if self.cache_entry and not self.cache_entry.is_cached():
+                self.cache_entry.cache.evict(self.cache_entry.size)
+            self.downloader.download()
+        except (IOError, ValueError):
+            self._status = Status.Errored
+
+    def check_status(self) -> Status:
+        return self._status
+
+    def stop(self, status: Optional[Status]) -> None:
+        self.downloader.cancel()
+        if self._server_thread is not None:
+            self.server.shutdown()
+        if self.server is not None:
+            self.server.server_close()
+        if self.lease is not None:
+            self.cache_entry.release(self.lease)
+            self.lease = None
+        if self._status == Status.Running:
+            self._status = Status.Finished
+        if self.input_lease is not None:
+            if self._thread.is_alive():
+                self._thread.join(self.STOP_TIMEOUT)
+            release_prefetched_input(self.job_id, self.input_lease)
+            self.input_lease = None
@@ -0,0 +1,85 @@
+"""Works out the share of the CPUs of a worker node which a single ffmpeg process may use."""
+
+import os
+
+from billiard.process import current_process
+from django.conf import settings
+
+from lumberjack.celery import app
+
+CGROUP_V2_CPU_MAX_PATH = "/sys/fs/cgroup/cpu.max"
+CGROUP_V1_CPU_QUOTA_PATH = "/sys/fs/cgroup/cpu/cpu.cfs_quota_us"
+CGROUP_V1_CPU_PERIOD_PATH = "/sys/fs/cgroup/cpu/cpu.cfs_period_us"
+
+
+def read_first_line(path):
+    try:
+        with open(path) as file:
+            return file.readline().strip()
+    except OSError:
+        return None
+
+
+def get_cpu_quota():
+    """Returns the number of CPUs the cgroup of the worker is allowed to use, or None if it isn't limited."""
+    cpu_max = read_first_line(CGROUP_V2_CPU_MAX_PATH)
+    if cpu_max:
+        quota, _, period = cpu_max.partition(" ")
+    else:
+        quota, period = read_first_line(CGROUP_V1_CPU_QUOTA_PATH), read_first_line(CGROUP_V1_CPU_PERIOD_PATH)
+
+    if not quota or not period or quota in ("max", "-1"):
+        return None
+    return int(quota) / int(period)
+
+
+def get_available_cpus():
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def get_worker_concurrency():
+    # Outside of a worker, like Celery does when the concurrency isn't set.
+    return getattr(settings, "TRANSCODER_CONCURRENCY", None) or app.conf.worker_concurrency or os.cpu_count()
+
+
+def get_worker_index():
+    # Index of the process in the Celery prefork pool, which is None outside of a worker.
+    return getattr(current_process(), "index", None)
+
+
+class CPUBudget(object):
+    """CPUs available to the worker, split evenly between the ffmpeg processes it runs concurrently.
+
+    Thread count is capped by the cgroup quota as well as the CPU affinity of the worker, since ffmpeg
+    otherwise starts a thread per core of the machine even when the worker can only use a few of them.
+    """
+
+    def __init__(self, cpus, quota=None, concurrency=None, pin_cpus=False):
+        self.cpus = cpus
+        self.quota = quota
+        self.concurrency = max(1, concurrency or 1)
+        self.pin_cpus = pin_cpus
+
+    @classmethod
+    def detect(cls):
+        return cls(
+            cpus=get_available_cpus(),
+            quota=get_cpu_quota(),
+            concurrency=get_worker_concurrency(),
+            pin_cpus=getattr(settings, "TRANSCODER_CPU_AFFINITY", False),
+        )
+
+    @property
+    def threads(self):
+        usable_cpus = len(self.cpus) if self.quota is None else min(len(self.cpus), self.quota)
+        return max(1, int(usable_cpus // self.concurrency))
+
+    def get_affinity(self, slot):
+        """Returns the CPUs which the process running in the given pool slot should be pinned to."""
+        if not self.pin_cpus or slot is None:
+            return None
+
+        start = (slot % self.concurrency) * self.threads
+        return self.cpus[start : start + self.threads] or None
@@ -0,0 +1,123 @@
+import os
+import queue
+import threading
+import time
+from typing import Optional
+
+from smart_open import open as smart_open
+
+from django.conf import settings
+
+from apps.ffmpeg.input_options import InputOptionsFactory
+from .base import Status, BaseExecutor
+
+
+class InputStreamer(BaseExecutor):
+    """Streams the input of a job into the stdin of ffmpeg, without storing it on disk.
+
+    A reader thread reads the input through smart_open into a bounded queue, which a writer thread drains into
+    a pipe connected to ffmpeg. When ffmpeg falls behind, the pipe and then the queue fill up and reading stops
+    until there is room again. Only inputs which ffmpeg can decode without seeking, like TS or MP4 with the moov
+    atom at the start, can be streamed.
+    """
+
+    def __init__(self, config):
+        self._status = Status.Not_Started
+        self.url = config.get("input")
+        self.read_size = settings.INPUT_STREAM_READ_SIZE
+        self.buffer = queue.Queue(maxsize=settings.INPUT_STREAM_BUFFER_COUNT)
+        self.stdin, self.pipe = os.pipe()
+        self.is_stopped = False
+        self.bytes_read = 0
+        self.read_time = 0.0
+        self.buffer_waits = 0
+        self.buffer_underruns = 0
+        self.start_time = None
+        self.end_time = None
+        self._reader = threading.Thread(target=self.read, name="stream-reader", daemon=True)
+        self._writer = threading.Thread(target=self.write, name="stream-writer", daemon=True)
+
+    @property
+    def input_url(self):
+        return "pipe:0"
+
+    @property
+    def metrics(self):
+        elapsed_time = ((self.end_time or time.time()) - self.start_time) if self.start_time else 0
+        return {
+            "input_bytes_read": self.bytes_read,
+            # Throughput of the reads alone, which is what the input source can deliver.
+            "input_read_throughput": int(self.bytes_read / self.read_time) if self.read_time else 0,
+            # Throughput of the whole stream, which is held back by ffmpeg once the buffer is full.
+            "input_stream_throughput": int(self.bytes_read / elapsed_time) if elapsed_time else 0,
+            # Times the reader waited for ffmpeg to drain a full buffer, and ffmpeg waited on an empty one.
+            "input_buffer_waits": self.buffer_waits,
+            "input_buffer_underruns": self.buffer_underruns,
+        }
+
+    def start(self):
+        self._status = Status.Running
+        self.start_time = time.time()
+        self._reader.start()
+        self._writer.start()
+
+    def read(self):
+        transport_params = InputOptionsFactory.get(self.url).options
+        try:
+            with smart_open(self.url, "rb", transport_params=transport_params) as stream:
+                while not self.is_stopped:
+                    read_start_time = time.time()
+                    data = stream.read(self.read_size)
+                    self.read_time += time.time() - read_start_time
+                    if not data:
+                        break
+                    self.bytes_read += len(data)
+                    self.put(data)
+        except Exception:
+            # Errors of boto3 and urllib3 are raised through smart_open as well as IOError.
+            # Marked before ffmpeg sees the end of the stream, so that a truncated input isn't taken as finished.
+            self._status = Status.Errored
+        finally:
+            self.end_time = time.time()
+            self.put(None)
+
+    def put(self, data):
+        if self.buffer.full():
+            self.buffer_waits += 1
+        while not self.is_stopped:
+            try:
+                self.buffer.put(data, timeout=1)
+                return
+            except queue.Full:
+                continue
+
+    def write(self):
+        try:
+            while not self.is_stopped:
+                if self.buffer.empty():
+                    self.buffer_underruns += 1
+                try:
+                    data = self.buffer.get(timeout=1)
+                except queue.Empty:
+                    continue
+                if data is None:
+                    break
+                self.write_to_pipe(data)
+        except BrokenPipeError:
+            # ffmpeg exited before reading all of the input, its own status tells whether it failed.
+            pass
+        finally:
+            os.close(self.pipe)
+
+    def write_to_pipe(self, data):
+        view = memoryview(data)
+        while view:
+            view = view[os.write(self.pipe, view) :]
+
+    def check_status(self) -> Status:
+        return self._status
+
+    def stop(self, status: Optional[Status]) -> None:
+        self.is_stopped = True
+        if self._status == Status.Running:
+            self._status = Status.Finished
@@ -14,11 +14,13 @@
 
 """A module that pushes input to ffmpeg to transcode into various formats."""
 
+import os
+import signal
 import subprocess
 
 from django.conf import settings
 
-from apps.ffmpeg.command_generator import CommandGenerator
+from apps.ffmpeg.command_generator import CommandGenerator, LadderCommandGenerator
 from apps.ffmpeg.log_parser import LogParser, ProgressObserver
 from apps.ffmpeg.utils import mkdir
 from .base import PolitelyWaitOnFinishExecutor
@@ -27,29 +29,83 @@ from .base import PolitelyWaitOnFinishExecutor
 class FFMpegTranscoder(PolitelyWaitOnFinishExecutor):
     STDOUT = subprocess.PIPE
     STDERR = subprocess.STDOUT
+    command_generator_class = CommandGenerator
 
-    def __init__(self, config, progress_callback=None):
+    def __init__(self, config, progress_callback=None, stdin=None):
         super().__init__()
         self.config = config
         self.progress_observer = progress_callback
-        self.command = CommandGenerator(config).generate()
+        self.stdin = stdin
         self.event_source = None
+        self.progress_fds = None
+
+    @property
+    def metrics(self):
+        progress = self.event_source.progress if self.event_source else None
+        if progress is None:
+            return {}
+        return {
+            "transcoder_frames": progress.frame,
+            "transcoder_output_bytes": progress.total_size,
+            "transcoder_speed": progress.speed,
+        }
 
     def pre_start(self):
         self.create_output_folder()
+        # ffmpeg writes its progress to a pipe of its own, apart from its log.
+        self.progress_fds = os.pipe()
 
     def get_process_command(self):
-        return self.command
+        progress_url = "pipe:{}".format(self.progress_fds[1])
+        return self.command_generator_class(dict(self.config, progress_url=progress_url)).generate()
+
+    def get_pass_fds(self):
+        return (self.progress_fds[1],)
+
+    def get_stdin(self):
+        if self.stdin is None:
+            return super().get_stdin()
+        return self.stdin
+
+    def get_preexec_fn(self):
+        cpu_affinity = self.config.get("cpu_affinity")
+        if not cpu_affinity:
+            return None
+        return lambda: os.sched_setaffinity(0, cpu_affinity)
 
     def post_start(self):
-        self.event_source = LogParser(self._process)
+        if self.stdin is not None:
+            # ffmpeg has its own copy of the pipe now, closing ours lets the writer see it exit.
+            os.close(self.stdin)
+        progress_read_fd, progress_write_fd = self.progress_fds
+        os.close(progress_write_fd)
+        self.event_source = LogParser(self._process, os.fdopen(progress_read_fd), self.duration)
         self.register_observers()
         self.event_source.start()
 
+    @property
+    def duration(self):
+        chunk = self.config.get("chunk")
+        if chunk:
+            return chunk["duration"]
+        return (self.config.get("probe") or {}).get("duration")
+
     def create_output_folder(self):
         output = self.config.get("output")
         path = "{}/{}/{}".format(settings.TRANSCODED_VIDEOS_PATH, self.config.get("id"), output.get("name"))
         mkdir(path)
+        mkdir(os.path.dirname(self.command_generator_class(self.config).output_path))
+
+    def pause(self):
+        """Stops ffmpeg where it is until resume() is called, returning whether it was running."""
+        if self._process is None or self._process.poll() is not None:
+            return False
+        self._process.send_signal(signal.SIGSTOP)
+        return True
+
+    def resume(self):
+        if self._process is not None and self._process.poll() is None:
+            self._process.send_signal(signal.SIGCONT)
 
     def post_stop(self):
         if self.event_source:
@@ -59,3 +115,12 @@ class FFMpegTranscoder(PolitelyWaitOnFinishExecutor):
         if self.progress_observer:
             observer = ProgressObserver(self.progress_observer)
             self.event_source.register(observer)
+
+
+class LadderTranscoder(FFMpegTranscoder):
+    command_generator_class = LadderCommandGenerator
+
+    def create_output_folder(self):
+        for output in self.config.get("outputs"):
+            path = "{}/{}/{}".format(settings.TRANSCODED_VIDEOS_PATH, self.config.get("id"), output.get("name"))
+            mkdir(path)
@@ -0,0 +1,54 @@
+import threading
+
+from apps.ffmpeg.bandwidth import open_upload_limiter
+from apps.ffmpeg.outputs import OutputFileFactory
+from apps.ffmpeg.upload_proxy import UploadProxyServer
+from .base import Status, BaseThreadExecutor
+
+
+class UploadProxy(BaseThreadExecutor):
+    """Serves the endpoint which ffmpeg writes the files of its outputs to, saving them straight to storage.
+
+    The executor thread watches for errors of the server and calls upload_callback with the paths of the files
+    saved so far whenever a playlist was written, so that the callback never runs on the threads of the server.
+    """
+
+    def __init__(self, local_path, outputs, upload_callback=None, job_id=None):
+        super().__init__(thread_name="upload-proxy", continue_on_exception=True)
+        self.limiter = open_upload_limiter(job_id) if job_id else None
+        storages = {
+            output["name"]: OutputFileFactory.create(output["url"], limiter=self.limiter) for output in outputs
+        }
+        self.server = UploadProxyServer(local_path, storages)
+        self.upload_callback = upload_callback
+        self.playlist_updates = 0
+        self._server_thread = threading.Thread(
+            target=self.server.serve_forever, name="upload-proxy-server", daemon=True
+        )
+
+    @property
+    def url(self):
+        return self.server.url
+
+    @property
+    def metrics(self):
+        return self.limiter.metrics if self.limiter else {}
+
+    def start(self):
+        self._server_thread.start()
+        super().start()
+
+    def run(self):
+        if self.server.error is not None:
+            self._status = Status.Errored
+
+        if self.upload_callback and self.server.playlist_updates != self.playlist_updates:
+            self.playlist_updates = self.server.playlist_updates
+            self.upload_callback(self.server.saved_files)
+
+    def post_stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.run()
+        if self.limiter is not None:
+            self.limiter.close()
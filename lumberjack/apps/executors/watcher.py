@@ -0,0 +1,98 @@
+"""Watches a directory for files which are completely written, using Linux inotify through libc."""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+
+EVENT_HEADER = struct.Struct("iIII")
+READ_SIZE = 64 * 1024
+
+
+def load_libc():
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+    except OSError:
+        return None
+    return libc if hasattr(libc, "inotify_init1") else None
+
+
+libc = load_libc()
+
+
+class DirectoryWatcher(object):
+    """Reports files of a directory and its subdirectories as soon as they are closed after writing or moved in.
+
+    Segments written by ffmpeg with the temp_file flag show up as moved in, while playlists and keys show up
+    as closed after writing. wait() returns None instead of paths when events were lost because the queue of
+    the kernel overflowed, in which case the whole directory has to be looked at again.
+    """
+
+    MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.directories = {}
+        self.add_watch(directory)
+
+    @staticmethod
+    def is_available():
+        return libc is not None
+
+    def add_watch(self, directory):
+        watch = libc.inotify_add_watch(self.fd, os.fsencode(directory), self.MASK)
+        if watch < 0:
+            raise OSError(ctypes.get_errno(), "inotify_add_watch failed", directory)
+        self.directories[watch] = directory
+        for entry in os.scandir(directory):
+            if entry.is_dir() and entry.path not in self.directories.values():
+                self.add_watch(entry.path)
+
+    def wait(self, timeout):
+        """Returns paths of the files which were written within timeout seconds, waiting for at least one event."""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+
+        try:
+            data = os.read(self.fd, READ_SIZE)
+        except BlockingIOError:
+            return []
+        return self.parse_events(data)
+
+    def parse_events(self, data):
+        paths = []
+        offset = 0
+        while offset < len(data):
+            watch, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset : offset + length].rstrip(b"\0"))
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                return None
+            if watch not in self.directories:
+                continue
+
+            path = os.path.join(self.directories[watch], name)
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    self.add_watch(path)
+            elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO) and path not in paths:
+                paths.append(path)
+        return paths
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
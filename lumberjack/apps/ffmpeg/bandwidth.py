@@ -0,0 +1,199 @@
+"""Shares the upload bandwidth of a node between the jobs uploading on it.
+
+Every upload of a job goes through the BandwidthLimiter of the job, which is shared by all the storages of the job
+within the worker process. The UploadScheduler splits the bandwidth of the node evenly between the jobs which are
+uploading, and the share of a job evenly between the worker processes uploading for it.
+
+Only uploads are budgeted. Downloads of inputs, whether prefetched or streamed to ffmpeg, share the link of the node
+without going through the limiter, so the budget should leave them room when inputs are read while jobs upload.
+"""
+
+import collections
+import contextlib
+import heapq
+import itertools
+import os
+import re
+import threading
+import time
+
+from django.conf import settings
+
+from apps.ffmpeg.utils import mkdir
+from .cache import is_process_alive
+
+lock = threading.Lock()
+limiters = {}
+
+SEGMENT_NUMBER = re.compile(r"(\d+)\.\w+$")
+
+
+def get_upload_priority(path):
+    """Returns the priority of a file, lowest first: playlists and keys come first, then segments in order."""
+    match = SEGMENT_NUMBER.search(path)
+    if path.endswith(".m3u8") or not match:
+        return -1
+    return int(match.group(1))
+
+
+def get_upload_scheduler():
+    return UploadScheduler(settings.UPLOAD_SCHEDULER_PATH, settings.UPLOAD_BANDWIDTH_LIMIT)
+
+
+def open_upload_limiter(job_id):
+    """Returns the limiter of a job, which has to be closed by every user once they are done uploading."""
+    with lock:
+        if job_id not in limiters:
+            limiters[job_id] = BandwidthLimiter(job_id, get_upload_scheduler())
+        limiter = limiters[job_id]
+        limiter.users += 1
+        return limiter
+
+
+class UploadScheduler(object):
+    """Splits the upload bandwidth of the node evenly between the jobs which are uploading on it.
+
+    The share of a job is split again between the worker processes uploading for it, as each of them holds a
+    BandwidthLimiter of its own, like the outputs of a job which are transcoded by separate tasks.
+
+    Like the input cache, it is shared by the worker processes of the node through a directory. Every job which
+    is uploading holds a lease in it, named after the job and the process, which is touched while it uploads.
+    Leases untouched for IDLE_TIMEOUT seconds, or held by processes which are gone, are removed.
+    """
+
+    IDLE_TIMEOUT = 5
+
+    def __init__(self, directory, bandwidth):
+        self.directory = directory
+        self.bandwidth = bandwidth
+
+    @property
+    def is_enabled(self):
+        return bool(self.bandwidth)
+
+    def get_lease_path(self, job_id):
+        return os.path.join(self.directory, "{}-{}".format(job_id, os.getpid()))
+
+    def get_share(self, job_id):
+        """Renews the lease of the process and returns its share of the bandwidth, in bytes per second."""
+        mkdir(self.directory)
+        with open(self.get_lease_path(job_id), "a"):
+            os.utime(self.get_lease_path(job_id))
+        jobs = self.get_uploading_jobs()
+        return self.bandwidth / max(1, len(jobs)) / max(1, jobs.get(str(job_id), 0))
+
+    def get_uploading_jobs(self):
+        """Returns the number of processes uploading for every job."""
+        jobs = collections.Counter()
+        idle_time = time.time() - self.IDLE_TIMEOUT
+        for lease in os.listdir(self.directory):
+            job_id, _, pid = lease.rpartition("-")
+            path = os.path.join(self.directory, lease)
+            with contextlib.suppress(FileNotFoundError):
+                if os.path.getmtime(path) >= idle_time and is_process_alive(int(pid)):
+                    jobs[job_id] += 1
+                else:
+                    os.remove(path)
+        return jobs
+
+    def release(self, job_id):
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(self.get_lease_path(job_id))
+
+
+class BandwidthLimiter(object):
+    """Token bucket which holds the uploads of a job to its share of the node, and measures their throughput.
+
+    Uploads waiting for bandwidth are let through in the order of their priority, so that playlists and early
+    segments aren't held back by later ones. Bytes are granted ahead of the bucket being refilled, and the
+    uploads after them wait until it is paid back, so that a file larger than the bucket doesn't wait forever.
+    """
+
+    REFRESH_INTERVAL = 1
+    # Seconds of bandwidth which an idle job may use at once.
+    BURST = 1
+
+    def __init__(self, job_id, scheduler):
+        self.job_id = job_id
+        self.scheduler = scheduler
+        self.users = 0
+        self.condition = threading.Condition()
+        self.waiting = []
+        self.sequence = itertools.count()
+        self.rate = None
+        self.tokens = 0.0
+        self.refill_time = None
+        self.refresh_time = 0
+        self.bytes_uploaded = 0
+        self.wait_time = 0.0
+        self.start_time = None
+        self.end_time = None
+
+    @property
+    def metrics(self):
+        elapsed_time = (self.end_time - self.start_time) if self.start_time else 0
+        return {
+            "upload_bytes": self.bytes_uploaded,
+            "upload_throughput": int(self.bytes_uploaded / elapsed_time) if elapsed_time else 0,
+            # Time uploads spent waiting for the share of the job, summed over the uploads running at once.
+            "upload_wait_time": round(self.wait_time, 3),
+        }
+
+    def acquire(self, size, priority=0):
+        """Waits until size bytes may be uploaded at the share of the job."""
+        if size <= 0:
+            # Retried requests report the bytes they send again as negative.
+            return
+
+        with self.condition:
+            self.record(size)
+            if not self.scheduler.is_enabled:
+                return
+
+            wait_start_time = time.time()
+            ticket = (priority, next(self.sequence))
+            heapq.heappush(self.waiting, ticket)
+            try:
+                while True:
+                    self.refill()
+                    if self.waiting[0] == ticket and self.tokens > 0:
+                        self.tokens -= size
+                        break
+                    self.condition.wait(self.get_wait_timeout())
+            finally:
+                self.waiting.remove(ticket)
+                heapq.heapify(self.waiting)
+                self.condition.notify_all()
+            self.wait_time += time.time() - wait_start_time
+
+    def record(self, size):
+        now = time.time()
+        self.start_time = self.start_time or now
+        self.end_time = now
+        self.bytes_uploaded += size
+
+    def refill(self):
+        now = time.time()
+        if now - self.refresh_time >= self.REFRESH_INTERVAL:
+            self.rate = self.scheduler.get_share(self.job_id)
+            self.refresh_time = now
+        if self.refill_time is None:
+            self.tokens = self.rate * self.BURST
+        else:
+            self.tokens = min(self.rate * self.BURST, self.tokens + (now - self.refill_time) * self.rate)
+        self.refill_time = now
+
+    def get_wait_timeout(self):
+        if self.tokens > 0:
+            # Waiting for uploads of higher priority to take their turn.
+            return self.REFRESH_INTERVAL
+        return min(self.REFRESH_INTERVAL, -self.tokens / self.rate + 0.001)
+
+    def close(self):
+        with lock:
+            self.users -= 1
+            if self.users > 0:
+                return
+            limiters.pop(self.job_id, None)
+        if self.scheduler.is_enabled:
+            self.scheduler.release(self.job_id)
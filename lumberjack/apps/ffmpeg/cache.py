@@ -0,0 +1,145 @@
+import contextlib
+import fcntl
+import hashlib
+import os
+import shutil
+import uuid
+
+import requests
+from botocore.exceptions import BotoCoreError, ClientError
+from django.conf import settings
+
+from apps.ffmpeg.utils import mkdir
+from .inputs import get_input_metadata
+
+
+def get_input_cache():
+    return InputCache(settings.INPUT_CACHE_PATH, settings.INPUT_CACHE_SIZE)
+
+
+def is_process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class InputCache(object):
+    """Node-local cache of S3 and HTTP inputs, keyed by their URL and ETag.
+
+    It is shared by every worker process of the node. Entries in use hold a lease, which is a file named after
+    the process holding it, and least recently used entries without a live lease are evicted to stay within
+    max_size bytes. Tasks look up the entry of their input once, and take a lease on it before checking whether
+    it is cached, so that it can't be evicted in between.
+    """
+
+    def __init__(self, directory, max_size):
+        self.directory = directory
+        self.max_size = max_size
+
+    @property
+    def is_enabled(self):
+        return bool(self.max_size)
+
+    @contextlib.contextmanager
+    def lock(self):
+        mkdir(self.directory)
+        with open(os.path.join(self.directory, ".lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield
+
+    def get_entry(self, url):
+        if not self.is_enabled or not url.startswith(("s3://", "http")):
+            return None
+
+        try:
+            etag, size = get_input_metadata(url)
+        except (ClientError, BotoCoreError, requests.RequestException, OSError):
+            # Not cached then, an input which can't be read is reported by the prefetcher or ffmpeg instead.
+            return None
+        if not etag:
+            return None
+        key = hashlib.sha256("{}:{}".format(url, etag).encode()).hexdigest()
+        return CacheEntry(self, key, int(size or 0))
+
+    def get_entries(self):
+        return [
+            CacheEntry(self, name, os.path.getsize(os.path.join(self.directory, name)))
+            for name in os.listdir(self.directory)
+            if "." not in name
+        ]
+
+    def evict(self, required_size):
+        """Removes least recently used entries which aren't in use, until required_size bytes fit in the cache."""
+        with self.lock():
+            entries = sorted(self.get_entries(), key=lambda entry: entry.last_used)
+            total_size = sum(entry.size for entry in entries)
+            for entry in entries:
+                if total_size + required_size <= self.max_size:
+                    break
+                if not entry.is_in_use():
+                    entry.remove()
+                    total_size -= entry.size
+
+
+class CacheEntry(object):
+    def __init__(self, cache, key, size):
+        self.cache = cache
+        self.key = key
+        self.size = size
+
+    @property
+    def path(self):
+        return os.path.join(self.cache.directory, self.key)
+
+    @property
+    def leases_path(self):
+        return self.path + ".leases"
+
+    @property
+    def last_used(self):
+        return os.path.getmtime(self.path)
+
+    def is_cached(self):
+        # Same marker as the one RangedDownloader leaves once a download is complete.
+        return os.path.exists(self.path + ".done")
+
+    def touch(self):
+        with contextlib.suppress(FileNotFoundError):
+            os.utime(self.path)
+
+    def acquire(self):
+        """Takes a lease on the entry, which keeps it from being evicted until it is released."""
+        with self.cache.lock():
+            mkdir(self.leases_path)
+            lease = os.path.join(self.leases_path, "{}-{}".format(os.getpid(), uuid.uuid4().hex))
+            open(lease, "w").close()
+            self.touch()
+        return lease
+
+    def release(self, lease):
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(lease)
+        self.touch()
+
+    def is_in_use(self):
+        if not os.path.isdir(self.leases_path):
+            return False
+
+        is_in_use = False
+        for lease in os.listdir(self.leases_path):
+            if is_process_alive(int(lease.split("-")[0])):
+                is_in_use = True
+            else:
+                # Leases of processes which were killed without releasing them.
+                os.remove(os.path.join(self.leases_path, lease))
+        return is_in_use
+
+    def remove(self):
+        for path in (self.path, self.path + ".done", self.path + ".lock"):
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(path)
+        shutil.rmtree(self.leases_path, ignore_errors=True)
@@ -0,0 +1,62 @@
+"""Sessions and clients of boto3 shared by every storage and input of a worker process.
+
+Building them takes tens of milliseconds and a connection pool of their own, so they are built once for each
+set of credentials, region and attempts. Clients are thread-safe, sessions are only used to build clients while holding
+the lock.
+"""
+
+import threading
+
+import boto3
+from botocore.config import Config
+
+from django.conf import settings
+
+lock = threading.Lock()
+sessions = {}
+clients = {}
+
+
+def get_credentials():
+    return settings.AWS_ACCESS_KEY_ID, settings.AWS_SECRET_ACCESS_KEY
+
+
+def get_session(region_name=None):
+    key = get_credentials() + (region_name or settings.AWS_S3_REGION_CODE,)
+    with lock:
+        if key not in sessions:
+            access_key_id, secret_access_key, region_name = key
+            sessions[key] = boto3.Session(
+                aws_access_key_id=access_key_id, aws_secret_access_key=secret_access_key, region_name=region_name
+            )
+        return sessions[key]
+
+
+def get_client_config(max_attempts=None):
+    retries = {"mode": settings.AWS_RETRY_MODE}
+    if max_attempts is None:
+        retries["max_attempts"] = settings.AWS_MAX_ATTEMPTS
+    else:
+        # max_attempts of botocore counts the retries alone, total_max_attempts the first attempt too.
+        retries["total_max_attempts"] = max_attempts
+    return Config(max_pool_connections=settings.AWS_MAX_POOL_CONNECTIONS, retries=retries)
+
+
+def get_s3_client(region_name=None, max_attempts=None):
+    """Returns the client of the region, whose requests are sent max_attempts times at most, counting the first.
+
+    Without max_attempts, they are retried AWS_MAX_ATTEMPTS times. Callers which retry on their own take a client
+    with a single attempt, so that retries don't multiply.
+    """
+    session = get_session(region_name)
+    key = get_credentials() + (session.region_name, max_attempts)
+    with lock:
+        if key not in clients:
+            clients[key] = session.client("s3", config=get_client_config(max_attempts))
+        return clients[key]
+
+
+def clear():
+    with lock:
+        sessions.clear()
+        clients.clear()
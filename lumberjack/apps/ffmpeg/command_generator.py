@@ -7,13 +7,25 @@ from apps.ffmpeg.utils import mkdir, generate_file_name_from_format
 from .inputs import get_input_path
 
 
+def get_job_path(options):
+    return "{}/{}".format(settings.TRANSCODED_VIDEOS_PATH, options.get("id"))
+
+
+def get_output_url(options, path):
+    """Returns where ffmpeg writes a path of the local job folder to, which is the upload proxy when it is set."""
+    upload_url = options.get("upload_url")
+    if not upload_url:
+        return path
+    return upload_url + path[len(get_job_path(options)) :]
+
+
 class CommandGenerator(object):
     def __init__(self, options):
         self.options = options
 
     def generate(self):
         arguments = " ".join(self.to_args(**self.input_argument, **self.media_options, **self.output_arguments))
-        command = self.ffmpeg_binary + " " + arguments + " " + self.output_path
+        command = self.ffmpeg_binary + " " + arguments + " " + self.output_url
         return command
 
     def to_args(self, **kwargs: dict):
@@ -27,27 +39,47 @@ class CommandGenerator(object):
 
     @property
     def ffmpeg_binary(self):
+        progress_url = self.options.get("progress_url")
+        if progress_url:
+            # The stats of the log are left out, progress is read from the key=value stream of -progress instead.
+            return "ffmpeg -hide_banner -nostats -progress {}".format(progress_url)
         return "ffmpeg -hide_banner"
 
     @property
     def input_argument(self):
-        path = self.options.get("input")
+        path = get_input_path(self.options.get("input"))
         FIVE_MINUTES = 300
         input_arguments = OrderedDict()
 
-        if get_input_path(path).startswith("http"):
+        if path.startswith("http"):
             input_arguments.update({"reconnect": 1, "reconnect_streamed": 1, "reconnect_delay_max": FIVE_MINUTES})
 
-        input_arguments.update({"i": get_input_path(path)})
+        if self.options.get("threads"):
+            input_arguments.update({"filter_threads": self.options["threads"]})
+
+        chunk = self.options.get("chunk")
+        if chunk:
+            input_arguments.update({"ss": chunk["start"], "t": chunk["duration"]})
+
+        resume = self.options.get("resume")
+        if resume:
+            input_arguments.update({"ss": resume["start"]})
+
+        input_arguments.update({"i": path})
         return input_arguments
 
     @property
     def local_path(self):
-        return "{}/{}".format(settings.TRANSCODED_VIDEOS_PATH, self.options.get("id"))
+        return get_job_path(self.options)
 
     @property
     def output_arguments(self):
-        return {"max_muxing_queue_size": 9999}
+        arguments = {"max_muxing_queue_size": 9999}
+        segment_range = self.options.get("chunk") or self.options.get("resume")
+        if segment_range and self.options.get("format").lower() == "hls":
+            # Keeps timestamps continuous with the segments before it once they are stitched together.
+            arguments["output_ts_offset"] = segment_range["start"]
+        return arguments
 
     @property
     def output_path(self):
@@ -55,27 +87,171 @@ class CommandGenerator(object):
         if not file_name:
             file_name = generate_file_name_from_format(self.options.get("format"))
 
-        return "{}/{}/{}".format(self.local_path, self.options.get("output")["name"], file_name)
+        output_directory = "{}/{}".format(self.local_path, self.options.get("output")["name"])
+        if self.options.get("resume"):
+            # Playlist of a resumed transcode lists only the new segments, so it is kept out of the uploaded folder
+            # until it is merged with the segments uploaded earlier.
+            output_directory += ".resume"
+        return "{}/{}".format(output_directory, file_name)
+
+    @property
+    def output_url(self):
+        return get_output_url(self.options, self.output_path)
 
     @property
     def media_options(self):
+        return self.media_options_class(self.options).all
+
+    @property
+    def media_options_class(self):
         if self.options.get("format").lower() == "hls":
-            return HLSOptions(self.options).all
-        return MediaOptions(self.options).all
+            return HLSOptions
+        return MP4Options
+
+
+class LadderCommandGenerator(CommandGenerator):
+    """Generates a single ffmpeg command which decodes the input once and encodes every
+    output of the job from it, using a split/scale filter graph with one output per rendition.
+    """
+
+    def generate(self):
+        arguments = self.to_args(**self.input_argument, **self.filter_arguments)
+        for index, generator in enumerate(self.rendition_generators):
+            arguments.extend(self.stream_maps(index, generator))
+            arguments.extend(self.to_args(**self.rendition_options(generator), **generator.output_arguments))
+            arguments.append(generator.output_url)
+        return self.ffmpeg_binary + " " + " ".join(arguments)
+
+    @property
+    def outputs(self):
+        return self.options.get("outputs")
+
+    @property
+    def rendition_generators(self):
+        return [
+            CommandGenerator(dict(self.options, output=output, threads=self.rendition_threads))
+            for output in self.outputs
+        ]
+
+    @property
+    def rendition_threads(self):
+        # Every rendition is encoded by the same process, so they share its threads.
+        threads = self.options.get("threads")
+        if not threads:
+            return None
+        return max(1, threads // len(self.outputs))
+
+    def is_video_copied(self, generator):
+        return generator.media_options_class(generator.options).can_copy_video()
+
+    def is_video_encoded(self, generator):
+        return generator.options.get("output").get("video") is not None and not self.is_video_copied(generator)
+
+    def stream_maps(self, index, generator):
+        media_options = generator.media_options_class(generator.options)
+        maps = []
+        if not media_options.is_audio_only:
+            video_stream = "0:v:0" if self.is_video_copied(generator) else "[v{}]".format(index)
+            maps.extend(["-map", video_stream])
+        if not media_options.is_audio_shared:
+            maps.extend(["-map", "0:a?"])
+        return maps
+
+    @property
+    def filter_arguments(self):
+        # Audio only renditions and those which copy the video stream of the input are left out of the filter graph.
+        encoded_outputs = [
+            (index, generator.options.get("output").get("video"))
+            for index, generator in enumerate(self.rendition_generators)
+            if self.is_video_encoded(generator)
+        ]
+        if not encoded_outputs:
+            return {}
+
+        split_labels = "".join("[s{}]".format(index) for index, _ in encoded_outputs)
+        filters = ["[0:v]split={}{}".format(len(encoded_outputs), split_labels)]
+        for index, video in encoded_outputs:
+            filters.append("[s{0}]scale={1}:{2}[v{0}]".format(index, video.get("width"), video.get("height")))
+        return {"filter_complex": '"{}"'.format(";".join(filters))}
+
+    def rendition_options(self, generator):
+        options = generator.media_options
+        # Scaling is done by the filter graph, so the per output size option is dropped.
+        options.pop("s", None)
+        return options
+
+
+class ConcatCommandGenerator(object):
+    """Generates an ffmpeg command which joins the chunks listed in a concat file without re-encoding them."""
+
+    def __init__(self, concat_file_path, output_path):
+        self.concat_file_path = concat_file_path
+        self.output_path = output_path
+
+    def generate(self):
+        return (
+            "ffmpeg -hide_banner -f concat -safe 0 -protocol_whitelist file,http,https,tcp,tls,crypto "
+            "-i {} -c copy -movflags +faststart {}".format(self.concat_file_path, self.output_path)
+        )
 
 
 class MediaOptions(object):
     DEFAULT_VIDEO_CODEC = "h265"
     DEFAULT_AUDIO_CODEC = "aac"
     DEFAULT_PRESET = "fast"
+    X265_ENCODERS = ("h265", "hevc", "libx265")
+    CODEC_NAMES = {"h264": "h264", "libx264": "h264", "h265": "hevc", "hevc": "hevc", "libx265": "hevc"}
 
     def __init__(self, options):
         self.options = options
         self.output_options = options.get("output")
         self.video = self.output_options.get("video")
         self.audio = self.output_options.get("audio")
+        self.probe = options.get("probe") or {}
+
+    @property
+    def is_audio_only(self):
+        return self.video is None
+
+    @property
+    def is_audio_shared(self):
+        # Audio is encoded once into a separate audio only output, which every video output refers to.
+        return bool(self.options.get("shared_audio")) and not self.is_audio_only
+
+    def is_passthrough_allowed(self):
+        # Chunks are cut at segment boundaries, which need not fall on keyframes of the input.
+        return self.options.get("passthrough") and not self.options.get("chunk")
+
+    def is_same_codec(self, codec, probed_codec):
+        return probed_codec is not None and self.CODEC_NAMES.get(codec, codec) == probed_codec
+
+    def is_within_bitrate(self, bitrate, probed_bitrate):
+        return probed_bitrate is not None and bitrate is not None and int(probed_bitrate) <= int(bitrate)
+
+    def can_copy_video(self):
+        return bool(
+            not self.is_audio_only
+            and self.is_passthrough_allowed()
+            and self.is_same_codec(self.video.get("codec", self.DEFAULT_VIDEO_CODEC), self.probe.get("video_codec"))
+            and (self.probe.get("width"), self.probe.get("height"))
+            == (self.video.get("width"), self.video.get("height"))
+            and self.is_within_bitrate(self.video.get("bitrate"), self.probe.get("video_bitrate"))
+        )
+
+    def can_copy_audio(self):
+        return bool(
+            self.is_passthrough_allowed()
+            and self.is_same_codec(self.audio.get("codec", self.DEFAULT_AUDIO_CODEC), self.probe.get("audio_codec"))
+            and self.is_within_bitrate(self.audio.get("bitrate"), self.probe.get("audio_bitrate"))
+        )
 
     def video_options(self):
+        if self.is_audio_only:
+            return {"vn": None}
+
+        if self.can_copy_video():
+            return {"c:v": "copy"}
+
         options = {
             "c:v": self.video.get("codec", self.DEFAULT_VIDEO_CODEC),
             "preset": self.video.get("preset", self.DEFAULT_PRESET),
@@ -85,9 +261,22 @@ class MediaOptions(object):
         if self.video.get("bitrate"):
             options["b:v"] = self.video.get("bitrate")
 
+        threads = self.options.get("threads")
+        if threads:
+            options["threads"] = threads
+            if options["c:v"] in self.X265_ENCODERS:
+                # x265 sizes its own thread pool from the number of cores and ignores -threads.
+                options["x265-params"] = "pools={}".format(threads)
+
         return options
 
     def audio_options(self):
+        if self.is_audio_shared:
+            return {"an": None}
+
+        if self.can_copy_audio():
+            return {"c:a": "copy"}
+
         options = {"c:a": self.audio.get("codec", self.DEFAULT_AUDIO_CODEC)}
 
         if self.audio.get("bitrate"):
@@ -103,9 +292,29 @@ class MediaOptions(object):
         return args
 
 
+class MP4Options(MediaOptions):
+    @property
+    def all(self):
+        args = super().all
+        if self.options.get("upload_url"):
+            # Fragments are written one after another without seeking back to the header, so that the file is sent
+            # while it is encoded, in a single request which is uploaded to storage in parts.
+            args.update({"format": "mp4", "movflags": "frag_keyframe+empty_moov+default_base_moof", "method": "PUT"})
+        return args
+
+
 class HLSOptions(MediaOptions):
     DEFAULT_SEGMENT_LENGTH = 10
 
+    @property
+    def segment_length(self):
+        return self.options.get("segment_length", self.DEFAULT_SEGMENT_LENGTH)
+
+    def can_copy_video(self):
+        # Copied segments can only be cut at keyframes of the input, so they must be frequent enough.
+        keyframe_interval = self.probe.get("keyframe_interval")
+        return bool(super().can_copy_video() and keyframe_interval and keyframe_interval <= self.segment_length)
+
     @property
     def key_folder_path(self):
         return "{}/{}/key".format(settings.TRANSCODED_VIDEOS_PATH, self.options.get("id"))
@@ -117,12 +326,36 @@ class HLSOptions(MediaOptions):
             {
                 "format": "hls",
                 "hls_list_size": 0,
-                "hls_time": self.options.get("segment_length", self.DEFAULT_SEGMENT_LENGTH),
-                "hls_segment_filename": "{}/{}/{}/video_%d.ts".format(
-                    settings.TRANSCODED_VIDEOS_PATH, self.options.get("id"), self.output_options.get("name")
+                "hls_time": self.segment_length,
+                # Segments are written to a .tmp file first, so that they aren't uploaded before they are complete.
+                "hls_flags": "temp_file",
+                "hls_segment_filename": get_output_url(
+                    self.options,
+                    "{}/{}/video_%d.ts".format(get_job_path(self.options), self.output_options.get("name")),
                 ),
             }
         )
+        if self.options.get("progressive"):
+            # Playlists are published while segments are still being added to them.
+            args["hls_playlist_type"] = "event"
+        if self.options.get("upload_url"):
+            # Files are only complete once their request ends, and are sent over a single connection.
+            args.pop("hls_flags")
+            args.update({"method": "PUT", "http_persistent": 1})
+
+        frame_rate = self.probe.get("frame_rate")
+        if frame_rate and args.get("c:v") not in (None, "copy"):
+            # Places a keyframe at every segment boundary, so that segments are cut at the requested length.
+            args["g"] = int(round(frame_rate * args["hls_time"]))
+
+        segment_range = self.options.get("chunk") or self.options.get("resume")
+        if segment_range:
+            args.update(
+                {
+                    "start_number": segment_range["start_number"],
+                    "force_key_frames": '"expr:gte(t,n_forced*{})"'.format(args["hls_time"]),
+                }
+            )
 
         if self.options.get("encryption"):
             encryption_data = self.options.get("encryption")
@@ -1,9 +1,8 @@
 from abc import ABC, abstractmethod
 
 from smart_open import parse_uri
-import boto3
 
-from django.conf import settings
+from .clients import get_client_config, get_session
 
 
 class InputOptionsFactory(object):
@@ -34,9 +33,8 @@ class FileStorageInputOptions(AbstractInputOptions):
 class S3InputOptions(AbstractInputOptions):
     @property
     def options(self):
-        session = boto3.Session(
-            aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-            aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-            region_name=settings.AWS_S3_REGION_CODE,
-        )
-        return {"session": session, "buffer_size": 32000}
+        return {
+            "session": get_session(),
+            "resource_kwargs": {"config": get_client_config()},
+            "buffer_size": 32000,
+        }
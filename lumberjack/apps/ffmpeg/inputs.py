@@ -1,9 +1,10 @@
 import abc
+import os
 
 from smart_open import parse_uri
-import boto3
+import requests
 
-from django.conf import settings
+from .clients import get_s3_client
 
 
 def get_input_path(path):
@@ -16,6 +17,27 @@ def get_input_path(path):
     return path
 
 
+def get_input_metadata(path):
+    """Returns the ETag and size of an input, without reading it."""
+    if path.startswith("s3://"):
+        return S3InputPath(path).metadata()
+
+    if path.startswith("http"):
+        response = requests.head(path, allow_redirects=True, timeout=30)
+        return response.headers.get("ETag"), response.headers.get("Content-Length")
+
+    stat = os.stat(parse_uri(path).uri_path)
+    return int(stat.st_mtime), stat.st_size
+
+
+def get_input_fingerprint(path):
+    """Identifies the content of an input by its ETag and size, without reading it."""
+    etag, size = get_input_metadata(path)
+    if not etag and not size:
+        return None
+    return "{}:{}".format(etag, size)
+
+
 class InputPath(abc.ABC):
     def __init__(self, source):
         self.source = source
@@ -28,12 +50,7 @@ class InputPath(abc.ABC):
 class S3InputPath(InputPath):
     def __init__(self, source):
         super().__init__(source)
-        session = boto3.Session(
-            aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-            aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-            region_name="ap-southeast-1",
-        )
-        self.client = session.client("s3")
+        self.client = get_s3_client(region_name="ap-southeast-1")
         self.source = source
 
     def generate(self):
@@ -44,3 +61,8 @@ class S3InputPath(InputPath):
         }
         response = self.client.generate_presigned_url("get_object", Params=params, ExpiresIn=86400)
         return response
+
+    def metadata(self):
+        s3_path = parse_uri(self.source)
+        response = self.client.head_object(Bucket=s3_path.bucket_id, Key=s3_path.key_id)
+        return response["ETag"], response["ContentLength"]
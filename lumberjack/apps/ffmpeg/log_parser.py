@@ -1,11 +1,21 @@
+import collections
 import threading
 import abc
-import re
 
 
 def convert_to_sec(time):
     h, m, s = time.split(":")
-    return int(h) * 3600 + int(m) * 60 + int(s)
+    return int(h) * 3600 + int(m) * 60 + float(s)
+
+
+def parse_number(value, number_type=float, suffix=""):
+    """Returns the number of a value of the progress stream, or None when ffmpeg doesn't know it yet, like N/A."""
+    if suffix and value.endswith(suffix):
+        value = value[: -len(suffix)]
+    try:
+        return number_type(value)
+    except ValueError:
+        return None
 
 
 class Event(object):
@@ -16,9 +26,68 @@ class Event(object):
 
 class FFmpegEvent(Event):
     PROGRESS_EVENT = "progress"
+    STATS_EVENT = "stats"
     OUTPUT_EVENT = "output"
 
 
+class Progress(object):
+    """A block of the progress stream of ffmpeg, which it writes about twice a second and once more when it ends.
+
+    out_time is in seconds of output, bitrate in kbit/s, speed in multiples of real time and total_size in bytes.
+    Values which ffmpeg doesn't know yet are None.
+    """
+
+    def __init__(self, out_time=None, frame=None, fps=None, bitrate=None, speed=None, total_size=None, is_ended=False):
+        self.out_time = out_time
+        self.frame = frame
+        self.fps = fps
+        self.bitrate = bitrate
+        self.speed = speed
+        self.total_size = total_size
+        self.is_ended = is_ended
+
+    @classmethod
+    def from_values(cls, values):
+        out_time = parse_number(values.get("out_time_us", ""), int)
+        if out_time is not None:
+            out_time /= 1000000
+        elif values.get("out_time", "").count(":") == 2:
+            out_time = convert_to_sec(values["out_time"])
+        if out_time is not None and out_time < 0:
+            # Written before the first frame is out.
+            out_time = None
+        return cls(
+            out_time=out_time,
+            frame=parse_number(values.get("frame", ""), int),
+            fps=parse_number(values.get("fps", "")),
+            bitrate=parse_number(values.get("bitrate", ""), suffix="kbits/s"),
+            speed=parse_number(values.get("speed", ""), suffix="x"),
+            total_size=parse_number(values.get("total_size", ""), int),
+            is_ended=values.get("progress") == "end",
+        )
+
+
+class ProgressParser(object):
+    """Parses the key=value lines of the progress stream of ffmpeg as they are read, into a Progress per block."""
+
+    def __init__(self):
+        self.values = {}
+
+    def feed(self, line):
+        """Returns the Progress of the block which the line ends, or None while the block goes on."""
+        key, separator, value = line.strip().partition("=")
+        if not separator:
+            return None
+
+        self.values[key] = value.strip()
+        if key != "progress":
+            return None
+
+        progress = Progress.from_values(self.values)
+        self.values = {}
+        return progress
+
+
 class Observer:
     def notify(self, *args, **kwargs):
         pass
@@ -51,7 +120,7 @@ class Observable:
             observers = self._observers[observer.event_type]
             observers.append(observer)
         else:
-            observers = {observer}
+            observers = [observer]
         self._observers[observer.event_type] = observers
 
     def unregister(self, observer: Observer):
@@ -66,38 +135,57 @@ class Observable:
 
 
 class LogParser(Observable):
-    def __init__(self, process):
+    """Follows ffmpeg through the key=value stream which it writes to progress_file with its -progress option.
+
+    Every block of the stream is sent to observers as a Progress, and as a percentage of the duration. The human
+    readable log of ffmpeg is drained from its stdout by a thread of its own into a buffer of its last LOG_SIZE
+    lines, so that ffmpeg never blocks on a full pipe, however far behind the observers of the progress are.
+    """
+
+    LOG_SIZE = 200
+
+    def __init__(self, process, progress_file, duration=None):
         super().__init__()
-        self.duration = 1
+        self.duration = duration or 1
+        self.is_duration_known = duration is not None
         self.time = 0
+        self.progress = None
         self.process = process
+        self.progress_file = progress_file
+        self.log = collections.deque(maxlen=self.LOG_SIZE)
         self.thread = threading.Thread(target=self.run)
+        self.log_thread = threading.Thread(target=self.drain_log, daemon=True)
 
     def run(self):
-        while True:
-            events = self.generate_events_from_log()
-            for event in events:
-                self.notify(event)
-            if not events:
-                self.notify_transcode_completed()
-                break
-
-    def generate_events_from_log(self):
-        while True:
-            events = []
-            log = self.process.stdout.readline().strip()
-            if self.is_stdout_finished(log):
-                return events
-
-            percentage = self.get_percentage(log)
-            events.append(self.create_progress_event(percentage))
-
-            if self.has_output_files(log):
-                events.append(self.create_output_event())
-            return events
-
-    def is_stdout_finished(self, log):
-        return log == "" and self.process.poll() is not None
+        parser = ProgressParser()
+        with self.progress_file:
+            for line in self.progress_file:
+                progress = parser.feed(line)
+                if progress is not None:
+                    self.notify_progress(progress)
+        self.log_thread.join()
+        self.notify_transcode_completed()
+
+    def drain_log(self):
+        for line in self.process.stdout:
+            line = line.rstrip()
+            self.log.append(line)
+            if not self.is_duration_known and line.lstrip().startswith("Duration: "):
+                self.duration = self.parse_duration(line) or self.duration
+            if "Opening '" in line and line.endswith("' for writing"):
+                self.notify(self.create_output_event())
+
+    def parse_duration(self, line):
+        # Like "  Duration: 00:10:00.04, start: 0.000000, bitrate: 1205 kb/s"
+        duration = line.partition("Duration: ")[2].partition(",")[0]
+        return convert_to_sec(duration) if duration.count(":") == 2 else None
+
+    def notify_progress(self, progress):
+        self.progress = progress
+        self.notify(FFmpegEvent(FFmpegEvent.STATS_EVENT, progress))
+        if progress.out_time is not None:
+            self.time = progress.out_time
+        self.notify(self.create_progress_event(self.get_percentage()))
 
     def notify_transcode_completed(self):
         event = self.create_output_event(is_transcode_completed=True)
@@ -109,20 +197,14 @@ class LogParser(Observable):
     def create_output_event(self, is_transcode_completed=False):
         return FFmpegEvent(FFmpegEvent.OUTPUT_EVENT, is_transcode_completed)
 
-    def get_percentage(self, log):
-        self.duration = self.parse_time("Duration: ", log, self.duration)
-        self.time = self.parse_time("time=", log, self.time)
-        return round(self.time / self.duration * 100)
-
-    def has_output_files(self, log):
-        regex_pattern = re.compile("(Opening .* for writing)")
-        return regex_pattern.search(log)
+    def get_percentage(self):
+        return min(100, round(self.time / self.duration * 100))
 
-    def parse_time(self, regex, string, default):
-        time = re.search("(?<=" + regex + ")\w+:\w+:\w+", string)
-        return convert_to_sec(time.group(0)) if time else default
+    def get_log(self):
+        return "\n".join(self.log)
 
     def start(self):
+        self.log_thread.start()
         self.thread.start()
 
     def stop(self):
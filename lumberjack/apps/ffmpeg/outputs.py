@@ -1,114 +1,612 @@
 import abc
+import contextlib
+import errno
+import hashlib
+import json
 import os
 import re
 import shutil
 import io
+import itertools
+import math
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-from smart_open import parse_uri, open
-import boto3
-from botocore.exceptions import ClientError
+from botocore.exceptions import BotoCoreError, ClientError, ConnectionError as BotoConnectionError, HTTPClientError
+from smart_open import parse_uri
 
 from django.conf import settings
 
+from apps.ffmpeg.utils import mkdir
+from .bandwidth import get_upload_priority
+from .clients import get_s3_client
+from .playlist import MediaPlaylist
+
 
 class OutputFileFactory:
     @staticmethod
     def create(url, **options):
         if parse_uri(url).scheme == "s3":
-            return S3(url)
+            return S3(url, **options)
         return LocalFileStorage(url)
 
 
 class Storage(abc.ABC):
+    INCOMPLETE_MANIFEST_FILES = r".*\.m3u8"
+    PLAYLIST_EXTENSION = ".m3u8"
+
+    @property
+    def metrics(self):
+        return {}
+
     @abc.abstractmethod
     def save(self, directory, **options):
         pass
 
     @abc.abstractmethod
-    def save_text(self, content: str):
+    def save_text(self, content: str, is_progressive=False):
+        """Saves content to the destination, is_progressive tells it is replaced while the output is played."""
+        pass
+
+    @abc.abstractmethod
+    def save_stream(self, relative_path, stream):
+        pass
+
+    @abc.abstractmethod
+    def delete_files(self, relative_paths):
+        """Deletes files from the destination, files which don't exist are skipped."""
         pass
 
+    def save_files(self, directory, file_paths, **options):
+        # Storages which can't save single files save the whole directory.
+        self.save(directory, **options)
+
+    def is_playlist(self, path):
+        # Playlists are only saved once the transcode is completed, after the segments which they list.
+        return path.endswith(self.PLAYLIST_EXTENSION)
+
+    def get_files_to_exclude(self, is_transcode_completed):
+        if not is_transcode_completed:
+            return [self.INCOMPLETE_MANIFEST_FILES]
+        return []
+
+    def should_skip_upload(self, filename, files_to_exclude=[]):
+        if filename.endswith(".tmp"):
+            return True
+
+        regex = "(?:% s)" % "|".join(files_to_exclude)
+        if files_to_exclude and re.match(regex, filename):
+            return True
+        return False
+
+
+# Errors returned by S3 when it throttles requests or fails to serve them for a while.
+TRANSIENT_ERROR_CODES = {
+    "SlowDown",
+    "Throttling",
+    "ThrottlingException",
+    "RequestLimitExceeded",
+    "RequestTimeout",
+    "InternalError",
+    "ServiceUnavailable",
+    # The upload of the parts recorded in the ledger is gone, the next attempt starts a new one.
+    "NoSuchUpload",
+}
+
+
+def get_file_etag(path, part_size):
+    """Returns the ETag which S3 gives to the file, when it is uploaded in parts of part_size if it isn't smaller."""
+    part_hashes = []
+    with io.open(path, "rb") as file:
+        for part in iter(lambda: file.read(part_size), b""):
+            part_hashes.append(hashlib.md5(part))
+    if len(part_hashes) == 0:
+        return hashlib.md5().hexdigest()
+    if len(part_hashes) == 1 and os.path.getsize(path) < part_size:
+        return part_hashes[0].hexdigest()
+    return "{}-{}".format(hashlib.md5(b"".join(h.digest() for h in part_hashes)).hexdigest(), len(part_hashes))
+
+
+def get_error_code(error):
+    return error.response.get("Error", {}).get("Code") if isinstance(error, ClientError) else None
+
+
+def is_transient_error(error):
+    """Tells whether an upload which failed with the error may succeed when it is tried again."""
+    if isinstance(error, (BotoConnectionError, HTTPClientError)):
+        return True
+    if not isinstance(error, ClientError):
+        return False
+    status_code = error.response.get("ResponseMetadata", {}).get("HTTPStatusCode") or 0
+    return get_error_code(error) in TRANSIENT_ERROR_CODES or status_code == 429 or status_code >= 500
+
+
+def get_retry_delay(attempt):
+    """Returns the seconds to wait before the next attempt, backing off exponentially with full jitter."""
+    return random.uniform(0, min(settings.UPLOAD_RETRY_MAX_DELAY, settings.UPLOAD_RETRY_DELAY * 2 ** attempt))
+
+
+class UploadLedger(object):
+    """Files uploaded from a local directory, kept in a file next to the directory.
+
+    Each upload is appended as a line of JSON with the key, size, modification time and ETag of the file, so
+    that files which are still on disk after they were uploaded, like when the worker died before removing
+    them, aren't uploaded again. Multipart uploads are appended as they start and as each of their parts is
+    uploaded, so that an upload cut short carries on from its last part, and once more if they are aborted.
+    """
+
+    def __init__(self, directory):
+        self.path = directory.rstrip("/") + ".uploads"
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.multipart_uploads = {}
+        self.load()
+
+    def load(self):
+        try:
+            with io.open(self.path) as ledger_file:
+                for line in ledger_file:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # Line cut short by a worker dying while writing it.
+                        continue
+                    self.read_entry(entry)
+        except FileNotFoundError:
+            pass
+
+    def read_entry(self, entry):
+        key = entry["key"]
+        if entry.get("is_aborted"):
+            upload = self.multipart_uploads.get(key)
+            if upload is not None and upload["upload_id"] == entry["upload_id"]:
+                del self.multipart_uploads[key]
+        elif "part_number" in entry:
+            upload = self.multipart_uploads.get(key)
+            if upload is not None and upload["upload_id"] == entry["upload_id"]:
+                upload["parts"][entry["part_number"]] = entry["etag"]
+        elif "upload_id" in entry:
+            self.multipart_uploads[key] = dict(entry, parts={})
+        else:
+            self.entries[key] = entry
+            self.multipart_uploads.pop(key, None)
+
+    def is_uploaded(self, key, stat):
+        entry = self.entries.get(key)
+        return entry is not None and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime
+
+    def add(self, key, stat, etag):
+        self.write({"key": key, "size": stat.st_size, "mtime": stat.st_mtime, "etag": etag})
+
+    def get_multipart_upload(self, key, stat):
+        """Returns the upload which was started for the file, unless the file changed since."""
+        upload = self.multipart_uploads.get(key)
+        if upload is None or upload["size"] != stat.st_size or upload["mtime"] != stat.st_mtime:
+            return None
+        return upload
+
+    def start_multipart_upload(self, key, stat, upload_id):
+        self.write({"key": key, "size": stat.st_size, "mtime": stat.st_mtime, "upload_id": upload_id})
+        return self.multipart_uploads[key]
+
+    def add_part(self, key, upload_id, part_number, etag):
+        self.write({"key": key, "upload_id": upload_id, "part_number": part_number, "etag": etag})
+
+    def forget_multipart_upload(self, key):
+        """Returns the upload which was started for the file, which the next attempt doesn't carry on."""
+        with self.lock:
+            upload = self.multipart_uploads.get(key)
+        if upload is not None:
+            self.write({"key": key, "upload_id": upload["upload_id"], "is_aborted": True})
+        return upload
+
+    def write(self, entry):
+        with self.lock:
+            self.read_entry(entry)
+            with io.open(self.path, "a") as ledger_file:
+                ledger_file.write(json.dumps(entry) + "\n")
+
+    def remove(self):
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(self.path)
+
 
 class S3(Storage):
-    INCOMPLETE_MANIFEST_FILES = r".*\.m3u8"
+    """Uploads the files of an output to a S3 bucket.
 
-    def __init__(self, destination_url):
-        session = boto3.Session(
-            aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-            aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-            region_name=settings.AWS_S3_REGION_CODE,
-        )
-        self.client = session.client("s3")
+    Objects left under the destination by an earlier run of the output, like before the job was restarted, are
+    listed once. Files which come out of the new run byte-identical to them, as told by their ETags, aren't
+    uploaded again. Once the transcode is completed, the objects which none of its playlists list are reported as
+    stale in the metrics.
+
+    Each file is tried UPLOAD_RETRIES more times after transient errors, like S3 throttling requests, backing off
+    exponentially between the attempts. Those are the only retries of uploads, their requests are sent once by the
+    client. Larger files are uploaded in parts recorded in the ledger, so that their uploads carry on from the
+    last part after a retry or a restart of the worker. Multipart uploads which are started over or fail for good
+    are aborted, so that S3 doesn't keep their parts. Files and parts share OUTPUT_UPLOAD_CONCURRENCY requests in
+    flight, however many files are uploaded in parts at once.
+    """
+
+    # Files smaller than this are uploaded with a single PUT, which returns their ETag. Larger ones are uploaded
+    # in parts of the same size.
+    MULTIPART_THRESHOLD = 8 * 1024 * 1024
+    STALE_KEYS_LIMIT = 100
+    # Most keys deleted by a single request.
+    DELETE_BATCH_SIZE = 1000
+
+    def __init__(self, destination_url, limiter=None):
+        self.max_workers = settings.OUTPUT_UPLOAD_CONCURRENCY
+        self.client = get_s3_client()
+        self.upload_client = get_s3_client(max_attempts=1)
+        self.upload_slots = threading.BoundedSemaphore(self.max_workers)
         self.destination_url = destination_url
+        self.limiter = limiter
         self.is_uploading = False
+        self.ledgers = {}
+        self.remote_objects = None
+        self.deduplicated_keys = set()
+        self.stale_keys = []
+        self.lock = threading.Lock()
+        self.retries = 0
+        self.failures = 0
+
+    @property
+    def metrics(self):
+        return {
+            "upload_deduplicated_files": len(self.deduplicated_keys),
+            "upload_stale_objects": len(self.stale_keys),
+            "upload_stale_keys": self.stale_keys[: self.STALE_KEYS_LIMIT],
+            "upload_retries": self.retries,
+            "upload_failures": self.failures,
+        }
 
     def save(self, source_directory, is_transcode_completed=False):
-        exclude_files = []
-        if not is_transcode_completed:
-            exclude_files = [self.INCOMPLETE_MANIFEST_FILES]
+        if self.is_uploading:
+            return
 
+        if is_transcode_completed:
+            self.find_stale_objects(source_directory)
+        self.upload_directory(source_directory, self.get_files_to_exclude(is_transcode_completed))
+        if is_transcode_completed:
+            # Every file of the completed output is uploaded, so nothing is left for the ledger to carry on.
+            self.get_ledger(source_directory).remove()
+            del self.ledgers[source_directory]
+
+    def save_files(self, source_directory, file_paths, is_transcode_completed=False):
         if self.is_uploading:
             return
 
-        self.upload_directory(source_directory, exclude_files)
+        self.is_uploading = True
+        try:
+            self.upload_files(source_directory, file_paths, self.get_files_to_exclude(is_transcode_completed))
+        finally:
+            self.is_uploading = False
 
     def upload_directory(self, source_directory, files_to_exclude):
         self.is_uploading = True
-        for root, dirs, files in os.walk(source_directory):
-            for filename in files:
-                if self.should_skip_upload(filename, files_to_exclude):
-                    continue
+        try:
+            file_paths = [
+                os.path.join(root, filename) for root, dirs, files in os.walk(source_directory) for filename in files
+            ]
+            self.upload_files(source_directory, file_paths, files_to_exclude)
+        finally:
+            self.is_uploading = False
 
-                absolute_path = os.path.join(root, filename)
-                self.upload_file(absolute_path, source_directory)
-                os.remove(absolute_path)
-        self.is_uploading = False
+    def upload_files(self, source_directory, file_paths, files_to_exclude):
+        """Uploads files concurrently, removing each of them once its upload has succeeded.
 
-    def should_skip_upload(self, filename, files_to_exclude=[]):
-        if filename.endswith(".tmp"):
-            return True
+        Playlists are uploaded once the other files have all succeeded, so that they never list a missing segment.
+        Files which failed to upload are kept for the next save, and the first of the errors is raised.
+        """
+        # Files reported by events may have been uploaded already by a walk of the whole directory.
+        file_paths = [
+            path
+            for path in file_paths
+            if not self.should_skip_upload(os.path.basename(path), files_to_exclude) and os.path.isfile(path)
+        ]
+        file_paths.sort(key=get_upload_priority)
+        if not file_paths:
+            return
 
-        regex = "(?:% s)" % "|".join(files_to_exclude)
-        if files_to_exclude and re.match(regex, filename):
-            return True
-        return False
+        # Loaded before the uploads start, so that the threads share them.
+        self.get_ledger(source_directory)
+        self.get_remote_objects()
+        playlist_paths = [path for path in file_paths if self.is_playlist(path)]
+        errors = self.upload_concurrently(
+            source_directory, [path for path in file_paths if path not in playlist_paths]
+        )
+        if not errors:
+            errors = self.upload_concurrently(source_directory, playlist_paths)
+
+        if errors:
+            raise errors[0]
+
+    def upload_concurrently(self, source_directory, file_paths):
+        """Uploads files concurrently, removing each of them once its upload has succeeded, and returns the errors."""
+        if not file_paths:
+            return []
+
+        errors = []
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(file_paths))) as pool:
+            uploads = {pool.submit(self.upload_file_with_retries, path, source_directory): path for path in file_paths}
+            for upload in as_completed(uploads):
+                if upload.exception() is None:
+                    os.remove(uploads[upload])
+                else:
+                    errors.append(upload.exception())
+        return errors
+
+    def upload_file_with_retries(self, absolute_file_path, source_directory):
+        for attempt in itertools.count():
+            try:
+                return self.upload_file(absolute_file_path, source_directory)
+            except Exception as error:
+                is_retried = attempt < settings.UPLOAD_RETRIES and is_transient_error(error)
+                with self.lock:
+                    if is_retried:
+                        self.retries += 1
+                    else:
+                        self.failures += 1
+                if not is_retried:
+                    s3_path = self.get_s3_path(absolute_file_path, source_directory)
+                    self.abort_multipart_upload(s3_path, self.get_ledger(source_directory))
+                    raise
+            time.sleep(get_retry_delay(attempt))
+
+    def get_s3_path(self, absolute_file_path, source_directory):
+        return parse_uri(os.path.join(self.destination_url, os.path.relpath(absolute_file_path, source_directory)))
 
     def upload_file(self, absolute_file_path, source_directory):
         relative_path = os.path.relpath(absolute_file_path, source_directory)
-        s3_path = parse_uri(os.path.join(self.destination_url, relative_path))
+        s3_path = self.get_s3_path(absolute_file_path, source_directory)
+        ledger = self.get_ledger(source_directory)
+        stat = os.stat(absolute_file_path)
+        if ledger.is_uploaded(s3_path.key_id, stat):
+            return
+
+        remote_object = self.get_remote_objects().get(s3_path.key_id)
+        if remote_object is not None and remote_object["Size"] == stat.st_size:
+            if remote_object["ETag"].strip('"') == get_file_etag(absolute_file_path, self.MULTIPART_THRESHOLD):
+                self.deduplicated_keys.add(s3_path.key_id)
+                ledger.add(s3_path.key_id, stat, remote_object["ETag"])
+                return
+
+        priority = get_upload_priority(relative_path)
+        if stat.st_size < self.MULTIPART_THRESHOLD:
+            if self.limiter is not None:
+                self.limiter.acquire(stat.st_size, priority)
+            with self.upload_slots, io.open(absolute_file_path, "rb") as file:
+                response = self.upload_client.put_object(
+                    Body=file, Bucket=s3_path.bucket_id, Key=s3_path.key_id, ACL="public-read"
+                )
+            etag = response["ETag"]
+        else:
+            etag = self.upload_multipart(absolute_file_path, s3_path, stat, ledger, priority)
+        ledger.add(s3_path.key_id, stat, etag)
+
+    def upload_multipart(self, absolute_file_path, s3_path, stat, ledger, priority):
+        upload = ledger.get_multipart_upload(s3_path.key_id, stat)
+        if upload is None:
+            # Upload started for an earlier version of the file, which this one takes the place of.
+            self.abort_multipart_upload(s3_path, ledger)
+            response = self.upload_client.create_multipart_upload(
+                Bucket=s3_path.bucket_id, Key=s3_path.key_id, ACL="public-read"
+            )
+            upload = ledger.start_multipart_upload(s3_path.key_id, stat, response["UploadId"])
 
+        part_count = math.ceil(stat.st_size / self.MULTIPART_THRESHOLD)
+        part_numbers = [number for number in range(1, part_count + 1) if number not in upload["parts"]]
         try:
-            self.client.head_object(Bucket=s3_path.bucket_id, Key=s3_path.key_id)
-        except ClientError:
-            self.client.upload_file(
-                absolute_file_path, s3_path.bucket_id, s3_path.key_id, ExtraArgs={"ACL": "public-read"}
+            if part_numbers:
+                with ThreadPoolExecutor(max_workers=min(self.max_workers, len(part_numbers))) as pool:
+                    uploads = [
+                        pool.submit(self.upload_part, absolute_file_path, s3_path, upload, number, ledger, priority)
+                        for number in part_numbers
+                    ]
+                    for part_upload in uploads:
+                        part_upload.result()
+            parts = [{"ETag": etag, "PartNumber": number} for number, etag in sorted(upload["parts"].items())]
+            response = self.upload_client.complete_multipart_upload(
+                Bucket=s3_path.bucket_id,
+                Key=s3_path.key_id,
+                UploadId=upload["upload_id"],
+                MultipartUpload={"Parts": parts},
+            )
+        except ClientError as error:
+            if get_error_code(error) == "NoSuchUpload":
+                self.abort_multipart_upload(s3_path, ledger)
+            raise
+        return response["ETag"]
+
+    def upload_part(self, absolute_file_path, s3_path, upload, part_number, ledger, priority):
+        with io.open(absolute_file_path, "rb") as file:
+            file.seek((part_number - 1) * self.MULTIPART_THRESHOLD)
+            body = file.read(self.MULTIPART_THRESHOLD)
+        if self.limiter is not None:
+            self.limiter.acquire(len(body), priority)
+        with self.upload_slots:
+            response = self.upload_client.upload_part(
+                Body=body,
+                Bucket=s3_path.bucket_id,
+                Key=s3_path.key_id,
+                UploadId=upload["upload_id"],
+                PartNumber=part_number,
             )
+        ledger.add_part(s3_path.key_id, upload["upload_id"], part_number, response["ETag"])
+
+    def abort_multipart_upload(self, s3_path, ledger):
+        """Aborts the multipart upload of the file recorded in the ledger, if any, so that S3 doesn't keep its parts."""
+        upload = ledger.forget_multipart_upload(s3_path.key_id)
+        if upload is None:
+            return
+
+        # Uploads which are gone already, or can't be aborted, are left to the lifecycle rules of the bucket.
+        with contextlib.suppress(ClientError, BotoCoreError):
+            self.client.abort_multipart_upload(
+                Bucket=s3_path.bucket_id, Key=s3_path.key_id, UploadId=upload["upload_id"]
+            )
+
+    def get_remote_objects(self):
+        if self.remote_objects is None:
+            s3_path = parse_uri(self.destination_url)
+            paginator = self.client.get_paginator("list_objects_v2")
+            pages = paginator.paginate(Bucket=s3_path.bucket_id, Prefix=self.get_key_prefix())
+            self.remote_objects = {
+                s3_object["Key"]: s3_object for page in pages for s3_object in page.get("Contents", [])
+            }
+        return self.remote_objects
+
+    def get_key_prefix(self):
+        return parse_uri(self.destination_url).key_id.rstrip("/") + "/"
+
+    def find_stale_objects(self, source_directory):
+        """Records the objects under the destination which none of the playlists of the completed output list.
+
+        Outputs without playlists, and resumed outputs, whose playlists are only completed later on, are skipped.
+        """
+        try:
+            playlist_names = [name for name in os.listdir(source_directory) if name.endswith(".m3u8")]
+        except FileNotFoundError:
+            return
+        if not playlist_names:
+            return
+
+        relative_paths = set(playlist_names)
+        for name in playlist_names:
+            playlist = MediaPlaylist.load(os.path.join(source_directory, name))
+            relative_paths.update(segment["uri"] for segment in playlist.segments)
+        prefix = self.get_key_prefix()
+        self.stale_keys = sorted(key for key in self.get_remote_objects() if key[len(prefix) :] not in relative_paths)
 
-    def save_text(self, content: str):
+    def get_ledger(self, source_directory):
+        if source_directory not in self.ledgers:
+            self.ledgers[source_directory] = UploadLedger(source_directory)
+        return self.ledgers[source_directory]
+
+    def save_text(self, content: str, is_progressive=False):
         s3_path = parse_uri(self.destination_url)
         file_obj = io.BytesIO(content.encode())
+        # Infrequent access bills every read and at least 30 days of every object, which progressive playlists,
+        # replaced with every few segments while players poll them, would pay again and again.
+        storage_class = "STANDARD" if is_progressive else "STANDARD_IA"
         self.client.upload_fileobj(
             file_obj,
             s3_path.bucket_id,
             s3_path.key_id,
-            ExtraArgs={"ACL": "public-read", "StorageClass": "STANDARD_IA"},
+            ExtraArgs={"ACL": "public-read", "StorageClass": storage_class},
+        )
+
+    def save_stream(self, relative_path, stream):
+        s3_path = parse_uri(os.path.join(self.destination_url, relative_path))
+        self.client.upload_fileobj(
+            stream,
+            s3_path.bucket_id,
+            s3_path.key_id,
+            ExtraArgs={"ACL": "public-read"},
+            Callback=self.get_upload_callback(get_upload_priority(relative_path)),
         )
 
+    def delete_files(self, relative_paths):
+        s3_path = parse_uri(self.destination_url)
+        keys = [parse_uri(os.path.join(self.destination_url, path)).key_id for path in relative_paths]
+        for start in range(0, len(keys), self.DELETE_BATCH_SIZE):
+            objects = [{"Key": key} for key in keys[start : start + self.DELETE_BATCH_SIZE]]
+            self.client.delete_objects(Bucket=s3_path.bucket_id, Delete={"Objects": objects, "Quiet": True})
+
+    def get_upload_callback(self, priority):
+        # Called by boto3 with the bytes of each part of a file as they are being sent.
+        if self.limiter is None:
+            return None
+        return lambda size: self.limiter.acquire(size, priority)
+
 
 class LocalFileStorage(Storage):
+    """Moves the files of an output to a local or network mounted directory, one file at a time.
+
+    Files are renamed into place when the destination is on the same filesystem, and are otherwise copied by the
+    kernel to a temporary file which is renamed into place before the source is removed. Either way, readers of
+    the destination never see a file half written, and a move cut short is simply done again on the next save.
+
+    Until the transcode is completed, only HLS segments are moved, as ffmpeg renames them into place once they
+    are written. Other files, like MP4 outputs, may still be open for writing and are moved once it is completed.
+    """
+
+    COPY_BLOCK_SIZE = 64 * 1024 * 1024
+    SEGMENT_EXTENSION = ".ts"
+
     def __init__(self, destination_directory):
-        self.destination_directory = destination_directory
+        # Destinations may be given as file:// URLs as well as paths.
+        self.destination_directory = parse_uri(destination_directory).uri_path
         self.is_being_moved = False
 
-    def save(self, source_directory, exclude_m3u8=False):
+    def save(self, source_directory, is_transcode_completed=False):
+        file_paths = [
+            os.path.join(root, filename) for root, dirs, files in os.walk(source_directory) for filename in files
+        ]
+        self.save_files(source_directory, file_paths, is_transcode_completed=is_transcode_completed)
+
+    def save_files(self, source_directory, file_paths, is_transcode_completed=False):
         if self.is_being_moved:
             return
 
         self.is_being_moved = True
-        shutil.move(source_directory, self.destination_directory)
-        self.is_being_moved = False
+        try:
+            files_to_exclude = self.get_files_to_exclude(is_transcode_completed)
+            for path in sorted(file_paths, key=lambda path: (self.is_playlist(path), get_upload_priority(path))):
+                if not is_transcode_completed and not path.endswith(self.SEGMENT_EXTENSION):
+                    continue
+                if not self.should_skip_upload(os.path.basename(path), files_to_exclude) and os.path.isfile(path):
+                    self.move_file(
+                        path, os.path.join(self.destination_directory, os.path.relpath(path, source_directory))
+                    )
+        finally:
+            self.is_being_moved = False
+
+    def move_file(self, source_path, destination_path):
+        mkdir(os.path.dirname(destination_path))
+        try:
+            os.rename(source_path, destination_path)
+            return
+        except OSError as error:
+            if error.errno != errno.EXDEV:
+                raise
+
+        with io.open(source_path, "rb") as source:
+            self.write_file(destination_path, lambda destination: self.copy_file(source, destination))
+        os.remove(source_path)
+
+    def copy_file(self, source, destination):
+        size = os.fstat(source.fileno()).st_size
+        copy = getattr(os, "copy_file_range", None)
+        offset = 0
+        while offset < size:
+            if copy is not None:
+                copied = copy(source.fileno(), destination.fileno(), self.COPY_BLOCK_SIZE, offset, offset)
+            else:
+                copied = os.sendfile(destination.fileno(), source.fileno(), offset, self.COPY_BLOCK_SIZE)
+            if not copied:
+                break
+            offset += copied
+
+    def write_file(self, path, write):
+        # Written next to its destination first, so that it replaces an earlier version at once.
+        temporary_path = path + ".tmp"
+        with io.open(temporary_path, "wb") as file:
+            write(file)
+        os.replace(temporary_path, path)
+
+    def save_text(self, content, is_progressive=False):
+        mkdir(os.path.dirname(self.destination_directory))
+        self.write_file(self.destination_directory, lambda file: file.write(content.encode()))
+
+    def save_stream(self, relative_path, stream):
+        path = os.path.join(self.destination_directory, relative_path)
+        mkdir(os.path.dirname(path))
+        self.write_file(path, lambda file: shutil.copyfileobj(stream, file))
 
-    def save_text(self, content):
-        content_as_bytes = io.BytesIO(content.encode()).read()
-        with open(self.destination_directory, "wb") as fout:
-            fout.write(content_as_bytes)
+    def delete_files(self, relative_paths):
+        for relative_path in relative_paths:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(os.path.join(self.destination_directory, relative_path))
@@ -0,0 +1,89 @@
+import math
+
+
+class MediaPlaylist(object):
+    """A minimal HLS media playlist, enough to read the playlists written by ffmpeg and to stitch
+    several of them into one.
+    """
+
+    VOD = "VOD"
+    EVENT = "EVENT"
+
+    PLAYLIST_TAGS = (
+        "#EXTM3U",
+        "#EXT-X-VERSION",
+        "#EXT-X-TARGETDURATION",
+        "#EXT-X-MEDIA-SEQUENCE",
+        "#EXT-X-PLAYLIST-TYPE",
+        "#EXT-X-ENDLIST",
+    )
+
+    def __init__(self, segments=None, version=3, media_sequence=0, playlist_type=VOD):
+        self.segments = segments or []
+        self.version = version
+        self.media_sequence = media_sequence
+        self.playlist_type = playlist_type
+        self.is_ended = False
+
+    @classmethod
+    def loads(cls, content):
+        playlist = cls()
+        tags = []
+        duration = None
+        for line in content.splitlines():
+            line = line.strip()
+            if not line:
+                continue
+
+            if line.startswith("#EXTINF:"):
+                duration = float(line[len("#EXTINF:") :].split(",")[0])
+            elif line.startswith("#EXT-X-VERSION:"):
+                playlist.version = int(line.split(":")[1])
+            elif line.startswith("#EXT-X-MEDIA-SEQUENCE:"):
+                playlist.media_sequence = int(line.split(":")[1])
+            elif line.startswith("#EXT-X-PLAYLIST-TYPE:"):
+                playlist.playlist_type = line.split(":")[1]
+            elif line.startswith("#EXT-X-ENDLIST"):
+                playlist.is_ended = True
+            elif line.startswith(cls.PLAYLIST_TAGS):
+                continue
+            elif line.startswith("#"):
+                tags.append(line)
+            else:
+                playlist.segments.append({"uri": line, "duration": duration, "tags": tags})
+                tags, duration = [], None
+        return playlist
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as playlist_file:
+            return cls.loads(playlist_file.read())
+
+    @property
+    def target_duration(self):
+        return max([int(math.ceil(segment["duration"])) for segment in self.segments] or [0])
+
+    @property
+    def duration(self):
+        return sum(segment["duration"] for segment in self.segments)
+
+    def extend(self, playlist):
+        self.version = max(self.version, playlist.version)
+        self.segments.extend(playlist.segments)
+
+    def dumps(self, is_ended=True):
+        lines = [
+            "#EXTM3U",
+            "#EXT-X-VERSION:{}".format(self.version),
+            "#EXT-X-TARGETDURATION:{}".format(self.target_duration),
+            "#EXT-X-MEDIA-SEQUENCE:{}".format(self.media_sequence),
+            "#EXT-X-PLAYLIST-TYPE:{}".format(self.playlist_type),
+        ]
+        for segment in self.segments:
+            lines.extend(segment["tags"])
+            lines.append("#EXTINF:{:.6f},".format(segment["duration"]))
+            lines.append(segment["uri"])
+
+        if is_ended:
+            lines.append("#EXT-X-ENDLIST")
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,308 @@
+import contextlib
+import fcntl
+import os
+import re
+import shutil
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from django.conf import settings
+
+from apps.ffmpeg.utils import mkdir
+from .cache import is_process_alive
+
+
+def get_prefetch_path(job_id):
+    return "{}/{}/input".format(settings.TRANSCODED_VIDEOS_PATH, job_id)
+
+
+def get_leases_path(job_id):
+    return get_prefetch_path(job_id) + ".leases"
+
+
+@contextlib.contextmanager
+def lock_prefetched_input(job_id):
+    """Locks the leases of the input, through the directory of the job which outlives them."""
+    directory = os.path.dirname(get_prefetch_path(job_id))
+    mkdir(directory)
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd)
+
+
+def acquire_prefetched_input(job_id):
+    """Takes a lease on the input prefetched for the job, which keeps it from being removed until it is released.
+
+    Every output of the job transcoded on the node reads the same prefetched input, like entries of the input cache.
+    """
+    with lock_prefetched_input(job_id):
+        mkdir(get_leases_path(job_id))
+        lease = os.path.join(get_leases_path(job_id), "{}-{}".format(os.getpid(), uuid.uuid4().hex))
+        open(lease, "w").close()
+    return lease
+
+
+def release_prefetched_input(job_id, lease):
+    """Releases the lease and removes the input once the other outputs of the job don't read it anymore."""
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(lease)
+    remove_prefetched_input(job_id)
+
+
+def is_prefetched_input_in_use(job_id):
+    leases_path = get_leases_path(job_id)
+    if not os.path.isdir(leases_path):
+        return False
+
+    is_in_use = False
+    for lease in os.listdir(leases_path):
+        if is_process_alive(int(lease.split("-")[0])):
+            is_in_use = True
+        else:
+            # Leases of processes which were killed without releasing them.
+            os.remove(os.path.join(leases_path, lease))
+    return is_in_use
+
+
+def remove_prefetched_input(job_id):
+    """Removes the input prefetched for the job, unless a process of the node is still downloading or reading it."""
+    path = get_prefetch_path(job_id)
+    if not os.path.isdir(os.path.dirname(path)):
+        return
+
+    with lock_prefetched_input(job_id):
+        if is_prefetched_input_in_use(job_id):
+            return
+        try:
+            with open(path + ".lock", "r") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                remove_files(path, path + ".done", path + ".lock")
+        except FileNotFoundError:
+            remove_files(path, path + ".done")
+        except BlockingIOError:
+            return
+        shutil.rmtree(get_leases_path(job_id), ignore_errors=True)
+
+
+def remove_files(*file_paths):
+    for file_path in file_paths:
+        try:
+            os.remove(file_path)
+        except FileNotFoundError:
+            pass
+
+
+class RangedDownloader(object):
+    """Downloads a file with concurrent ranged GET requests, keeping track of the parts which are already on disk.
+
+    Only one process of a node downloads a file, others wait for it to complete and reuse it. Readers waiting for
+    parts which aren't on disk yet are woken up with an error once the download fails or is cancelled.
+    """
+
+    BLOCK_SIZE = 1024 * 1024
+    TIMEOUT = 60
+    CONTENT_RANGE_PATTERN = re.compile(r"bytes \d+-\d+/(\d+)")
+
+    def __init__(self, url, path, part_size, max_workers):
+        self.url = url
+        self.path = path
+        self.part_size = part_size
+        self.max_workers = max_workers
+        self.size = None
+        self.completed_parts = set()
+        self.error = None
+        self.is_cancelled = False
+        self.condition = threading.Condition()
+
+    @property
+    def lock_path(self):
+        return self.path + ".lock"
+
+    @property
+    def done_path(self):
+        return self.path + ".done"
+
+    def is_downloaded(self):
+        return os.path.exists(self.done_path)
+
+    @property
+    def part_count(self):
+        return -(-self.size // self.part_size)
+
+    def download(self):
+        mkdir(os.path.dirname(self.path))
+        try:
+            with open(self.lock_path, "w") as lock_file:
+                # Blocks while another process of this node is downloading the same file.
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                if not self.is_downloaded():
+                    self.download_parts()
+            if self.is_downloaded():
+                self.set_size(os.path.getsize(self.path))
+                self.mark_completed(range(self.part_count))
+        except (requests.RequestException, OSError, ValueError) as error:
+            with self.condition:
+                self.error = error
+                self.condition.notify_all()
+            raise
+
+    def download_parts(self):
+        self.set_size(self.get_size())
+        with open(self.path, "wb") as file:
+            file.truncate(self.size)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            # Parts are scheduled in order, so that the head of the file is available first.
+            list(pool.map(self.download_part, range(self.part_count)))
+
+        if not self.is_cancelled:
+            open(self.done_path, "w").close()
+
+    def get_size(self):
+        response = requests.get(self.url, headers={"Range": "bytes=0-0"}, timeout=self.TIMEOUT)
+        response.raise_for_status()
+        match = self.CONTENT_RANGE_PATTERN.match(response.headers.get("Content-Range", ""))
+        if not match:
+            raise ValueError("{} does not support ranged requests".format(self.url))
+        return int(match.group(1))
+
+    def get_part_range(self, index):
+        start = index * self.part_size
+        return start, min(start + self.part_size, self.size)
+
+    def download_part(self, index):
+        if self.is_cancelled:
+            return
+
+        start, end = self.get_part_range(index)
+        headers = {"Range": "bytes={}-{}".format(start, end - 1)}
+        with requests.get(self.url, headers=headers, stream=True, timeout=self.TIMEOUT) as response:
+            response.raise_for_status()
+            with open(self.path, "r+b") as file:
+                file.seek(start)
+                for block in response.iter_content(self.BLOCK_SIZE):
+                    if self.is_cancelled:
+                        return
+                    file.write(block)
+        self.mark_completed([index])
+
+    def cancel(self):
+        with self.condition:
+            self.is_cancelled = True
+            self.condition.notify_all()
+
+    def set_size(self, size):
+        with self.condition:
+            self.size = size
+            self.condition.notify_all()
+
+    def mark_completed(self, indices):
+        with self.condition:
+            self.completed_parts.update(indices)
+            self.condition.notify_all()
+
+    def wait_for_size(self):
+        with self.condition:
+            self.condition.wait_for(lambda: self.size is not None or self.error is not None or self.is_cancelled)
+            self.raise_error()
+            return self.size
+
+    def wait_for_part(self, index):
+        with self.condition:
+            self.condition.wait_for(
+                lambda: index in self.completed_parts or self.error is not None or self.is_cancelled
+            )
+            self.raise_error()
+
+    def raise_error(self):
+        if self.error is not None:
+            raise IOError("Download of {} failed".format(self.url)) from self.error
+        if self.is_cancelled:
+            raise IOError("Download of {} was cancelled".format(self.url))
+
+
+class PrefetchedInputHandler(BaseHTTPRequestHandler):
+    """Serves a file which is being downloaded, holding back every read until the parts it covers are on disk."""
+
+    RANGE_PATTERN = re.compile(r"bytes=(\d+)-(\d*)")
+
+    @property
+    def downloader(self):
+        return self.server.downloader
+
+    def do_HEAD(self):
+        self.send_content_headers(*self.get_requested_range())
+
+    def do_GET(self):
+        start, end, is_partial = self.get_requested_range()
+        if not self.send_content_headers(start, end, is_partial):
+            return
+
+        try:
+            self.send_content(start, end)
+        except (BrokenPipeError, ConnectionResetError):
+            # ffmpeg drops connections when it seeks to another position of the input.
+            pass
+
+    def get_requested_range(self):
+        size = self.downloader.wait_for_size()
+        match = self.RANGE_PATTERN.match(self.headers.get("Range", ""))
+        if not match:
+            return 0, size, False
+
+        start = int(match.group(1))
+        end = int(match.group(2)) + 1 if match.group(2) else size
+        return start, min(end, size), True
+
+    def send_content_headers(self, start, end, is_partial):
+        size = self.downloader.size
+        if is_partial and start >= size:
+            self.send_response(416)
+            self.send_header("Content-Range", "bytes */{}".format(size))
+            self.end_headers()
+            return False
+
+        self.send_response(206 if is_partial else 200)
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(end - start))
+        if is_partial:
+            self.send_header("Content-Range", "bytes {}-{}/{}".format(start, end - 1, size))
+        self.end_headers()
+        return True
+
+    def send_content(self, start, end):
+        part_size = self.downloader.part_size
+        with open(self.downloader.path, "rb") as file:
+            position = start
+            while position < end:
+                index = position // part_size
+                self.downloader.wait_for_part(index)
+                part_end = min(end, (index + 1) * part_size)
+                file.seek(position)
+                while position < part_end:
+                    data = file.read(min(self.downloader.BLOCK_SIZE, part_end - position))
+                    self.wfile.write(data)
+                    position += len(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class PrefetchServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, downloader):
+        super().__init__(("127.0.0.1", 0), PrefetchedInputHandler)
+        self.downloader = downloader
+
+    @property
+    def url(self):
+        return "http://{}:{}/input".format(*self.server_address)
@@ -0,0 +1,79 @@
+import json
+import subprocess
+
+from .inputs import get_input_path
+
+
+class InputProbe(object):
+    """Collects the details of an input which are needed before transcoding it, using ffprobe."""
+
+    KEYFRAME_SCAN_DURATION = 60
+
+    def __init__(self, path):
+        self.path = path
+        self.input_path = get_input_path(path)
+
+    def run(self) -> dict:
+        info = self.ffprobe("-show_format", "-show_streams")
+        video = self.get_stream(info, "video")
+        audio = self.get_stream(info, "audio")
+        probe = {
+            "duration": float(info["format"]["duration"]),
+            "bitrate": self.to_int(info["format"].get("bit_rate")),
+            "streams": [
+                {"index": stream["index"], "type": stream["codec_type"], "codec": stream.get("codec_name")}
+                for stream in info["streams"]
+            ],
+        }
+
+        if video:
+            probe.update(
+                {
+                    "width": video["width"],
+                    "height": video["height"],
+                    "frame_rate": self.parse_frame_rate(video.get("avg_frame_rate")),
+                    "video_codec": video.get("codec_name"),
+                    "video_bitrate": self.to_int(video.get("bit_rate")),
+                    "keyframe_interval": self.get_keyframe_interval(),
+                }
+            )
+
+        if audio:
+            probe.update({"audio_codec": audio.get("codec_name"), "audio_bitrate": self.to_int(audio.get("bit_rate"))})
+        return probe
+
+    def ffprobe(self, *arguments):
+        command = ["ffprobe", "-v", "error", "-print_format", "json", *arguments, self.input_path]
+        output = subprocess.run(command, stdout=subprocess.PIPE, check=True, universal_newlines=True).stdout
+        return json.loads(output)
+
+    def get_stream(self, info, codec_type):
+        for stream in info["streams"]:
+            if stream["codec_type"] == codec_type:
+                return stream
+        return None
+
+    def get_keyframe_interval(self):
+        info = self.ffprobe(
+            "-select_streams",
+            "v:0",
+            "-skip_frame",
+            "nokey",
+            "-read_intervals",
+            "%+{}".format(self.KEYFRAME_SCAN_DURATION),
+            "-show_entries",
+            "frame=best_effort_timestamp_time",
+        )
+        timestamps = [float(frame["best_effort_timestamp_time"]) for frame in info.get("frames", [])]
+        if len(timestamps) < 2:
+            return None
+        return round((timestamps[-1] - timestamps[0]) / (len(timestamps) - 1), 3)
+
+    def parse_frame_rate(self, frame_rate):
+        numerator, _, denominator = (frame_rate or "0/0").partition("/")
+        if not float(denominator or 1):
+            return None
+        return round(float(numerator) / float(denominator or 1), 3)
+
+    def to_int(self, value):
+        return int(value) if value not in (None, "N/A") else None
@@ -0,0 +1,145 @@
+import io
+import os
+import shutil
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlsplit
+
+from apps.ffmpeg.utils import mkdir
+
+
+class RequestBody(io.RawIOBase):
+    """Reads the body of a request while it is being sent, decoding chunked transfer encoding.
+
+    ffmpeg sends the files it writes in chunks, as their size isn't known upfront, so a file can be saved while
+    ffmpeg is still writing it.
+    """
+
+    def __init__(self, rfile, headers):
+        self.rfile = rfile
+        self.is_chunked = headers.get("Transfer-Encoding", "").lower() == "chunked"
+        self.remaining = 0 if self.is_chunked else int(headers.get("Content-Length", 0))
+        self.is_complete = False
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if not self.remaining and not self.next_chunk():
+            return 0
+
+        data = self.rfile.read(min(len(buffer), self.remaining))
+        if not data:
+            raise ConnectionError("Request body ended early")
+        buffer[: len(data)] = data
+        self.remaining -= len(data)
+        if self.is_chunked and not self.remaining:
+            self.rfile.readline()
+        return len(data)
+
+    def next_chunk(self):
+        if not self.is_chunked or self.is_complete:
+            return False
+
+        line = self.rfile.readline()
+        if not line:
+            raise ConnectionError("Request body ended early")
+        self.remaining = int(line.split(b";")[0], 16)
+        if not self.remaining:
+            while self.rfile.readline() not in (b"\r\n", b"\n", b""):
+                continue
+            self.is_complete = True
+        return bool(self.remaining)
+
+
+class UploadProxyHandler(BaseHTTPRequestHandler):
+    """Receives the files which ffmpeg writes with -method PUT, answering once they are saved."""
+
+    protocol_version = "HTTP/1.1"
+    BUFFER_SIZE = 1024 * 1024
+
+    def do_PUT(self):
+        try:
+            self.server.save(self.path, io.BufferedReader(RequestBody(self.rfile, self.headers), self.BUFFER_SIZE))
+        except ValueError:
+            self.close_connection = True
+            self.send_status(400)
+            return
+        except Exception as error:
+            self.server.error = error
+            self.close_connection = True
+            self.send_status(500)
+            return
+        self.send_status(201)
+
+    def send_status(self, code):
+        try:
+            self.send_response(code)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+        except ConnectionError:
+            # ffmpeg doesn't wait for the reply to the last file of an output before exiting.
+            self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+
+class UploadProxyServer(ThreadingHTTPServer):
+    """Saves files written to /<output name>/<path> straight to the storage of the output, without local disk.
+
+    Playlists are also written to the local folder of the job, where the transcode is checkpointed from, and
+    are saved to storage only once they are complete. Paths outside of every output are written locally only.
+    Segments are saved before their request is answered, so every segment listed by a playlist is already saved.
+    The paths of the files saved to storage are kept in saved_files, which is what the transcode is checkpointed by.
+    Files are streamed to storage while they are being received, so an MP4 file is uploaded while it is encoded.
+    Closing the server waits for the requests in progress, as ffmpeg exits without waiting for their replies.
+    """
+
+    daemon_threads = False
+    block_on_close = True
+    PLAYLIST_EXTENSION = ".m3u8"
+    END_TAG = b"#EXT-X-ENDLIST"
+
+    def __init__(self, local_path, storages):
+        super().__init__(("127.0.0.1", 0), UploadProxyHandler)
+        self.local_path = local_path
+        self.storages = storages
+        self.error = None
+        self.playlist_updates = 0
+        self.saved_files = set()
+
+    @property
+    def url(self):
+        return "http://{}:{}".format(*self.server_address)
+
+    def get_relative_path(self, path):
+        relative_path = os.path.normpath(unquote(urlsplit(path).path).lstrip("/"))
+        if relative_path in ("", ".") or relative_path.startswith(".."):
+            raise ValueError("Invalid path {}".format(path))
+        return relative_path
+
+    def save(self, path, body):
+        relative_path = self.get_relative_path(path)
+        name, _, file_path = relative_path.partition("/")
+        storage = self.storages.get(name) if file_path else None
+
+        if relative_path.endswith(self.PLAYLIST_EXTENSION):
+            content = body.read()
+            self.write_locally(relative_path, io.BytesIO(content))
+            if storage and self.END_TAG in content:
+                storage.save_stream(file_path, io.BytesIO(content))
+                self.saved_files.add(relative_path)
+            self.playlist_updates += 1
+        elif storage:
+            storage.save_stream(file_path, body)
+            self.saved_files.add(relative_path)
+        else:
+            self.write_locally(relative_path, body)
+
+    def write_locally(self, relative_path, body):
+        path = os.path.join(self.local_path, relative_path)
+        mkdir(os.path.dirname(path))
+        # Replaced at once, so that readers of the playlist never see it half written.
+        with open(path + ".tmp", "wb") as file:
+            shutil.copyfileobj(body, file)
+        os.replace(path + ".tmp", path)
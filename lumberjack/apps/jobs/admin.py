@@ -2,7 +2,7 @@ from django.contrib import admin
 from django_object_actions import DjangoObjectActions
 
 from apps.jobs.managers import VideoTranscoder
-from apps.jobs.models import Job, Output
+from apps.jobs.models import Job, Output, OutputChunk
 
 
 def stop_tasks(modeladmin, request, queryset):
@@ -54,5 +54,17 @@ class OutputAdmin(admin.ModelAdmin):
     list_display = ["name", "job_id", "get_status", "progress", "created", "start_time", "end_time"]
 
 
+class OutputChunkAdmin(admin.ModelAdmin):
+    def get_status(self, obj):
+        return obj.get_status_display()
+
+    get_status.short_description = "Status"
+
+    search_fields = ["output__job__id"]
+    list_filter = ["status"]
+    list_display = ["output", "index", "get_status", "progress", "start", "duration"]
+
+
 admin.site.register(Job, JobAdmin)
 admin.site.register(Output, OutputAdmin)
+admin.site.register(OutputChunk, OutputChunkAdmin)
@@ -16,14 +16,27 @@ from typing import List
 
 from django.conf import settings
 
+from apps.executors.backpressure import DiskBackPressure
 from apps.executors.base import Status, BaseExecutor
 from apps.executors.cloud import CloudUploader
-from apps.executors.transcoder import FFMpegTranscoder
+from apps.executors.prefetch import InputPrefetcher
+from apps.executors.stream import InputStreamer
+from apps.ffmpeg.cache import get_input_cache
+from apps.executors.transcoder import FFMpegTranscoder, LadderTranscoder
+from apps.executors.upload_proxy import UploadProxy
+from apps.ffmpeg.command_generator import get_job_path
 
 
 class LumberjackController(object):
     def __init__(self) -> None:
         self._executors: List[BaseExecutor] = []
+        # Metrics of the executors shared by the outputs, and of the executors of each output by its name.
+        self.metrics = {}
+        self.output_metrics = {}
+        self._output_executors: List[BaseExecutor] = []
+        self._output_names = {}
+        # Saving the last files of an output may still fail once the transcoder has finished.
+        self.is_output_errored = False
 
     def __enter__(self) -> "LumberjackController":
         return self
@@ -31,20 +44,88 @@ class LumberjackController(object):
     def __exit__(self, *unused_args) -> None:
         self.stop()
 
-    def start(self, config, progress_callback=None) -> "LumberjackController":
+    def start(self, config, progress_callback=None, upload_callback=None) -> "LumberjackController":
+        executors, config = self.get_input_executors(config)
+        output_executors, config = self.get_output_executors(config, [config.get("output")], upload_callback)
+        executors.extend(output_executors)
+        self.set_output_executors(output_executors, [config.get("output")], config)
+        transcoder = FFMpegTranscoder(config, progress_callback, stdin=self.get_stdin(executors))
+        executors.extend(self.get_transcoder_executors(config, [config.get("output")], transcoder))
+        return self.start_executors(executors)
 
+    def start_ladder(self, config, progress_callback=None) -> "LumberjackController":
+        """Starts a single transcoder for all the outputs in config along with an uploader per output."""
+        executors, config = self.get_input_executors(config)
+        output_executors, config = self.get_output_executors(config, config["outputs"])
+        executors.extend(output_executors)
+        self.set_output_executors(output_executors, config["outputs"], config)
+        transcoder = LadderTranscoder(config, progress_callback, stdin=self.get_stdin(executors))
+        executors.extend(self.get_transcoder_executors(config, config["outputs"], transcoder))
+        return self.start_executors(executors)
+
+    def get_input_executors(self, config):
+        """Returns the executors which fetch the input ahead of ffmpeg, along with config updated to read from them."""
+        if config.get("stream_input") and not config.get("chunk"):
+            input_executor = InputStreamer(config)
+        else:
+            cache_entry = get_input_cache().get_entry(config.get("input"))
+            # Taken before checking whether the input is cached, so that it isn't evicted in between.
+            lease = cache_entry.acquire() if cache_entry else None
+            if config.get("prefetch_input") or (cache_entry and cache_entry.is_cached()):
+                input_executor = InputPrefetcher(config, cache_entry, lease)
+            else:
+                if lease is not None:
+                    cache_entry.release(lease)
+                return [], config
+
+        return [input_executor], dict(config, input=input_executor.input_url)
+
+    def get_output_executors(self, config, outputs, upload_callback=None):
+        """Returns the executors which save the files of the outputs, along with config updated to write to them."""
+        if config.get("direct_upload"):
+            upload_proxy = UploadProxy(get_job_path(config), outputs, upload_callback, job_id=config.get("id"))
+            return [upload_proxy], dict(config, upload_url=upload_proxy.url)
+
+        return [
+            CloudUploader(self.get_local_path(config, output), output["url"], upload_callback, job_id=config.get("id"))
+            for output in outputs
+        ], config
+
+    def set_output_executors(self, executors, outputs, config):
+        self._output_executors = executors
+        if not config.get("direct_upload"):
+            # Uploaders are created one per output, unlike the upload proxy which saves the files of every output.
+            self._output_names = {executor: output.get("name") for executor, output in zip(executors, outputs)}
+
+    def get_output_metrics(self, name):
+        """Returns the metrics of the output, along with the metrics shared by every output."""
+        return dict(self.metrics, **self.output_metrics.get(name, {}))
+
+    def get_transcoder_executors(self, config, outputs, transcoder):
+        """Returns the transcoder along with the executor which pauses it while its outputs pile up on the disk."""
+        if config.get("upload_url"):
+            # Files are sent to storage as they are written, so there is nothing to pile up.
+            return [transcoder]
+
+        local_paths = [self.get_local_path(config, output) for output in outputs]
+        # Stopped before the transcoder, so that a paused ffmpeg is continued before it is terminated.
+        return [DiskBackPressure(local_paths, transcoder), transcoder]
+
+    def get_stdin(self, executors):
+        return next((executor.stdin for executor in executors if getattr(executor, "stdin", None) is not None), None)
+
+    def start_executors(self, executors: List[BaseExecutor]) -> "LumberjackController":
         if self._executors:
             raise RuntimeError("Controller already started!")
 
-        local_path = "{}/{}/{}".format(
-            settings.TRANSCODED_VIDEOS_PATH, config.get("id"), config.get("output").get("name")
-        )
-        self._executors.append(CloudUploader(local_path, config.get("output")["url"]))
-        self._executors.append(FFMpegTranscoder(config, progress_callback))
+        self._executors.extend(executors)
         for executor in self._executors:
             executor.start()
         return self
 
+    def get_local_path(self, config, output) -> str:
+        return "{}/{}/{}".format(settings.TRANSCODED_VIDEOS_PATH, config.get("id"), output.get("name"))
+
     def check_status(self) -> Status:
         """Checks the status of all the nodes.
         If one node is errored, this returns Errored; otherwise if one node is
@@ -62,4 +143,13 @@ class LumberjackController(object):
         status = self.check_status()
         for executor in self._executors:
             executor.stop(status)
+            metrics = getattr(executor, "metrics", {})
+            if executor in self._output_names:
+                self.output_metrics[self._output_names[executor]] = dict(metrics)
+            else:
+                self.metrics.update(metrics)
+        if any(executor.check_status() == Status.Errored for executor in self._output_executors):
+            self.is_output_errored = True
         self._executors = []
+        self._output_executors = []
+        self._output_names = {}
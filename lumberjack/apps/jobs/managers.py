@@ -3,8 +3,8 @@ class VideoTranscoder:
         self.job = job
 
     def start(self, sync=False, queue="transcoding"):
-        self.job.create_outputs()
-        self.job.start(sync, queue)
+        # Outputs are created once the input is probed, so that renditions larger than the input can be skipped.
+        self.job.start(sync, queue, create_outputs=True)
 
     def restart(self, sync=False, queue="transcoding"):
         self.job.stop()
@@ -0,0 +1,68 @@
+# Generated by Django 3.1 on 2026-10-18 04:24
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import model_utils.fields
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("jobs", "0003_auto_20201218_1359"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OutputChunk",
+            fields=[
+                (
+                    "created",
+                    model_utils.fields.AutoCreatedField(
+                        default=django.utils.timezone.now, editable=False, verbose_name="created"
+                    ),
+                ),
+                (
+                    "modified",
+                    model_utils.fields.AutoLastModifiedField(
+                        default=django.utils.timezone.now, editable=False, verbose_name="modified"
+                    ),
+                ),
+                ("id", models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ("index", models.PositiveIntegerField(verbose_name="Index")),
+                ("start", models.FloatField(verbose_name="Start Time")),
+                ("duration", models.FloatField(verbose_name="Duration")),
+                ("start_number", models.PositiveIntegerField(default=0, verbose_name="First Segment Number")),
+                (
+                    "status",
+                    model_utils.fields.StatusField(
+                        choices=[
+                            ("not_started", "Not Started"),
+                            ("queued", "Queued"),
+                            ("processing", "Processing"),
+                            ("completed", "Completed"),
+                            ("cancelled", "Cancelled"),
+                            ("error", "Error"),
+                        ],
+                        default="not_started",
+                        max_length=100,
+                        no_check_for_status=True,
+                    ),
+                ),
+                ("progress", models.PositiveSmallIntegerField(default=0, verbose_name="Progress")),
+                ("background_task_id", models.UUIDField(db_index=True, null=True, verbose_name="Background Task Id")),
+                ("playlist", models.TextField(blank=True, null=True, verbose_name="Playlist")),
+                (
+                    "output",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, related_name="chunks", to="jobs.output"
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ("index",),
+                "unique_together": {("output", "index")},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.1 on 2026-10-18 04:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("jobs", "0004_outputchunk"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="job",
+            name="probe",
+            field=models.JSONField(blank=True, null=True, verbose_name="Input Probe"),
+        ),
+    ]
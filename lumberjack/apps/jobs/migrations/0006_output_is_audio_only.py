@@ -0,0 +1,18 @@
+# Generated by Django 3.1 on 2026-10-18 04:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobs', '0005_job_probe'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='output',
+            name='is_audio_only',
+            field=models.BooleanField(default=False, verbose_name='Audio Only'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.1 on 2026-10-18 04:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobs', '0006_output_is_audio_only'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='output',
+            name='threads',
+            field=models.PositiveSmallIntegerField(blank=True, null=True, verbose_name='Threads'),
+        ),
+    ]
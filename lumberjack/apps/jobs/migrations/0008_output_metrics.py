@@ -0,0 +1,18 @@
+# Generated by Django 3.1 on 2026-10-18 04:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobs', '0007_output_threads'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='output',
+            name='metrics',
+            field=models.JSONField(blank=True, null=True, verbose_name='Metrics'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.1 on 2026-10-18 04:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("jobs", "0008_output_metrics"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="output",
+            name="checkpoint",
+            field=models.JSONField(blank=True, null=True, verbose_name="Checkpoint"),
+        ),
+    ]
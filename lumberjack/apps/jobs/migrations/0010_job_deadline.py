@@ -0,0 +1,18 @@
+# Generated by Django 3.1 on 2026-10-18 04:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("jobs", "0009_output_checkpoint"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="job",
+            name="deadline",
+            field=models.DateTimeField(blank=True, null=True, verbose_name="Deadline"),
+        ),
+    ]
@@ -31,6 +31,33 @@ class Job(TimeStampedModel, JobNotifierMixin):
         (ERROR, "Error"),
     )
 
+    PER_OUTPUT = "per_output"
+    SINGLE_DECODE = "single_decode"
+    CHUNKED = "chunked"
+
+    FIXED_PRESET = "fixed"
+    DEADLINE_PRESET = "deadline"
+    SPEED_PRESET = "speed"
+    QUALITY_PRESET = "quality"
+
+    AUDIO_OUTPUT_NAME = "audio"
+
+    # Outputs up to 5% larger than the input are still encoded, to allow for inputs cropped by a few pixels.
+    UPSCALE_TOLERANCE = 1.05
+
+    EXECUTION_MODES = Choices(
+        (PER_OUTPUT, "Transcode each output separately"),
+        (SINGLE_DECODE, "Transcode all outputs from a single decode"),
+        (CHUNKED, "Transcode chunks of each output in parallel"),
+    )
+
+    PRESET_POLICIES = Choices(
+        (FIXED_PRESET, "Use the preset of each output"),
+        (DEADLINE_PRESET, "Pick presets which finish before the deadline of the job"),
+        (SPEED_PRESET, "Pick presets which encode at least as fast as realtime"),
+        (QUALITY_PRESET, "Pick slower presets, taking up to four times the input duration"),
+    )
+
     id = models.UUIDField("Job Id", primary_key=True, default=uuid.uuid4, editable=False, db_index=True)
     template = models.ForeignKey("presets.JobTemplate", null=True, on_delete=models.SET_NULL)
     settings = models.JSONField("Job Settings", null=True)
@@ -43,6 +70,8 @@ class Job(TimeStampedModel, JobNotifierMixin):
     encryption_key = models.CharField("Encryption Key", max_length=1024, null=True)
     key_url = models.CharField("Encryption Key URL", max_length=1024, null=True)
     meta_data = models.JSONField("Meta Data", null=True)
+    probe = models.JSONField("Input Probe", null=True, blank=True)
+    deadline = models.DateTimeField("Deadline", null=True, blank=True)
     start_time = models.DateTimeField(_("start"), null=True, blank=True)
     end_time = models.DateTimeField(_("end"), null=True, blank=True)
 
@@ -53,18 +82,22 @@ class Job(TimeStampedModel, JobNotifierMixin):
         return f"JOB {self.id} - {self.get_status_display()}"
 
     def update_progress(self):
-        progress_dict = self.outputs.aggregate(models.Avg("progress"))
+        progress_dict = self.outputs.exclude(status=Output.SKIPPED).aggregate(models.Avg("progress"))
         self.progress = progress_dict["progress__avg"]
         self.save(update_fields=["progress"])
 
     def create_outputs(self):
         job_settings = copy.deepcopy(self.settings)
         outputs = []
-        for output_settings in job_settings.pop("outputs"):
+        output_ladder = job_settings.pop("outputs")
+        skipped_outputs = self.get_upscaled_outputs(output_ladder)
+        for output_settings in output_ladder:
             output_settings["url"] = self.settings["destination"] + "/" + output_settings["name"]
+            self.cap_video_bitrate(output_settings["video"])
             job_settings["output"] = output_settings
 
             output = Output(
+                status=Output.SKIPPED if output_settings["name"] in skipped_outputs else Output.NOT_STARTED,
                 name=output_settings["name"],
                 video_encoder=output_settings["video"]["codec"],
                 video_bitrate=output_settings["video"]["bitrate"],
@@ -78,8 +111,64 @@ class Job(TimeStampedModel, JobNotifierMixin):
             )
             output.save()
             outputs.append(output)
+
+        if self.settings.get("shared_audio") and self.has_audio():
+            outputs.append(self.create_audio_output(job_settings, output_ladder, skipped_outputs))
         return outputs
 
+    def has_audio(self):
+        # Inputs which weren't probed are taken to have audio.
+        return not self.probe or bool(self.probe.get("audio_codec"))
+
+    def create_audio_output(self, job_settings, output_ladder, skipped_outputs):
+        """Creates an audio only output, which is shared by all the video outputs as a demuxed HLS audio group.
+
+        Audio is encoded with the highest audio bitrate among the encoded outputs, outputs without one count as 0.
+        """
+        ladder = [output for output in output_ladder if output["name"] not in skipped_outputs]
+        audio_settings = max(ladder, key=lambda output: int(output["audio"].get("bitrate") or 0))["audio"]
+        job_settings["output"] = {
+            "name": self.AUDIO_OUTPUT_NAME,
+            "url": self.settings["destination"] + "/" + self.AUDIO_OUTPUT_NAME,
+            "audio": audio_settings,
+        }
+
+        return Output.objects.create(
+            name=self.AUDIO_OUTPUT_NAME,
+            is_audio_only=True,
+            video_bitrate=0,
+            video_preset="",
+            audio_encoder=audio_settings["codec"],
+            audio_bitrate=audio_settings["bitrate"],
+            width=0,
+            height=0,
+            settings=job_settings,
+            job=self,
+        )
+
+    def get_upscaled_outputs(self, output_ladder):
+        """Returns names of the outputs which are larger than the probed input, as encoding them only wastes resources.
+
+        The smallest output is always kept, so that an input smaller than every output still gets transcoded.
+        """
+        if not (self.probe or {}).get("height"):
+            return set()
+
+        source_size = min(self.probe["width"], self.probe["height"]) * self.UPSCALE_TOLERANCE
+        ladder = sorted(output_ladder, key=lambda output: min(output["video"]["width"], output["video"]["height"]))
+        return {
+            output["name"]
+            for output in ladder[1:]
+            if min(output["video"]["width"], output["video"]["height"]) > source_size
+        }
+
+    def cap_video_bitrate(self, video_settings):
+        probe = self.probe or {}
+        source_bitrate = probe.get("video_bitrate") or probe.get("bitrate")
+        # Bitrates of settings may be given as strings.
+        if source_bitrate and video_settings.get("bitrate") and int(video_settings["bitrate"]) > int(source_bitrate):
+            video_settings["bitrate"] = int(source_bitrate)
+
     def populate_settings(self):
         if self.template is not None:
             settings = self.template.settings or {}
@@ -97,17 +186,70 @@ class Job(TimeStampedModel, JobNotifierMixin):
 
         self.settings = settings
 
-    def start(self, sync=False, queue="transcoding"):
+    @property
+    def execution_mode(self):
+        return (self.settings or {}).get("execution_mode", Job.PER_OUTPUT)
+
+    @property
+    def preset_policy(self):
+        return (self.settings or {}).get("preset_policy") or (
+            Job.DEADLINE_PRESET if self.deadline else Job.FIXED_PRESET
+        )
+
+    def start(self, sync=False, queue="transcoding", create_outputs=False):
         self.status = Job.QUEUED
         self.save()
 
-        for output in self.outputs.all():
+        # Outputs of a job whose first probe failed were never created, like when it is restarted.
+        create_outputs = create_outputs or not self.outputs.exists()
+        if self.probe is None:
+            self.start_probe_task(queue, sync, create_outputs)
+            return
+
+        if create_outputs:
+            self.create_outputs()
+        self.start_outputs(queue, sync)
+
+    def start_probe_task(self, queue, sync=False, create_outputs=False):
+        from .tasks import InputProbeTask
+
+        kwargs = {"job_id": self.id, "queue": queue, "sync": sync, "create_outputs": create_outputs}
+        if sync:
+            task = InputProbeTask.apply(kwargs=kwargs)
+        else:
+            task = InputProbeTask.apply_async(kwargs=kwargs, queue=queue)
+
+        self.background_task_id = task.task_id
+        self.save(update_fields=["background_task_id"])
+
+    def start_outputs(self, queue, sync=False):
+        if self.execution_mode == Job.SINGLE_DECODE:
+            self.start_task(queue, sync)
+            return
+
+        for output in self.outputs.exclude(status=Output.SKIPPED):
             output.start_task(queue, sync)
 
+    def start_task(self, queue, sync=False):
+        from .tasks import LadderTranscoderTask
+
+        if sync:
+            task = LadderTranscoderTask.apply(kwargs={"job_id": self.id})
+        else:
+            task = LadderTranscoderTask.apply_async(kwargs={"job_id": self.id}, queue=queue)
+
+        self.background_task_id = task.task_id
+        self.save(update_fields=["background_task_id"])
+        # All outputs are transcoded by the same task, so stopping any of them stops the whole job.
+        self.outputs.update(background_task_id=task.task_id)
+
     def stop(self):
         if self.status == Job.COMPLETED:
             return
 
+        if self.background_task_id:
+            app.control.revoke(self.background_task_id, terminate=True, signal="SIGUSR1")
+
         for output in self.outputs.all():
             output.stop_task()
 
@@ -147,6 +289,7 @@ class Output(AbstractOutput):
     COMPLETED = "completed"
     CANCELLED = "cancelled"
     ERROR = "error"
+    SKIPPED = "skipped"
 
     STATUS = Choices(
         (NOT_STARTED, "Not Started"),
@@ -155,6 +298,7 @@ class Output(AbstractOutput):
         (COMPLETED, "Completed"),
         (CANCELLED, "Cancelled"),
         (ERROR, "Error"),
+        (SKIPPED, "Skipped"),
     )
 
     job = models.ForeignKey(Job, null=True, on_delete=models.SET_NULL, related_name="outputs")
@@ -163,6 +307,10 @@ class Output(AbstractOutput):
     background_task_id = models.UUIDField("Background Task Id", db_index=True, null=True, max_length=255)
     settings = models.JSONField("Settings", null=True)
     error_message = models.TextField("Error Message", null=True, blank=True)
+    is_audio_only = models.BooleanField("Audio Only", default=False)
+    threads = models.PositiveSmallIntegerField("Threads", null=True, blank=True)
+    metrics = models.JSONField("Metrics", null=True, blank=True)
+    checkpoint = models.JSONField("Checkpoint", null=True, blank=True)
     start_time = models.DateTimeField(_("start"), null=True, blank=True)
     end_time = models.DateTimeField(_("end"), null=True, blank=True)
 
@@ -171,20 +319,113 @@ class Output(AbstractOutput):
         return f"{self.width}x{self.height}"
 
     def start_task(self, queue, sync=False):
-        from .tasks import VideoTranscoderTask
+        from .tasks import VideoTranscoderTask, ChunkPlannerTask
+
+        task_class = VideoTranscoderTask
+        kwargs = {"job_id": self.job.id, "output_id": self.id}
+        if self.job.execution_mode == Job.CHUNKED:
+            task_class = ChunkPlannerTask
+            kwargs.update({"queue": queue, "sync": sync})
 
         if sync:
-            task = VideoTranscoderTask.apply(kwargs={"job_id": self.job.id, "output_id": self.id})
+            task = task_class.apply(kwargs=kwargs)
         else:
-            task = VideoTranscoderTask.apply_async(kwargs={"job_id": self.job.id, "output_id": self.id}, queue=queue)
+            task = task_class.apply_async(kwargs=kwargs, queue=queue)
 
         self.background_task_id = task.task_id
         self.save()
 
+    def create_chunks(self, duration, chunk_duration, segment_length):
+        """Splits the output into chunks of chunk_duration seconds.
+
+        Chunk boundaries fall on segment boundaries so that every chunk starts with a new segment and keyframe.
+        """
+        self.chunks.all().delete()
+        chunk_duration = max(segment_length, chunk_duration - chunk_duration % segment_length)
+        chunks = []
+        start = 0
+        while start < duration:
+            chunk = OutputChunk(
+                output=self,
+                index=len(chunks),
+                start=start,
+                duration=min(chunk_duration, duration - start),
+                start_number=int(start // segment_length),
+            )
+            chunks.append(chunk)
+            start += chunk_duration
+        return OutputChunk.objects.bulk_create(chunks)
+
     def stop_task(self):
         app.control.revoke(self.background_task_id, terminate=True, signal="SIGUSR1")
+        for chunk in self.chunks.exclude(background_task_id=None):
+            chunk.stop_task()
 
     def __str__(self):
         if self.status == self.PROCESSING:
             return f"{self.name} - {self.job_id} - {self.progress}% Transcoded"
         return f"{self.name} - {self.job_id} - {self.get_status_display()}"
+
+
+class OutputChunk(TimeStampedModel):
+    NOT_STARTED = "not_started"
+    QUEUED = "queued"
+    PROCESSING = "processing"
+    COMPLETED = "completed"
+    CANCELLED = "cancelled"
+    ERROR = "error"
+
+    STATUS = Choices(
+        (NOT_STARTED, "Not Started"),
+        (QUEUED, "Queued"),
+        (PROCESSING, "Processing"),
+        (COMPLETED, "Completed"),
+        (CANCELLED, "Cancelled"),
+        (ERROR, "Error"),
+    )
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    output = models.ForeignKey(Output, on_delete=models.CASCADE, related_name="chunks")
+    index = models.PositiveIntegerField("Index")
+    start = models.FloatField("Start Time")
+    duration = models.FloatField("Duration")
+    start_number = models.PositiveIntegerField("First Segment Number", default=0)
+    status = StatusField()
+    progress = models.PositiveSmallIntegerField("Progress", default=0)
+    background_task_id = models.UUIDField("Background Task Id", db_index=True, null=True, max_length=255)
+    playlist = models.TextField("Playlist", null=True, blank=True)
+
+    class Meta:
+        ordering = ("index",)
+        unique_together = ("output", "index")
+
+    def __str__(self):
+        return f"{self.output.name} - {self.output.job_id} - Chunk {self.index}"
+
+    @property
+    def settings(self):
+        settings = copy.deepcopy(self.output.settings)
+        extension = "mp4" if settings.get("format").lower() == "mp4" else "m3u8"
+        settings["file_name"] = f"chunk_{self.index}.{extension}"
+        settings["chunk"] = {
+            "index": self.index,
+            "start": self.start,
+            "duration": self.duration,
+            "start_number": self.start_number,
+        }
+        return settings
+
+    def start_task(self, queue, sync=False):
+        from .tasks import ChunkTranscoderTask
+
+        kwargs = {"job_id": self.output.job_id, "output_id": self.output_id, "chunk_id": self.id}
+        if sync:
+            task = ChunkTranscoderTask.apply(kwargs=kwargs)
+        else:
+            task = ChunkTranscoderTask.apply_async(kwargs=kwargs, queue=queue)
+
+        self.background_task_id = task.task_id
+        self.save(update_fields=["background_task_id"])
+
+    def stop_task(self):
+        app.control.revoke(self.background_task_id, terminate=True, signal="SIGUSR1")
@@ -0,0 +1,114 @@
+from django.conf import settings
+from django.utils.timezone import now
+
+from apps.jobs.models import Job, Output
+
+
+class PresetSelector(object):
+    """Picks the encoder preset of each rendition from the time the job can spend on it.
+
+    The time needed with every preset is estimated from how fast earlier outputs of the same codec and height
+    were encoded, and the slowest preset which finishes within the budget is picked. Presets without history
+    are estimated from the ones with history by their speed relative to each other. When too many outputs are
+    waiting to be transcoded, the next faster preset is used so that the queue drains sooner.
+    """
+
+    # Slowest first, x264 and x265 share the same preset names.
+    PRESETS = ("veryslow", "slower", "slow", "medium", "fast", "faster", "veryfast", "superfast", "ultrafast")
+
+    # Rough encoding speed of each preset relative to medium, used for presets without history.
+    RELATIVE_SPEEDS = {
+        "veryslow": 0.12,
+        "slower": 0.3,
+        "slow": 0.6,
+        "medium": 1.0,
+        "fast": 1.8,
+        "faster": 2.5,
+        "veryfast": 4.0,
+        "superfast": 6.0,
+        "ultrafast": 8.0,
+    }
+
+    # Encoding time allowed by the speed and quality policies, as a multiple of the duration of the input.
+    DURATION_BUDGETS = {Job.SPEED_PRESET: 1.0, Job.QUALITY_PRESET: 4.0}
+
+    HISTORY_SIZE = 20
+
+    def __init__(self, job):
+        self.job = job
+        self.policy = job.preset_policy
+        self.speeds = {}
+
+    @property
+    def is_enabled(self):
+        if self.policy == Job.DEADLINE_PRESET:
+            return bool(self.job.deadline)
+        return self.policy in self.DURATION_BUDGETS
+
+    def get_budget(self, duration):
+        if self.policy == Job.DEADLINE_PRESET:
+            return max(0, (self.job.deadline - now()).total_seconds())
+        return duration * self.DURATION_BUDGETS[self.policy]
+
+    def select(self, video, duration):
+        """Returns the preset to encode the video settings of a rendition with, for an input of duration seconds."""
+        preset = video.get("preset")
+        if not self.is_enabled or not duration:
+            return preset
+
+        speeds = self.get_speeds(video.get("codec"), video.get("height"))
+        if speeds:
+            budget = self.get_budget(duration)
+            fitting_presets = [candidate for candidate in self.PRESETS if duration / speeds[candidate] <= budget]
+            preset = fitting_presets[0] if fitting_presets else self.PRESETS[-1]
+
+        if self.is_cluster_behind() and preset in self.PRESETS:
+            preset = self.PRESETS[min(self.PRESETS.index(preset) + 1, len(self.PRESETS) - 1)]
+        return preset
+
+    def get_speeds(self, codec, height):
+        """Returns the estimated seconds of input encoded per second with each preset, or None without history."""
+        if (codec, height) not in self.speeds:
+            self.speeds[(codec, height)] = self.estimate_speeds(self.get_measured_speeds(codec, height))
+        return self.speeds[(codec, height)]
+
+    def estimate_speeds(self, measured_speeds):
+        if not measured_speeds:
+            return None
+
+        # Speed of medium, as estimated from each preset with history.
+        medium_speeds = [speed / self.RELATIVE_SPEEDS[preset] for preset, speed in measured_speeds.items()]
+        medium_speed = sum(medium_speeds) / len(medium_speeds)
+        return {
+            preset: measured_speeds.get(preset, medium_speed * self.RELATIVE_SPEEDS[preset]) for preset in self.PRESETS
+        }
+
+    def get_measured_speeds(self, codec, height):
+        outputs = (
+            Output.objects.filter(
+                status=Output.COMPLETED,
+                video_encoder=codec,
+                height=height,
+                video_preset__in=self.PRESETS,
+                start_time__isnull=False,
+                end_time__isnull=False,
+            )
+            .select_related("job")
+            .order_by("-end_time")[: self.HISTORY_SIZE]
+        )
+
+        samples = {}
+        for output in outputs:
+            duration = (output.job.probe or {}).get("duration")
+            encoding_time = (output.end_time - output.start_time).total_seconds()
+            # Chunked outputs are encoded by several workers at once, which doesn't tell the speed of one of them.
+            if not duration or encoding_time <= 0 or (output.settings or {}).get("execution_mode") == Job.CHUNKED:
+                continue
+            samples.setdefault(output.video_preset, []).append(duration / encoding_time)
+        return {preset: sum(speeds) / len(speeds) for preset, speeds in samples.items()}
+
+    def is_cluster_behind(self):
+        waiting_outputs = Output.objects.filter(
+            status__in=[Output.NOT_STARTED, Output.QUEUED], job__status__in=[Job.QUEUED, Job.PROCESSING]
+        ).exclude(job=self.job)
+        return waiting_outputs.count() > settings.TRANSCODER_BACKLOG_THRESHOLD
@@ -1,17 +1,31 @@
+import contextlib
+import copy
 import time
 import os
+import shlex
+import shutil
+import subprocess
 
+from botocore.exceptions import BotoCoreError, ClientError
 from celery.exceptions import SoftTimeLimitExceeded
 
+from django.conf import settings
 from django.shortcuts import get_object_or_404
 from django.utils.timezone import now
-from django.db import transaction
+from django.db import models, transaction
 
+from apps.ffmpeg.command_generator import CommandGenerator, ConcatCommandGenerator, HLSOptions
+from apps.ffmpeg.inputs import get_input_path, get_input_fingerprint
 from apps.ffmpeg.outputs import OutputFileFactory
+from apps.ffmpeg.playlist import MediaPlaylist
+from apps.ffmpeg.prefetch import remove_prefetched_input
+from apps.ffmpeg.probe import InputProbe
 from apps.jobs.controller import LumberjackController
 from apps.executors.base import Status
-from apps.jobs.models import Job, Output
-from apps.ffmpeg.utils import generate_file_name_from_format
+from apps.executors.resources import CPUBudget, get_worker_index
+from apps.jobs.models import Job, Output, OutputChunk
+from apps.jobs.preset_selection import PresetSelector
+from apps.ffmpeg.utils import generate_file_name_from_format, mkdir
 
 
 class LumberjackRunnable(object):
@@ -44,17 +58,63 @@ class LumberjackRunnableException(Exception):
         super(LumberjackRunnableException, self).__init__(message, cause)
 
 
+class InputProbeRunnable(LumberjackRunnable):
+    """Probes the input of a job once, before its outputs are started.
+
+    Probes are reused from earlier jobs of the same input, as long as its ETag and size haven't changed.
+    """
+
+    OPTIONAL_ARGUMENTS = ["queue", "sync", "create_outputs"]
+
+    def do_run(self, *args, **kwargs):
+        self.job = Job.objects.get(id=self.job_id)
+
+        try:
+            self.job.probe = self.get_probe()
+        except (subprocess.CalledProcessError, ValueError, KeyError, OSError, ClientError, BotoCoreError) as error:
+            self.update_job_as_error_and_notify(error)
+            return
+
+        self.job.save(update_fields=["probe"])
+        if self.create_outputs:
+            self.job.create_outputs()
+        self.job.start_outputs(self.queue or "transcoding", self.sync)
+
+    def get_probe(self):
+        fingerprint = get_input_fingerprint(self.job.input_url)
+        if fingerprint:
+            probed_job = (
+                Job.objects.filter(input_url=self.job.input_url, probe__fingerprint=fingerprint)
+                .exclude(id=self.job.id)
+                .first()
+            )
+            if probed_job:
+                return probed_job.probe
+
+        probe = InputProbe(self.job.input_url).run()
+        probe["fingerprint"] = fingerprint
+        return probe
+
+    def update_job_as_error_and_notify(self, error):
+        self.job.outputs.update(status=Output.ERROR, error_message=error)
+        self.job.status = Job.ERROR
+        self.job.save()
+        self.job.notify_webhook()
+
+
 class VideoTranscoderRunnable(LumberjackRunnable):
     def do_run(self, *args, **kwargs):
         self.initialize()
         controller = LumberjackController()
 
-        with controller.start(self.output.settings, self.update_progress):
+        is_completed = False
+        with self.start_controller(controller):
             try:
                 while True:
                     status = controller.check_status()
                     if status == Status.Finished:
                         self.update_output_as_completed()
+                        is_completed = True
                         break
                     elif status == Status.Errored:
                         self.handle_ffmpeg_exception(None)
@@ -67,11 +127,21 @@ class VideoTranscoderRunnable(LumberjackRunnable):
                 self.update_output_as_cancelled()
                 controller.stop()
 
+        if is_completed and controller.is_output_errored:
+            # The last files of the output failed to be saved while its executors were stopped.
+            self.handle_ffmpeg_exception(None)
+
+        self.save_metrics(controller)
+        self.complete_checkpoint()
+        self.finalize()
+
+    def finalize(self):
         with transaction.atomic():
             if self.is_transcoding_completed():
                 self.complete_job()
                 self.notify_webhook()
                 self.generate_manifest()
+                remove_prefetched_input(self.job.id.hex)
 
     def handle_ffmpeg_exception(self, error):
         self.save_exception(error)
@@ -80,19 +150,149 @@ class VideoTranscoderRunnable(LumberjackRunnable):
         if not self.is_job_status_error():
             self.update_job_as_error_and_notify()
 
+    def start_controller(self, controller):
+        self.transcoder_settings = self.get_transcoder_settings(self.output.settings)
+        self.resumed_segments = (self.output.checkpoint or {}).get("segments", [])
+        if self.resumed_segments and self.is_hls:
+            self.transcoder_settings["resume"] = {
+                "start": MediaPlaylist(segments=self.resumed_segments).duration,
+                "start_number": len(self.resumed_segments),
+            }
+        if self.is_hls:
+            # Playlist left behind by an earlier attempt on this node would be taken for segments of this one.
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(CommandGenerator(self.transcoder_settings).output_path)
+        return controller.start(self.transcoder_settings, self.update_progress, self.update_checkpoint)
+
+    @property
+    def is_hls(self):
+        return self.output.settings.get("format", "").lower() == "hls"
+
+    def update_checkpoint(self, saved_files=None):
+        """Records the segments which are uploaded, so that a restarted task resumes after the last of them.
+
+        Uploaded segments are removed from the output folder, so the leading segments of the playlist which are
+        missing from it are the ones already uploaded. Segments sent straight to storage are never written to the
+        folder, so those are the ones in saved_files, the paths relative to the job folder of the saved files.
+        """
+        if not self.is_hls:
+            return
+
+        playlist_path = CommandGenerator(self.transcoder_settings).output_path
+        if not os.path.exists(playlist_path):
+            return
+
+        segments = list(self.resumed_segments)
+        output_directory = "{}/{}/{}".format(
+            settings.TRANSCODED_VIDEOS_PATH,
+            self.transcoder_settings.get("id"),
+            self.transcoder_settings["output"]["name"],
+        )
+        playlist = MediaPlaylist.load(playlist_path)
+        for segment in playlist.segments:
+            if saved_files is None:
+                is_uploaded = not os.path.exists(os.path.join(output_directory, segment["uri"]))
+            else:
+                is_uploaded = os.path.join(self.transcoder_settings["output"]["name"], segment["uri"]) in saved_files
+            if not is_uploaded:
+                break
+            segments.append(segment)
+
+        checkpoint = {"segments": segments}
+        if checkpoint != self.output.checkpoint:
+            published_segments = (self.output.checkpoint or {}).get("segments", [])
+            self.output.checkpoint = checkpoint
+            Output.objects.filter(id=self.output.id).update(checkpoint=checkpoint)
+            # Complete playlists are uploaded along with the last segments, and must not be replaced.
+            if self.is_progressive and not playlist.is_ended:
+                self.publish_playlist(os.path.basename(playlist_path), segments, len(published_segments))
+
+    @property
+    def is_progressive(self):
+        return self.is_hls and bool(self.output.settings.get("progressive"))
+
+    def publish_playlist(self, file_name, segments, published_count):
+        """Publishes the uploaded segments as an EVENT playlist, along with the manifest once they can be played."""
+        playlist = MediaPlaylist(segments=list(segments), playlist_type=MediaPlaylist.EVENT)
+        storage = OutputFileFactory.create(self.output.settings["output"]["url"] + "/" + file_name)
+        storage.save_text(playlist.dumps(is_ended=False), is_progressive=True)
+
+        if published_count < settings.PROGRESSIVE_MIN_SEGMENTS <= len(segments):
+            ManifestGeneratorRunnable(job_id=self.job.id, is_progressive=True).run()
+
+    def complete_checkpoint(self):
+        """Uploads the playlist of a resumed transcode, listing the segments uploaded before it was resumed too."""
+        if self.output.status != Output.COMPLETED:
+            return
+
+        if self.transcoder_settings.get("resume"):
+            playlist_path = CommandGenerator(self.transcoder_settings).output_path
+            resumed_playlist = MediaPlaylist.load(playlist_path)
+            playlist = MediaPlaylist(
+                segments=list(self.resumed_segments), playlist_type=resumed_playlist.playlist_type
+            )
+            playlist.extend(resumed_playlist)
+            storage = OutputFileFactory.create(
+                self.output.settings["output"]["url"] + "/" + os.path.basename(playlist_path)
+            )
+            storage.save_text(playlist.dumps())
+            shutil.rmtree(os.path.dirname(playlist_path), ignore_errors=True)
+
+        self.output.checkpoint = None
+        Output.objects.filter(id=self.output.id).update(checkpoint=None)
+
+    def get_transcoder_settings(self, settings):
+        settings = dict(
+            copy.deepcopy(settings),
+            probe=self.job.probe,
+            threads=self.cpu_budget.threads,
+            cpu_affinity=self.cpu_budget.get_affinity(get_worker_index()),
+        )
+        self.select_presets(settings)
+        return settings
+
+    def select_presets(self, settings):
+        selector = PresetSelector(self.job)
+        if not selector.is_enabled:
+            return
+
+        duration = (self.job.probe or {}).get("duration")
+        for output in settings["outputs"] if "outputs" in settings else [settings["output"]]:
+            video = output.get("video")
+            if not video:
+                continue
+
+            preset = selector.select(video, duration)
+            if preset != video.get("preset"):
+                video["preset"] = preset
+                self.save_video_preset(output["name"], preset)
+
+    def save_video_preset(self, name, preset):
+        self.output.video_preset = preset
+        Output.objects.filter(id=self.output.id).update(video_preset=preset)
+
     def initialize(self):
         self.job = Job.objects.get(id=self.job_id)
         self.output = Output.objects.get(id=self.output_id)
+        self.cpu_budget = CPUBudget.detect()
+        self.update_job_as_processing()
+        self.update_output_as_processing()
 
+    def save_metrics(self, controller):
+        metrics = controller.get_output_metrics(self.output.name)
+        if isinstance(metrics, dict) and metrics:
+            self.output.metrics = dict(self.output.metrics or {}, **metrics)
+            self.output.save(update_fields=["metrics"])
+
+    def update_job_as_processing(self):
         if self.job.status != Job.PROCESSING:
             self.job.status = Job.PROCESSING
             self.job.start_time = now()
             self.job.save()
             self.job.notify_webhook()
-        self.update_output_as_processing()
 
     def is_transcoding_completed(self):
-        return not self.job.outputs.exclude(status=Output.COMPLETED).exists()
+        return not self.job.outputs.exclude(status__in=[Output.COMPLETED, Output.SKIPPED]).exists()
 
     def complete_job(self):
         job = Job.objects.select_for_update().get(id=self.job.id)
@@ -128,6 +328,7 @@ class VideoTranscoderRunnable(LumberjackRunnable):
     def update_output_as_processing(self):
         self.output.status = Output.PROCESSING
         self.output.start_time = now()
+        self.output.threads = self.cpu_budget.threads
         self.output.save()
 
     def update_output_as_completed(self):
@@ -154,16 +355,284 @@ class VideoTranscoderRunnable(LumberjackRunnable):
         self.job.notify_webhook()
 
 
-class ManifestGeneratorRunnable(LumberjackRunnable):
+class LadderTranscoderRunnable(VideoTranscoderRunnable):
+    """Transcodes all the outputs of a job with a single ffmpeg process.
+
+    Progress and status are tracked on every output of the job, as all of them are produced together.
+    """
+
+    def start_controller(self, controller):
+        return controller.start_ladder(self.get_transcoder_settings(self.ladder_settings), self.update_progress)
+
+    def complete_checkpoint(self):
+        # Ladders restart from the beginning, as their outputs are uploaded independently of each other.
+        pass
+
+    def initialize(self):
+        self.job = Job.objects.get(id=self.job_id)
+        self.outputs = self.job.outputs.exclude(status=Output.SKIPPED).order_by("created")
+        self.cpu_budget = CPUBudget.detect()
+        self.progress = 0
+        self.update_job_as_processing()
+        self.update_output_as_processing()
+
+    @property
+    def ladder_settings(self):
+        settings = copy.deepcopy(self.job.settings)
+        settings["outputs"] = [output.settings["output"] for output in self.outputs]
+        return settings
+
+    def is_multiple_of_five(self, percentage):
+        return (percentage % 5) == 0 and self.progress != percentage
+
+    def update_progress(self, percentage):
+        if self.is_multiple_of_five(percentage):
+            self.progress = percentage
+            self.outputs.update(progress=percentage)
+            self.job.update_progress()
+
+    def save_metrics(self, controller):
+        # Every output has an uploader of its own, whose metrics are merged into the ones already stored.
+        for output in self.outputs:
+            metrics = controller.get_output_metrics(output.name)
+            if isinstance(metrics, dict) and metrics:
+                output.metrics = dict(output.metrics or {}, **metrics)
+                output.save(update_fields=["metrics"])
+
+    def save_video_preset(self, name, preset):
+        self.outputs.filter(name=name).update(video_preset=preset)
+
+    def save_exception(self, error):
+        self.outputs.update(error_message=error)
+
+    def update_output_as_cancelled(self):
+        self.outputs.update(status=Output.CANCELLED)
+
+    def update_output_as_processing(self):
+        self.outputs.update(status=Output.PROCESSING, start_time=now(), threads=self.cpu_budget.threads)
+
+    def update_output_as_completed(self):
+        self.outputs.update(status=Output.COMPLETED, end_time=now())
+
+    def update_output_as_error(self):
+        self.outputs.update(status=Output.ERROR, end_time=now())
+
+    def stop_job(self):
+        # Every output of the job is transcoded by this task, which is going to be stopped anyway.
+        pass
+
+
+class ChunkPlannerRunnable(VideoTranscoderRunnable):
+    """Splits an output into chunks and starts a task for each of them, so that they are transcoded in parallel."""
+
+    OPTIONAL_ARGUMENTS = ["queue", "sync"]
+    DEFAULT_CHUNK_DURATION = 300
+
     def do_run(self, *args, **kwargs):
         self.initialize()
-        self.generate_manifest_content()
-        self.upload()
+        # Picked once for the whole output, so that every chunk is encoded with the same preset.
+        self.select_presets(self.output.settings)
+        duration = self.job.probe["duration"]
+        chunk_duration = self.job.settings.get("chunk_duration", self.DEFAULT_CHUNK_DURATION)
+        segment_length = self.job.settings.get("segment_length", HLSOptions.DEFAULT_SEGMENT_LENGTH)
+        for chunk in self.output.create_chunks(duration, chunk_duration, segment_length):
+            chunk.start_task(self.queue or "transcoding", self.sync)
+
+    def save_video_preset(self, name, preset):
+        super().save_video_preset(name, preset)
+        Output.objects.filter(id=self.output.id).update(settings=self.output.settings)
+
+
+class ChunkTranscoderRunnable(VideoTranscoderRunnable):
+    def start_controller(self, controller):
+        return controller.start(self.get_transcoder_settings(self.chunk.settings), self.update_progress)
+
+    def select_presets(self, settings):
+        # The planner already picked the preset of the output for its whole duration.
+        pass
+
+    def complete_checkpoint(self):
+        # Chunks are short enough to be transcoded again from their start.
+        pass
+
+    def initialize(self):
+        self.chunk = OutputChunk.objects.get(id=self.chunk_id)
+        super().initialize()
+
+    def update_output_as_processing(self):
+        self.chunk.status = OutputChunk.PROCESSING
+        self.chunk.save()
+
+        if self.output.status != Output.PROCESSING:
+            super().update_output_as_processing()
+
+    def is_multiple_of_five(self, percentage):
+        return (percentage % 5) == 0 and self.chunk.progress != percentage
+
+    def update_progress(self, percentage):
+        if self.is_multiple_of_five(percentage):
+            self.chunk.progress = percentage
+            self.chunk.save(update_fields=["progress"])
+            progress_dict = self.output.chunks.aggregate(models.Avg("progress"))
+            self.output.progress = progress_dict["progress__avg"]
+            self.output.save(update_fields=["progress"])
+            self.job.update_progress()
+
+    def update_output_as_completed(self):
+        # Status is saved while the output is locked in finalize(), so that only the last chunk starts packaging.
+        self.chunk.status = OutputChunk.COMPLETED
+        self.chunk.playlist = self.read_playlist()
+
+    def update_output_as_cancelled(self):
+        self.chunk.status = OutputChunk.CANCELLED
+        self.chunk.save()
+        super().update_output_as_cancelled()
+
+    def update_output_as_error(self):
+        self.chunk.status = OutputChunk.ERROR
+        self.chunk.save()
+        super().update_output_as_error()
+
+    def read_playlist(self):
+        chunk_settings = self.chunk.settings
+        if chunk_settings.get("format").lower() != "hls":
+            return None
+
+        path = "{}/{}/{}/{}".format(
+            settings.TRANSCODED_VIDEOS_PATH,
+            chunk_settings.get("id"),
+            chunk_settings.get("output")["name"],
+            chunk_settings.get("file_name"),
+        )
+        with open(path) as playlist:
+            return playlist.read()
+
+    def stop_job(self):
+        super().stop_job()
+        for chunk in self.output.chunks.exclude(id=self.chunk.id).exclude(background_task_id=None):
+            chunk.stop_task()
+
+    def finalize(self):
+        with transaction.atomic():
+            Output.objects.select_for_update().get(id=self.output.id)
+            if self.chunk.status != OutputChunk.COMPLETED:
+                return
+
+            self.chunk.save()
+            if not self.output.chunks.exclude(status=OutputChunk.COMPLETED).exists():
+                transaction.on_commit(self.start_packager_task)
+
+    def start_packager_task(self):
+        from .tasks import OutputPackagerTask
+
+        OutputPackagerTask.apply_async(kwargs={"job_id": self.job.id, "output_id": self.output.id})
+
+
+class OutputPackagerRunnable(VideoTranscoderRunnable):
+    """Stitches the transcoded chunks of an output into a single playlist or MP4 file.
+
+    The playlists or files of the chunks are deleted from the destination once they are packaged.
+    """
+
+    def do_run(self, *args, **kwargs):
+        self.job = Job.objects.get(id=self.job_id)
+        self.output = Output.objects.get(id=self.output_id)
+
+        try:
+            if self.output.settings.get("format").lower() == "hls":
+                self.stitch_playlists()
+            else:
+                self.concat_chunks()
+        except (subprocess.CalledProcessError, OSError) as error:
+            self.handle_ffmpeg_exception(error)
+            return
+
+        self.delete_chunk_files()
+        self.update_output_as_completed()
+        self.finalize()
+
+    def delete_chunk_files(self):
+        # Files left behind are only wasted storage, which doesn't fail the packaged output.
+        with contextlib.suppress(ClientError, BotoCoreError, OSError):
+            OutputFileFactory.create(self.destination_url).delete_files(
+                [chunk.settings["file_name"] for chunk in self.output.chunks.all()]
+            )
+
+    @property
+    def file_name(self):
+        return self.output.settings.get("file_name") or generate_file_name_from_format(
+            self.output.settings.get("format")
+        )
+
+    @property
+    def destination_url(self):
+        return self.output.settings["output"]["url"]
+
+    def stitch_playlists(self):
+        playlist = MediaPlaylist()
+        for chunk in self.output.chunks.all():
+            chunk_playlist = MediaPlaylist.loads(chunk.playlist)
+            if chunk.index == 0:
+                playlist.media_sequence = chunk_playlist.media_sequence
+            playlist.extend(chunk_playlist)
+
+        storage = OutputFileFactory.create(self.destination_url + "/" + self.file_name)
+        storage.save_text(playlist.dumps())
+
+    def concat_chunks(self):
+        local_path = "{}/{}/{}".format(settings.TRANSCODED_VIDEOS_PATH, self.job.id.hex, self.output.name)
+        mkdir(local_path)
+        concat_file_path = local_path + "_chunks.txt"
+        with open(concat_file_path, "w") as concat_file:
+            for chunk in self.output.chunks.all():
+                url = get_input_path(self.destination_url + "/" + chunk.settings["file_name"])
+                concat_file.write("file '{}'\n".format(url))
+
+        command = ConcatCommandGenerator(concat_file_path, local_path + "/" + self.file_name).generate()
+        subprocess.run(shlex.split(command), stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, check=True)
+        os.remove(concat_file_path)
+        OutputFileFactory.create(self.destination_url).save(local_path, is_transcode_completed=True)
+
+
+class ManifestGeneratorRunnable(LumberjackRunnable):
+    """Generates the master playlist of a job.
+
+    Progressive manifests are published while the job is transcoding, listing only the outputs which already have
+    enough segments uploaded to start playing. Outputs publishing them concurrently take turns rendering them
+    through a lock on the job. The manifest is uploaded once the transaction commits, so that it never lists
+    outputs whose status is rolled back, and the lock isn't held while uploading.
+    """
+
+    OPTIONAL_ARGUMENTS = ["is_progressive"]
+    AUDIO_GROUP_ID = "audio"
+
+    def do_run(self, *args, **kwargs):
+        with transaction.atomic():
+            self.initialize()
+            if self.is_progressive and not self.is_playable():
+                return
+            self.generate_manifest_content()
+            transaction.on_commit(self.upload)
 
     def initialize(self):
-        self.job = get_object_or_404(Job, id=self.job_id)
+        self.job = get_object_or_404(Job.objects.select_for_update(), id=self.job_id)
         self.manifest_content = ""
 
+    def get_outputs(self):
+        outputs = self.job.outputs.exclude(status=Output.SKIPPED)
+        if self.is_progressive:
+            is_playable = {"checkpoint__segments__{}__isnull".format(settings.PROGRESSIVE_MIN_SEGMENTS - 1): False}
+            outputs = outputs.filter(models.Q(status=Output.COMPLETED) | models.Q(**is_playable))
+        return outputs
+
+    def is_playable(self):
+        # Renditions refer to the shared audio, so they can't be played before it.
+        is_audio_shared = self.job.outputs.exclude(status=Output.SKIPPED).filter(is_audio_only=True).exists()
+        outputs = self.get_outputs()
+        return outputs.filter(is_audio_only=False).exists() and (
+            not is_audio_shared or outputs.filter(is_audio_only=True).exists()
+        )
+
     def manifest_header(self):
         return "#EXTM3U\n#EXT-X-VERSION:3\n"
 
@@ -173,11 +642,11 @@ class ManifestGeneratorRunnable(LumberjackRunnable):
             file_name = generate_file_name_from_format(self.job.settings.get("format"))
 
         storage = OutputFileFactory.create(destination + "/" + file_name)
-        storage.save_text(self.manifest_content)
+        storage.save_text(self.manifest_content, is_progressive=bool(self.is_progressive))
 
     def get_media_details(self):
         media_details = []
-        for output in self.job.outputs.order_by("created"):
+        for output in self.get_outputs().filter(is_audio_only=False).order_by("created"):
             media_detail = {
                 "bandwidth": output.video_bitrate,
                 "resolution": output.resolution,
@@ -186,12 +655,26 @@ class ManifestGeneratorRunnable(LumberjackRunnable):
             media_details.append(media_detail)
         return media_details
 
+    def get_audio_details(self):
+        return [
+            {"name": output.name, "uri": f"{output.name}/video.m3u8"}
+            for output in self.get_outputs().filter(is_audio_only=True)
+        ]
+
     def generate_manifest_content(self):
         content = self.manifest_header()
+        audio_details = self.get_audio_details()
+        for audio_detail in audio_details:
+            content += (
+                f'#EXT-X-MEDIA:TYPE=AUDIO,GROUP-ID="{self.AUDIO_GROUP_ID}",NAME="{audio_detail["name"]}",'
+                f'DEFAULT=YES,AUTOSELECT=YES,URI="{audio_detail["uri"]}"\n\n'
+            )
+
+        audio_group = f',AUDIO="{self.AUDIO_GROUP_ID}"' if audio_details else ""
         media_details = self.get_media_details()
         for media_detail in media_details:
             content += (
                 f"#EXT-X-STREAM-INF:BANDWIDTH={media_detail['bandwidth']},"
-                f"RESOLUTION={media_detail['resolution']}\n{media_detail['name']}\n\n"
+                f"RESOLUTION={media_detail['resolution']}{audio_group}\n{media_detail['name']}\n\n"
             )
         self.manifest_content = content
@@ -2,10 +2,20 @@ import json
 
 import requests
 from celery import Task
+from django.conf import settings
 from django.core.serializers.json import DjangoJSONEncoder
 
+from apps.executors.backpressure import is_disk_available
 from lumberjack.celery import app
-from .runnables import VideoTranscoderRunnable, ManifestGeneratorRunnable
+from .runnables import (
+    InputProbeRunnable,
+    VideoTranscoderRunnable,
+    LadderTranscoderRunnable,
+    ChunkPlannerRunnable,
+    ChunkTranscoderRunnable,
+    OutputPackagerRunnable,
+    ManifestGeneratorRunnable,
+)
 
 
 class LumberjackTask(Task):
@@ -15,13 +25,57 @@ class LumberjackTask(Task):
         self.runnable(*args, **kwargs, task_id=self.request.id).run()
 
 
-class VideoTranscoderTask(LumberjackTask):
+class TranscoderTask(LumberjackTask):
+    """Runs ffmpeg, which is only admitted while the node has enough free disk space for its output."""
+
+    def run(self, *args, **kwargs):
+        if not is_disk_available():
+            raise self.retry(countdown=settings.TRANSCODER_ADMISSION_DELAY, max_retries=None)
+        super().run(*args, **kwargs)
+
+
+class InputProbeTask(LumberjackTask):
+    runnable = InputProbeRunnable
+
+
+InputProbeTask = app.register_task(InputProbeTask())
+
+
+class VideoTranscoderTask(TranscoderTask):
     runnable = VideoTranscoderRunnable
 
 
 VideoTranscoderTask = app.register_task(VideoTranscoderTask())
 
 
+class LadderTranscoderTask(TranscoderTask):
+    runnable = LadderTranscoderRunnable
+
+
+LadderTranscoderTask = app.register_task(LadderTranscoderTask())
+
+
+class ChunkPlannerTask(LumberjackTask):
+    runnable = ChunkPlannerRunnable
+
+
+ChunkPlannerTask = app.register_task(ChunkPlannerTask())
+
+
+class ChunkTranscoderTask(TranscoderTask):
+    runnable = ChunkTranscoderRunnable
+
+
+ChunkTranscoderTask = app.register_task(ChunkTranscoderTask())
+
+
+class OutputPackagerTask(LumberjackTask):
+    runnable = OutputPackagerRunnable
+
+
+OutputPackagerTask = app.register_task(OutputPackagerTask())
+
+
 class ManifestGeneratorTask(LumberjackTask):
     runnable = ManifestGeneratorRunnable
 
@@ -0,0 +1,26 @@
+# Generated by Django 3.1 on 2026-10-18 04:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("presets", "0002_auto_20201218_1359"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="jobtemplate",
+            name="execution_mode",
+            field=models.CharField(
+                choices=[
+                    ("per_output", "Transcode each output separately"),
+                    ("single_decode", "Transcode all outputs from a single decode"),
+                ],
+                default="per_output",
+                max_length=100,
+                verbose_name="Execution Mode",
+            ),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 3.1 on 2026-10-18 04:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("presets", "0003_jobtemplate_execution_mode"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="jobtemplate",
+            name="execution_mode",
+            field=models.CharField(
+                choices=[
+                    ("per_output", "Transcode each output separately"),
+                    ("single_decode", "Transcode all outputs from a single decode"),
+                    ("chunked", "Transcode chunks of each output in parallel"),
+                ],
+                default="per_output",
+                max_length=100,
+                verbose_name="Execution Mode",
+            ),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 3.1 on 2026-10-18 04:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("presets", "0004_auto_20261018_0954"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="jobtemplate",
+            name="passthrough",
+            field=models.BooleanField(
+                default=False,
+                help_text="Copy streams of the input which already match an output",
+                verbose_name="Allow Passthrough",
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.1 on 2026-10-18 04:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('presets', '0005_jobtemplate_passthrough'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jobtemplate',
+            name='shared_audio',
+            field=models.BooleanField(default=False, help_text='Encode audio once and share it across outputs as an HLS audio group', verbose_name='Shared Audio'),
+        ),
+    ]
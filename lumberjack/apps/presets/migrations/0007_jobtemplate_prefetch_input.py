@@ -0,0 +1,18 @@
+# Generated by Django 3.1 on 2026-10-18 04:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('presets', '0006_jobtemplate_shared_audio'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jobtemplate',
+            name='prefetch_input',
+            field=models.BooleanField(default=False, help_text='Download the input with parallel ranged requests before encoding', verbose_name='Prefetch Input'),
+        ),
+    ]
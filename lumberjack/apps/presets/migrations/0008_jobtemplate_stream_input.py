@@ -0,0 +1,18 @@
+# Generated by Django 3.1 on 2026-10-18 04:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('presets', '0007_jobtemplate_prefetch_input'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jobtemplate',
+            name='stream_input',
+            field=models.BooleanField(default=False, help_text="Pipe the input into ffmpeg, for inputs which don't need seeking", verbose_name='Stream Input'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 3.1 on 2026-10-18 04:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("presets", "0008_jobtemplate_stream_input"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="jobtemplate",
+            name="preset_policy",
+            field=models.CharField(
+                choices=[
+                    ("fixed", "Use the preset of each output"),
+                    ("deadline", "Pick presets which finish before the deadline of the job"),
+                    ("speed", "Pick presets which encode at least as fast as realtime"),
+                    ("quality", "Pick slower presets, taking up to four times the input duration"),
+                ],
+                default="fixed",
+                max_length=100,
+                verbose_name="Preset Policy",
+            ),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 3.1 on 2026-10-18 05:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("presets", "0009_jobtemplate_preset_policy"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="jobtemplate",
+            name="direct_upload",
+            field=models.BooleanField(
+                default=False,
+                help_text="Send HLS segments straight to storage instead of the local disk",
+                verbose_name="Direct Upload",
+            ),
+        ),
+    ]
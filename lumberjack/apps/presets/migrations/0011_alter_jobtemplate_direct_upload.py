@@ -0,0 +1,22 @@
+# Generated by Django 3.1 on 2026-10-18 05:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("presets", "0010_jobtemplate_direct_upload"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="jobtemplate",
+            name="direct_upload",
+            field=models.BooleanField(
+                default=False,
+                help_text="Send output files to storage while they are encoded",
+                verbose_name="Direct Upload",
+            ),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 3.1 on 2026-10-18 05:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("presets", "0011_alter_jobtemplate_direct_upload"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="jobtemplate",
+            name="progressive",
+            field=models.BooleanField(
+                default=False,
+                help_text="Publish HLS playlists while their segments are being uploaded",
+                verbose_name="Progressive",
+            ),
+        ),
+    ]
@@ -5,7 +5,7 @@ from django.utils.text import slugify
 
 from model_utils.models import TimeStampedModel
 
-from apps.jobs.models import AbstractOutput
+from apps.jobs.models import AbstractOutput, Job
 
 
 class JobTemplate(TimeStampedModel):
@@ -16,6 +16,30 @@ class JobTemplate(TimeStampedModel):
     destination = models.CharField("Destination", max_length=1024)
     segment_length = models.PositiveSmallIntegerField("HLS Segments length", blank=True, null=True, default=10)
     format = models.CharField("Output Format", max_length=255)
+    execution_mode = models.CharField(
+        "Execution Mode", max_length=100, choices=Job.EXECUTION_MODES, default=Job.PER_OUTPUT
+    )
+    passthrough = models.BooleanField(
+        "Allow Passthrough", default=False, help_text="Copy streams of the input which already match an output"
+    )
+    shared_audio = models.BooleanField(
+        "Shared Audio", default=False, help_text="Encode audio once and share it across outputs as an HLS audio group"
+    )
+    prefetch_input = models.BooleanField(
+        "Prefetch Input", default=False, help_text="Download the input with parallel ranged requests before encoding"
+    )
+    stream_input = models.BooleanField(
+        "Stream Input", default=False, help_text="Pipe the input into ffmpeg, for inputs which don't need seeking"
+    )
+    preset_policy = models.CharField(
+        "Preset Policy", max_length=100, choices=Job.PRESET_POLICIES, default=Job.FIXED_PRESET
+    )
+    direct_upload = models.BooleanField(
+        "Direct Upload", default=False, help_text="Send output files to storage while they are encoded"
+    )
+    progressive = models.BooleanField(
+        "Progressive", default=False, help_text="Publish HLS playlists while their segments are being uploaded"
+    )
 
     class Meta:
         ordering = ("-created",)
@@ -24,7 +48,19 @@ class JobTemplate(TimeStampedModel):
         return self.name
 
     def populate_settings(self):
-        settings = {"name": self.name, "segmentLength": self.segment_length, "format": self.format}
+        settings = {
+            "name": self.name,
+            "segmentLength": self.segment_length,
+            "format": self.format,
+            "execution_mode": self.execution_mode,
+            "passthrough": self.passthrough,
+            "shared_audio": self.shared_audio,
+            "prefetch_input": self.prefetch_input,
+            "stream_input": self.stream_input,
+            "preset_policy": self.preset_policy,
+            "direct_upload": self.direct_upload,
+            "progressive": self.progressive,
+        }
         output_presets = []
         for output_preset in self.output_presets.all():
             output_presets.append(output_preset.settings)
@@ -3,6 +3,7 @@ from __future__ import absolute_import, unicode_literals
 import os
 
 from celery import Celery
+from celery.signals import worker_init
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "lumberjack.settings")
 app = Celery("lumberjack")
@@ -10,3 +11,10 @@ app = Celery("lumberjack")
 app.config_from_object("django.conf:settings", namespace="CELERY")
 
 app.autodiscover_tasks()
+
+
+@worker_init.connect
+def record_worker_concurrency(sender, **kwargs):
+    # The size of the pool isn't set in the configuration when it is given with -c or left to the CPU count.
+    # Recorded before the pool is forked, so that its processes share it.
+    app.conf.worker_concurrency = sender.concurrency
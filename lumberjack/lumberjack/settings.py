@@ -140,6 +140,10 @@ AWS_ACCESS_KEY_ID = get_env_variable("AWS_ACCESS_KEY_ID")
 AWS_SECRET_ACCESS_KEY = get_env_variable("AWS_SECRET_ACCESS_KEY")
 AWS_STORAGE_BUCKET_NAME = get_env_variable("AWS_STORAGE_BUCKET_NAME")
 AWS_S3_REGION_CODE = get_env_variable("AWS_S3_REGION_CODE")
+# Boto3 clients are shared by a worker process, so their connection pool is shared by all of its uploads.
+AWS_MAX_POOL_CONNECTIONS = int(os.environ.get("AWS_MAX_POOL_CONNECTIONS", 50))
+AWS_RETRY_MODE = os.environ.get("AWS_RETRY_MODE", "standard")
+AWS_MAX_ATTEMPTS = int(os.environ.get("AWS_MAX_ATTEMPTS", 5))
 
 CELERY_BROKER_URL = "redis://localhost:6379"
 CELERY_RESULT_BACKEND = "redis://localhost:6379"
@@ -148,10 +152,59 @@ CELERY_TASK_SERIALIZER = "json"
 CELERY_RESULT_SERIALIZER = "json"
 CELERY_TIMEZONE = "Asia/Kolkata"
 CELERY_TASK_ROUTES = {
+    "apps.jobs.tasks.InputProbeTask": {"queue": "transcoding"},
     "apps.jobs.tasks.VideoTranscoderTask": {"queue": "transcoding"},
+    "apps.jobs.tasks.LadderTranscoderTask": {"queue": "transcoding"},
+    "apps.jobs.tasks.ChunkPlannerTask": {"queue": "transcoding"},
+    "apps.jobs.tasks.ChunkTranscoderTask": {"queue": "transcoding"},
+    "apps.jobs.tasks.OutputPackagerTask": {"queue": "transcoding"},
 }
 CELERYD_PREFETCH_MULTIPLIER = 1
 
+# Number of transcoding tasks a worker runs at once, which share its CPUs. Defaults to the size of the Celery pool.
+TRANSCODER_CONCURRENCY = int(os.environ.get("TRANSCODER_CONCURRENCY", 0)) or None
+# Pins each ffmpeg process to its own share of the CPUs of the worker.
+TRANSCODER_CPU_AFFINITY = os.environ.get("TRANSCODER_CPU_AFFINITY", "false").lower() == "true"
+# Jobs which pick their encoder presets switch to faster ones while more outputs than this are waiting to start.
+TRANSCODER_BACKLOG_THRESHOLD = int(os.environ.get("TRANSCODER_BACKLOG_THRESHOLD", 50))
+# Segments an output of a progressive job needs uploaded before it is listed in the manifest.
+PROGRESSIVE_MIN_SEGMENTS = int(os.environ.get("PROGRESSIVE_MIN_SEGMENTS", 3))
+
+# Inputs of jobs with prefetch enabled are downloaded in parts of this size, with this many parts downloaded at once.
+INPUT_PREFETCH_PART_SIZE = int(os.environ.get("INPUT_PREFETCH_PART_SIZE", 16 * 1024 * 1024))
+INPUT_PREFETCH_CONCURRENCY = int(os.environ.get("INPUT_PREFETCH_CONCURRENCY", 8))
+
+# Prefetched inputs are kept in this directory and shared by the jobs of the node, up to INPUT_CACHE_SIZE bytes.
+# The cache is disabled when the size is 0.
+INPUT_CACHE_PATH = os.environ.get("INPUT_CACHE_PATH", os.path.join(TRANSCODED_VIDEOS_PATH, "input_cache"))
+INPUT_CACHE_SIZE = int(os.environ.get("INPUT_CACHE_SIZE", 0))
+
+# Streamed inputs are read in blocks of INPUT_STREAM_READ_SIZE bytes, buffering up to INPUT_STREAM_BUFFER_COUNT blocks.
+INPUT_STREAM_READ_SIZE = int(os.environ.get("INPUT_STREAM_READ_SIZE", 1024 * 1024))
+INPUT_STREAM_BUFFER_COUNT = int(os.environ.get("INPUT_STREAM_BUFFER_COUNT", 32))
+
+# Number of files each output uploads at once.
+OUTPUT_UPLOAD_CONCURRENCY = int(os.environ.get("OUTPUT_UPLOAD_CONCURRENCY", 8))
+# Bytes per second which the jobs of the node may upload in total, shared evenly between them. 0 leaves it unlimited.
+UPLOAD_BANDWIDTH_LIMIT = int(os.environ.get("UPLOAD_BANDWIDTH_LIMIT", 0))
+UPLOAD_SCHEDULER_PATH = os.environ.get(
+    "UPLOAD_SCHEDULER_PATH", os.path.join(TRANSCODED_VIDEOS_PATH, "upload_scheduler")
+)
+# Times a file is tried again after a transient error, like S3 throttling requests, before its upload fails.
+# The requests of uploads are sent once, without the attempts of AWS_MAX_ATTEMPTS.
+UPLOAD_RETRIES = int(os.environ.get("UPLOAD_RETRIES", 5))
+# Seconds of the first backoff between attempts, doubled with every attempt up to the max, and jittered.
+UPLOAD_RETRY_DELAY = float(os.environ.get("UPLOAD_RETRY_DELAY", 1))
+UPLOAD_RETRY_MAX_DELAY = float(os.environ.get("UPLOAD_RETRY_MAX_DELAY", 30))
+# Bytes of output files a job may have waiting for upload before ffmpeg is paused until the uploads catch up.
+UPLOAD_BACKLOG_LIMIT = int(os.environ.get("UPLOAD_BACKLOG_LIMIT", 2 * 1024 * 1024 * 1024))
+# Free disk space below which ffmpeg processes with files waiting for upload are paused, and no outputs are started.
+TRANSCODER_MIN_FREE_DISK = int(os.environ.get("TRANSCODER_MIN_FREE_DISK", 5 * 1024 * 1024 * 1024))
+# Seconds ffmpeg may stay paused for its uploads to catch up before its output fails.
+TRANSCODER_MAX_PAUSE = int(os.environ.get("TRANSCODER_MAX_PAUSE", 30 * 60))
+# Seconds after which an output which wasn't admitted for lack of disk space is tried again.
+TRANSCODER_ADMISSION_DELAY = int(os.environ.get("TRANSCODER_ADMISSION_DELAY", 60))
+
 REST_FRAMEWORK = {"DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.LimitOffsetPagination", "PAGE_SIZE": 100}
 
 if os.environ.get("SENTRY_URL", None):
@@ -6,6 +6,7 @@ from django.test import RequestFactory, TestCase
 
 from apps.api.v1.jobs.views import CreateJobView, job_info_view, cancel_job_view, restart_job_view
 from apps.jobs.models import Job
+from apps.presets.models import OutputPreset
 from tests.jobs.mixins import Mixin as JobMixin
 from apps.api.v1.jobs.serializers import JobSerializer
 
@@ -60,6 +61,24 @@ class TestCreateJobView(TestCase, Mixin, JobMixin):
 
         self.assertEqual(400, response.status_code)
 
+    def test_api_should_fail_if_output_is_named_like_shared_audio(self):
+        self.job_template.shared_audio = True
+        OutputPreset.objects.create(
+            name=Job.AUDIO_OUTPUT_NAME, video_bitrate=500000, width=640, height=360, job_template=self.job_template
+        )
+        self.job_template.save()
+        response = self.make_request(self.data)
+
+        self.assertEqual(400, response.status_code)
+
+    def test_api_should_fail_if_progressive_job_is_not_transcoded_per_output(self):
+        self.job_template.progressive = True
+        self.job_template.execution_mode = Job.SINGLE_DECODE
+        self.job_template.save()
+        response = self.make_request(self.data)
+
+        self.assertEqual(400, response.status_code)
+
 
 class TestJobInfoView(TestCase, JobMixin):
     def setUp(self):
@@ -0,0 +1,86 @@
+import os
+import shutil
+import tempfile
+import time
+
+import mock
+from django.test import SimpleTestCase, override_settings
+
+from apps.executors.backpressure import DiskBackPressure
+from apps.executors.base import Status
+
+
+@override_settings(UPLOAD_BACKLOG_LIMIT=100, TRANSCODER_MIN_FREE_DISK=0)
+class TestDiskBackPressure(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.transcoder = mock.MagicMock()
+        self.transcoder.pause.return_value = True
+        self.back_pressure = DiskBackPressure([self.directory], self.transcoder)
+
+    def write_file(self, name, size):
+        with open("{}/{}".format(self.directory, name), "wb") as file:
+            file.write(b"x" * size)
+
+    def test_transcoder_should_be_paused_when_backlog_is_over_limit(self):
+        self.write_file("video_0.ts", 101)
+        self.back_pressure.run()
+
+        self.transcoder.pause.assert_called_once()
+        self.assertEqual(101, self.back_pressure.metrics["upload_backlog_max_bytes"])
+        self.assertEqual(1, self.back_pressure.metrics["transcoder_pauses"])
+
+    def test_transcoder_should_be_resumed_once_uploads_have_caught_up(self):
+        self.write_file("video_0.ts", 101)
+        self.back_pressure.run()
+        self.write_file("video_0.ts", 80)
+        self.back_pressure.run()
+
+        self.transcoder.resume.assert_not_called()
+
+        self.write_file("video_0.ts", 75)
+        self.back_pressure.run()
+
+        self.transcoder.resume.assert_called_once()
+        self.assertFalse(self.back_pressure.is_paused)
+
+    @override_settings(TRANSCODER_MIN_FREE_DISK=1024)
+    @mock.patch("apps.executors.backpressure.get_free_disk_space", return_value=512)
+    def test_transcoder_with_backlog_should_be_paused_when_disk_is_low(self, mock_free_space):
+        self.back_pressure = DiskBackPressure([self.directory], self.transcoder)
+        self.back_pressure.run()
+
+        self.transcoder.pause.assert_not_called()
+
+        self.write_file("video_0.ts", 10)
+        self.back_pressure.run()
+
+        self.transcoder.pause.assert_called_once()
+
+    @override_settings(TRANSCODER_MIN_FREE_DISK=1024)
+    @mock.patch("apps.executors.backpressure.get_free_disk_space", return_value=512)
+    def test_transcoder_should_be_resumed_once_backlog_is_drained_while_disk_is_low(self, mock_free_space):
+        self.back_pressure = DiskBackPressure([self.directory], self.transcoder)
+        self.write_file("video_0.ts", 10)
+        self.back_pressure.run()
+        os.remove("{}/video_0.ts".format(self.directory))
+        self.write_file("video_1.ts.tmp", 10)
+        self.back_pressure.run()
+
+        self.transcoder.resume.assert_called_once()
+
+    def test_output_should_fail_when_uploads_do_not_catch_up_in_time(self):
+        self.write_file("video_0.ts", 101)
+        self.back_pressure.run()
+        self.back_pressure.pause_time = time.time() - self.back_pressure.max_pause - 1
+        self.back_pressure.run()
+
+        self.assertEqual(Status.Errored, self.back_pressure.check_status())
+
+    def test_paused_transcoder_should_be_resumed_on_stop(self):
+        self.write_file("video_0.ts", 101)
+        self.back_pressure.run()
+        self.back_pressure.post_stop()
+
+        self.transcoder.resume.assert_called_once()
@@ -1,3 +1,7 @@
+import os
+import shutil
+import tempfile
+
 import mock
 from django.test import SimpleTestCase
 
@@ -26,3 +30,36 @@ class TestCloudUploader(SimpleTestCase):
 
         cloud_node.stop(None)
         mock_s3().save.assert_called_with("/abc/1232/360p", is_transcode_completed=True)
+
+    @mock.patch("apps.ffmpeg.outputs.S3")
+    def test_written_files_should_be_uploaded_without_walking_directory(self, mock_s3):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        cloud_node = CloudUploader(directory, "s3://bucket_url/abc")
+        cloud_node._status = Status.Running
+        # Directory is walked once when it starts being watched, and once more for files written meanwhile.
+        cloud_node.run()
+        cloud_node.run()
+        mock_s3.reset_mock()
+
+        open(os.path.join(directory, "video_0.ts"), "w").close()
+        cloud_node.run()
+        cloud_node._status = Status.Finished
+        cloud_node.post_stop()
+
+        mock_s3().save_files.assert_called_once_with(
+            directory, [os.path.join(directory, "video_0.ts")], is_transcode_completed=False
+        )
+        mock_s3().save.assert_called_once_with(directory, is_transcode_completed=True)
+
+    @mock.patch("apps.executors.cloud.open_upload_limiter")
+    @mock.patch("apps.ffmpeg.outputs.S3")
+    def test_limiter_should_be_closed_even_if_last_upload_fails(self, mock_s3, mock_open_limiter):
+        mock_s3().save.side_effect = IOError("Upload failed")
+        cloud_node = CloudUploader("/abc/1232/360p", "s3://bucket_url/abc", job_id="1232")
+        cloud_node._status = Status.Finished
+
+        with self.assertRaises(IOError):
+            cloud_node.post_stop()
+
+        mock_open_limiter().close.assert_called_once_with()
@@ -1,3 +1,5 @@
+import mock
+
 from django.test import SimpleTestCase
 from apps.jobs.controller import LumberjackController
 from apps.executors.base import Status
@@ -43,3 +45,92 @@ class TestLumberjackController(SimpleTestCase):
             self.assertEqual(Status.Running, controller.check_status())
 
         self.assertEqual(Status.Finished, controller.check_status())
+
+    @mock.patch("apps.jobs.controller.FFMpegTranscoder")
+    @mock.patch("apps.jobs.controller.CloudUploader")
+    @mock.patch("apps.jobs.controller.InputStreamer")
+    def test_streamed_input_should_be_piped_into_transcoder(self, mock_streamer, mock_uploader, mock_transcoder):
+        mock_streamer.return_value.input_url = "pipe:0"
+        mock_streamer.return_value.stdin = 7
+        controller = LumberjackController()
+        controller.start(dict(self.output_settings, stream_input=True))
+
+        config = mock_transcoder.call_args[0][0]
+        self.assertEqual("pipe:0", config["input"])
+        self.assertEqual(7, mock_transcoder.call_args[1]["stdin"])
+
+    @mock.patch("apps.jobs.controller.FFMpegTranscoder")
+    @mock.patch("apps.jobs.controller.CloudUploader")
+    @mock.patch("apps.jobs.controller.InputPrefetcher")
+    @mock.patch("apps.jobs.controller.get_input_cache")
+    def test_cached_input_should_be_read_through_prefetcher_holding_lease(
+        self, mock_cache, mock_prefetcher, mock_uploader, mock_transcoder
+    ):
+        entry = mock_cache().get_entry.return_value
+        entry.is_cached.return_value = True
+        LumberjackController().start(self.output_settings)
+
+        mock_prefetcher.assert_called_once_with(mock.ANY, entry, entry.acquire.return_value)
+        entry.release.assert_not_called()
+
+    @mock.patch("apps.jobs.controller.FFMpegTranscoder")
+    @mock.patch("apps.jobs.controller.CloudUploader")
+    @mock.patch("apps.jobs.controller.InputPrefetcher")
+    @mock.patch("apps.jobs.controller.get_input_cache")
+    def test_lease_on_input_which_is_not_cached_should_be_released(
+        self, mock_cache, mock_prefetcher, mock_uploader, mock_transcoder
+    ):
+        entry = mock_cache().get_entry.return_value
+        entry.is_cached.return_value = False
+        LumberjackController().start(self.output_settings)
+
+        mock_prefetcher.assert_not_called()
+        entry.release.assert_called_once_with(entry.acquire.return_value)
+
+    @mock.patch("apps.jobs.controller.FFMpegTranscoder")
+    @mock.patch("apps.jobs.controller.UploadProxy")
+    def test_output_failing_while_stopped_should_be_reported(self, mock_proxy, mock_transcoder):
+        mock_transcoder().check_status.return_value = Status.Finished
+        mock_proxy().check_status.return_value = Status.Errored
+        controller = LumberjackController()
+        controller.start(dict(self.output_settings, direct_upload=True))
+        controller.stop()
+
+        self.assertTrue(controller.is_output_errored)
+
+    @mock.patch("apps.jobs.controller.FFMpegTranscoder")
+    @mock.patch("apps.jobs.controller.CloudUploader")
+    @mock.patch("apps.jobs.controller.UploadProxy")
+    def test_hls_output_should_be_written_to_upload_proxy_for_direct_upload(
+        self, mock_proxy, mock_uploader, mock_transcoder
+    ):
+        mock_proxy.return_value.url = "http://127.0.0.1:8000"
+        controller = LumberjackController()
+        controller.start(dict(self.output_settings, direct_upload=True))
+
+        config = mock_transcoder.call_args[0][0]
+        self.assertEqual("http://127.0.0.1:8000", config["upload_url"])
+        mock_uploader.assert_not_called()
+
+    @mock.patch("apps.jobs.controller.LadderTranscoder")
+    @mock.patch("apps.jobs.controller.DiskBackPressure")
+    @mock.patch("apps.jobs.controller.CloudUploader")
+    def test_metrics_of_uploaders_should_be_kept_for_each_output(
+        self, mock_uploader, mock_backpressure, mock_transcoder
+    ):
+        uploaders = [mock.MagicMock(metrics={"upload_retries": 1}), mock.MagicMock(metrics={})]
+        mock_uploader.side_effect = uploaders
+        mock_transcoder().metrics = {"transcoder_speed": 2.0}
+        mock_backpressure().metrics = {"transcoder_pauses": 0}
+        for executor in uploaders + [mock_transcoder(), mock_backpressure()]:
+            executor.check_status.return_value = Status.Finished
+        outputs = [dict(self.output_settings["output"], name=name) for name in ("360p", "720p")]
+        controller = LumberjackController()
+        controller.start_ladder(dict(self.output_settings, outputs=outputs))
+        controller.stop()
+
+        self.assertEqual(
+            {"transcoder_speed": 2.0, "transcoder_pauses": 0, "upload_retries": 1},
+            controller.get_output_metrics("360p"),
+        )
+        self.assertEqual({"transcoder_speed": 2.0, "transcoder_pauses": 0}, controller.get_output_metrics("720p"))
@@ -0,0 +1,58 @@
+import os
+import re
+import shutil
+import tempfile
+
+import responses
+from django.test import SimpleTestCase, override_settings
+
+from apps.executors.base import Status
+from apps.executors.prefetch import InputPrefetcher
+from apps.ffmpeg.prefetch import get_prefetch_path
+
+
+class TestInputPrefetcher(SimpleTestCase):
+    url = "https://domain.com/videos/raw_video.mp4"
+    content = bytes(range(256)) * 40
+
+    def setUp(self) -> None:
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def serve_range(self, request):
+        start, end = map(int, re.match(r"bytes=(\d+)-(\d+)", request.headers["Range"]).groups())
+        headers = {"Content-Range": "bytes {}-{}/{}".format(start, end, len(self.content))}
+        return 206, headers, self.content[start : end + 1]
+
+    @responses.activate
+    @override_settings(INPUT_PREFETCH_PART_SIZE=1000)
+    def test_input_outside_of_cache_should_be_removed_once_stopped(self):
+        responses.add_callback(responses.GET, self.url, callback=self.serve_range)
+        with override_settings(TRANSCODED_VIDEOS_PATH=self.directory):
+            prefetcher = InputPrefetcher({"id": "1232", "input": self.url})
+            prefetcher.start()
+            prefetcher.downloader.wait_for_size()
+            prefetcher.stop(Status.Finished)
+
+            self.assertEqual(Status.Finished, prefetcher.check_status())
+            self.assertEqual([], os.listdir(os.path.dirname(get_prefetch_path("1232"))))
+
+    @responses.activate
+    @override_settings(INPUT_PREFETCH_PART_SIZE=1000)
+    def test_input_should_be_kept_until_last_output_of_job_stops(self):
+        responses.add_callback(responses.GET, self.url, callback=self.serve_range)
+        with override_settings(TRANSCODED_VIDEOS_PATH=self.directory):
+            first_prefetcher = InputPrefetcher({"id": "1232", "input": self.url})
+            first_prefetcher.start()
+            first_prefetcher._thread.join()
+            second_prefetcher = InputPrefetcher({"id": "1232", "input": self.url})
+            second_prefetcher.start()
+
+            first_prefetcher.stop(Status.Finished)
+
+            with open(second_prefetcher.input_url, "rb") as file:
+                self.assertEqual(self.content, file.read())
+
+            second_prefetcher.stop(Status.Finished)
+
+            self.assertEqual([], os.listdir(os.path.dirname(get_prefetch_path("1232"))))
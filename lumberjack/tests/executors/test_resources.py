@@ -0,0 +1,59 @@
+import mock
+
+from django.test import SimpleTestCase
+
+from apps.executors.resources import CPUBudget, get_cpu_quota, get_worker_concurrency
+from lumberjack.celery import app, record_worker_concurrency
+
+
+class TestCPUBudget(SimpleTestCase):
+    def test_threads_should_be_split_between_concurrent_processes(self):
+        budget = CPUBudget(cpus=list(range(32)), concurrency=4)
+
+        self.assertEqual(8, budget.threads)
+
+    def test_threads_should_be_capped_by_cgroup_quota(self):
+        budget = CPUBudget(cpus=list(range(32)), quota=4.0, concurrency=2)
+
+        self.assertEqual(2, budget.threads)
+
+    def test_every_process_should_get_at_least_one_thread(self):
+        budget = CPUBudget(cpus=list(range(2)), concurrency=8)
+
+        self.assertEqual(1, budget.threads)
+
+    def test_affinity_should_assign_separate_cpus_to_each_pool_slot(self):
+        budget = CPUBudget(cpus=list(range(8)), concurrency=2, pin_cpus=True)
+
+        self.assertEqual([0, 1, 2, 3], budget.get_affinity(0))
+        self.assertEqual([4, 5, 6, 7], budget.get_affinity(1))
+
+    def test_affinity_should_not_be_set_unless_enabled(self):
+        budget = CPUBudget(cpus=list(range(8)), concurrency=2)
+
+        self.assertIsNone(budget.get_affinity(0))
+
+    @mock.patch("apps.executors.resources.read_first_line", side_effect=["200000 100000"])
+    def test_cpu_quota_should_be_read_from_cgroup_v2(self, mock_read):
+        self.assertEqual(2, get_cpu_quota())
+
+    @mock.patch("apps.executors.resources.read_first_line", side_effect=["max 100000"])
+    def test_cpu_quota_should_be_none_when_unlimited(self, mock_read):
+        self.assertIsNone(get_cpu_quota())
+
+
+class TestWorkerConcurrency(SimpleTestCase):
+    def setUp(self):
+        concurrency = app.conf.worker_concurrency
+        self.addCleanup(setattr, app.conf, "worker_concurrency", concurrency)
+
+    def test_concurrency_should_be_taken_from_pool_of_worker(self):
+        record_worker_concurrency(sender=mock.Mock(concurrency=6))
+
+        self.assertEqual(6, get_worker_concurrency())
+
+    @mock.patch("os.cpu_count", return_value=12)
+    def test_concurrency_should_default_to_cpu_count(self, mock_cpu_count):
+        app.conf.worker_concurrency = 0
+
+        self.assertEqual(12, get_worker_concurrency())
@@ -0,0 +1,49 @@
+import os
+import tempfile
+
+import mock
+from botocore.exceptions import ClientError
+from django.test import SimpleTestCase, override_settings
+
+from apps.executors.base import Status
+from apps.executors.stream import InputStreamer
+
+
+@override_settings(INPUT_STREAM_READ_SIZE=1000, INPUT_STREAM_BUFFER_COUNT=2)
+class TestInputStreamer(SimpleTestCase):
+    content = bytes(range(256)) * 40
+
+    def setUp(self) -> None:
+        file_descriptor, self.path = tempfile.mkstemp()
+        with os.fdopen(file_descriptor, "wb") as file:
+            file.write(self.content)
+
+    def tearDown(self) -> None:
+        os.remove(self.path)
+
+    def read_stream(self, streamer):
+        streamer.start()
+        with os.fdopen(streamer.stdin, "rb") as stdin:
+            return stdin.read()
+
+    def test_input_should_be_streamed_into_pipe(self):
+        streamer = InputStreamer({"input": self.path})
+
+        self.assertEqual(self.content, self.read_stream(streamer))
+        self.assertEqual("pipe:0", streamer.input_url)
+        self.assertEqual(len(self.content), streamer.metrics["input_bytes_read"])
+        self.assertEqual(Status.Running, streamer.check_status())
+
+    def test_streamer_should_be_errored_if_input_cannot_be_read(self):
+        streamer = InputStreamer({"input": self.path + ".missing"})
+
+        self.assertEqual(b"", self.read_stream(streamer))
+        self.assertEqual(Status.Errored, streamer.check_status())
+
+    def test_streamer_should_be_errored_if_storage_fails_while_reading(self):
+        streamer = InputStreamer({"input": self.path})
+        error = ClientError({"Error": {"Code": "InternalError"}}, "GetObject")
+
+        with mock.patch("apps.executors.stream.smart_open", side_effect=error):
+            self.assertEqual(b"", self.read_stream(streamer))
+        self.assertEqual(Status.Errored, streamer.check_status())
@@ -0,0 +1,43 @@
+import os
+import shutil
+import tempfile
+
+from django.test import SimpleTestCase
+
+from apps.executors.watcher import DirectoryWatcher
+
+
+class TestDirectoryWatcher(SimpleTestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.mkdtemp()
+        self.watcher = DirectoryWatcher(self.directory)
+
+    def tearDown(self) -> None:
+        self.watcher.close()
+        shutil.rmtree(self.directory)
+
+    def write(self, name, content="segment"):
+        with open(os.path.join(self.directory, name), "w") as file:
+            file.write(content)
+
+    def test_file_should_be_reported_once_closed_after_writing(self):
+        self.write("video.m3u8")
+
+        self.assertEqual([os.path.join(self.directory, "video.m3u8")], self.watcher.wait(timeout=1))
+
+    def test_temporary_file_should_be_reported_once_renamed(self):
+        self.write("video_0.ts.tmp")
+        self.watcher.wait(timeout=1)
+        os.rename(os.path.join(self.directory, "video_0.ts.tmp"), os.path.join(self.directory, "video_0.ts"))
+
+        self.assertEqual([os.path.join(self.directory, "video_0.ts")], self.watcher.wait(timeout=1))
+
+    def test_files_of_created_subdirectories_should_be_reported(self):
+        os.mkdir(os.path.join(self.directory, "key"))
+        self.watcher.wait(timeout=1)
+        self.write("key/enc.key")
+
+        self.assertEqual([os.path.join(self.directory, "key", "enc.key")], self.watcher.wait(timeout=1))
+
+    def test_nothing_should_be_reported_without_events(self):
+        self.assertEqual([], self.watcher.wait(timeout=0))
@@ -0,0 +1,88 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import mock
+from django.test import SimpleTestCase
+
+from apps.ffmpeg.bandwidth import BandwidthLimiter, UploadScheduler, get_upload_priority
+
+
+class TestUploadScheduler(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.scheduler = UploadScheduler(self.directory, 1000)
+
+    def test_bandwidth_should_be_shared_evenly_between_uploading_jobs(self):
+        self.assertEqual(1000, self.scheduler.get_share("job1"))
+        self.assertEqual(500, self.scheduler.get_share("job2"))
+
+    def test_share_of_job_should_be_split_between_its_uploading_processes(self):
+        self.scheduler.get_share("job2")
+        with mock.patch("os.getpid", return_value=os.getppid()):
+            self.scheduler.get_share("job1")
+        shares = [self.scheduler.get_share("job1")]
+        with mock.patch("os.getpid", return_value=os.getppid()):
+            shares.append(self.scheduler.get_share("job1"))
+
+        self.assertEqual([250, 250], shares)
+        self.assertEqual(1000, sum(shares) + self.scheduler.get_share("job2"))
+
+    def test_idle_jobs_should_not_take_share(self):
+        self.scheduler.get_share("job1")
+        idle_time = time.time() - UploadScheduler.IDLE_TIMEOUT - 1
+        os.utime(self.scheduler.get_lease_path("job1"), (idle_time, idle_time))
+
+        self.assertEqual(1000, self.scheduler.get_share("job2"))
+        self.assertFalse(os.path.exists(self.scheduler.get_lease_path("job1")))
+
+
+class TestBandwidthLimiter(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def test_playlists_and_early_segments_should_be_uploaded_first(self):
+        paths = ["video_10.ts", "video_2.ts", "video.m3u8", "video_1.ts"]
+
+        self.assertEqual(
+            ["video.m3u8", "video_1.ts", "video_2.ts", "video_10.ts"], sorted(paths, key=get_upload_priority)
+        )
+
+    def test_uploads_should_be_held_to_share_of_job(self):
+        limiter = BandwidthLimiter("job1", UploadScheduler(self.directory, 10000))
+        start_time = time.time()
+        limiter.acquire(10000)
+        limiter.acquire(5000)
+        limiter.acquire(1)
+
+        self.assertGreaterEqual(time.time() - start_time, 0.45)
+        self.assertEqual(15001, limiter.metrics["upload_bytes"])
+
+    def test_waiting_uploads_should_be_let_through_in_order_of_priority(self):
+        limiter = BandwidthLimiter("job1", UploadScheduler(self.directory, 1000))
+        limiter.acquire(1300)
+        granted = []
+        threads = [
+            threading.Thread(
+                target=lambda priority=priority: granted.append(limiter.acquire(10, priority) or priority)
+            )
+            for priority in (5, 1)
+        ]
+        for thread in threads:
+            thread.start()
+            time.sleep(0.05)
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual([1, 5], granted)
+
+    def test_uploads_should_only_be_measured_without_bandwidth_limit(self):
+        limiter = BandwidthLimiter("job1", UploadScheduler(self.directory, 0))
+        limiter.acquire(10 ** 9)
+
+        self.assertEqual(10 ** 9, limiter.metrics["upload_bytes"])
+        self.assertEqual([], os.listdir(self.directory))
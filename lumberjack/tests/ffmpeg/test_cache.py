@@ -0,0 +1,77 @@
+import os
+import shutil
+import tempfile
+
+import mock
+from botocore.exceptions import ClientError
+
+from django.test import SimpleTestCase
+
+from apps.ffmpeg.cache import InputCache
+
+
+@mock.patch("apps.ffmpeg.cache.get_input_metadata", return_value=('"abc"', 100))
+class TestInputCache(SimpleTestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.mkdtemp()
+        self.cache = InputCache(self.directory, max_size=250)
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.directory)
+
+    def add_entry(self, url, last_used):
+        entry = self.cache.get_entry(url)
+        with open(entry.path, "wb") as file:
+            file.write(b"0" * entry.size)
+        open(entry.path + ".done", "w").close()
+        os.utime(entry.path, (last_used, last_used))
+        return entry
+
+    def test_cached_input_should_resolve_to_local_path(self, mock_metadata):
+        entry = self.add_entry("s3://bucket/input.mp4", last_used=1)
+
+        self.assertEqual(entry.path, self.cache.get_entry("s3://bucket/input.mp4").path)
+        self.assertTrue(self.cache.get_entry("s3://bucket/input.mp4").is_cached())
+
+    def test_input_with_changed_etag_should_not_be_resolved_from_cache(self, mock_metadata):
+        self.add_entry("s3://bucket/input.mp4", last_used=1)
+        mock_metadata.return_value = ('"def"', 100)
+
+        self.assertFalse(self.cache.get_entry("s3://bucket/input.mp4").is_cached())
+
+    def test_input_whose_metadata_cannot_be_read_should_not_be_cached(self, mock_metadata):
+        mock_metadata.side_effect = ClientError({"Error": {"Code": "403"}}, "HeadObject")
+
+        self.assertIsNone(self.cache.get_entry("s3://bucket/input.mp4"))
+
+    def test_least_recently_used_inputs_should_be_evicted(self, mock_metadata):
+        oldest = self.add_entry("s3://bucket/1.mp4", last_used=1)
+        newest = self.add_entry("s3://bucket/2.mp4", last_used=2)
+        self.cache.evict(100)
+
+        self.assertFalse(oldest.is_cached())
+        self.assertTrue(newest.is_cached())
+
+    def test_inputs_in_use_should_not_be_evicted(self, mock_metadata):
+        oldest = self.add_entry("s3://bucket/1.mp4", last_used=1)
+        newest = self.add_entry("s3://bucket/2.mp4", last_used=2)
+        lease = oldest.acquire()
+        os.utime(oldest.path, (1, 1))
+        self.cache.evict(100)
+
+        self.assertTrue(oldest.is_cached())
+        self.assertFalse(newest.is_cached())
+        oldest.release(lease)
+
+    @mock.patch("apps.ffmpeg.cache.is_process_alive", return_value=False)
+    def test_leases_of_dead_processes_should_not_keep_inputs_from_eviction(self, mock_is_alive, mock_metadata):
+        entry = self.add_entry("s3://bucket/1.mp4", last_used=1)
+        self.add_entry("s3://bucket/2.mp4", last_used=2)
+        entry.acquire()
+        os.utime(entry.path, (1, 1))
+        self.cache.evict(100)
+
+        self.assertFalse(entry.is_cached())
+
+    def test_cache_should_be_disabled_without_size(self, mock_metadata):
+        self.assertIsNone(InputCache(self.directory, max_size=0).get_entry("s3://bucket/input.mp4"))
@@ -0,0 +1,26 @@
+from django.test import SimpleTestCase
+
+from apps.ffmpeg import clients
+
+
+class TestClients(SimpleTestCase):
+    def setUp(self) -> None:
+        clients.clear()
+
+    def test_client_should_be_shared_for_same_region(self):
+        self.assertIs(clients.get_s3_client(), clients.get_s3_client())
+
+    def test_client_of_other_region_should_be_separate(self):
+        self.assertIsNot(clients.get_s3_client(), clients.get_s3_client(region_name="ap-southeast-1"))
+
+    def test_client_should_use_configured_pool_size_and_retries(self):
+        config = clients.get_s3_client().meta.config
+
+        self.assertEqual(50, config.max_pool_connections)
+        self.assertEqual("standard", config.retries["mode"])
+
+    def test_client_with_single_attempt_should_be_separate(self):
+        client = clients.get_s3_client(max_attempts=1)
+
+        self.assertIsNot(clients.get_s3_client(), client)
+        self.assertEqual(1, client.meta.config.retries["total_max_attempts"])
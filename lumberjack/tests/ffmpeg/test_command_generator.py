@@ -5,7 +5,7 @@ from collections import OrderedDict
 
 from django.test import SimpleTestCase, override_settings
 
-from apps.ffmpeg.command_generator import CommandGenerator, HLSKeyInfoFile
+from apps.ffmpeg.command_generator import CommandGenerator, LadderCommandGenerator, HLSKeyInfoFile
 
 
 class TestCommandGenerator(SimpleTestCase):
@@ -39,7 +39,8 @@ class TestCommandGenerator(SimpleTestCase):
             "ffmpeg -hide_banner -reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 300 "
             "-i https://domain.com/path/videos/raw_video.mp4"
             " -c:a aac -b:a 48000 -c:v h264 -preset fast -s 360x640 -b:v 500000 -format hls "
-            "-hls_list_size 0 -hls_time 10 -hls_segment_filename tests/ffmpeg/data/1232/360p/video_%d.ts "
+            "-hls_list_size 0 -hls_time 10 -hls_flags temp_file "
+            "-hls_segment_filename tests/ffmpeg/data/1232/360p/video_%d.ts "
             "-hls_key_info_file tests/ffmpeg/data/1232/key/enc.keyinfo -max_muxing_queue_size 9999 "
             "tests/ffmpeg/data/1232/360p/video.m3u8"
         )
@@ -49,6 +50,11 @@ class TestCommandGenerator(SimpleTestCase):
     def test_ffmpeg_binary_name_should_be_correct_in_command_generator(self):
         self.assertEqual("ffmpeg -hide_banner", self.command_generator.ffmpeg_binary)
 
+    def test_progress_should_be_written_to_progress_url_instead_of_log(self):
+        self.command_generator.options["progress_url"] = "pipe:5"
+
+        self.assertEqual("ffmpeg -hide_banner -nostats -progress pipe:5", self.command_generator.ffmpeg_binary)
+
     def test_input_argument_should_return_input_url(self):
         input_args = OrderedDict(
             [
@@ -60,7 +66,7 @@ class TestCommandGenerator(SimpleTestCase):
         )
         self.assertDictEqual(input_args, self.command_generator.input_argument)
 
-    @mock.patch("apps.ffmpeg.inputs.boto3.Session.client")
+    @mock.patch("apps.ffmpeg.inputs.get_s3_client")
     def test_input_argument_should_be_signed_url_for_s3(self, mock_boto_client):
         data = self.data
         data["input"] = "s3://bucket/input.mp4"
@@ -70,6 +76,154 @@ class TestCommandGenerator(SimpleTestCase):
         input_args = OrderedDict([("i", "hello")])
         self.assertDictEqual(input_args, command_generator.input_argument)
 
+    @override_settings(TRANSCODED_VIDEOS_PATH="tests/ffmpeg/data")
+    def test_chunk_should_be_seeked_and_numbered_from_its_start(self):
+        data = self.data
+        del data["encryption"]
+        data["file_name"] = "chunk_1.m3u8"
+        data["chunk"] = {"index": 1, "start": 300, "duration": 300, "start_number": 30}
+        ffmpeg_command = (
+            "ffmpeg -hide_banner -reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 300 -ss 300 -t 300 "
+            "-i https://domain.com/path/videos/raw_video.mp4"
+            " -c:a aac -b:a 48000 -c:v h264 -preset fast -s 360x640 -b:v 500000 -format hls "
+            "-hls_list_size 0 -hls_time 10 -hls_flags temp_file "
+            "-hls_segment_filename tests/ffmpeg/data/1232/360p/video_%d.ts "
+            '-start_number 30 -force_key_frames "expr:gte(t,n_forced*10)" -max_muxing_queue_size 9999 '
+            "-output_ts_offset 300 tests/ffmpeg/data/1232/360p/chunk_1.m3u8"
+        )
+
+        self.assertEqual(ffmpeg_command, CommandGenerator(data).generate())
+
+    @override_settings(TRANSCODED_VIDEOS_PATH="tests/ffmpeg/data")
+    def test_resumed_transcode_should_continue_after_uploaded_segments(self):
+        data = self.data
+        del data["encryption"]
+        data["resume"] = {"start": 120.0, "start_number": 12}
+        ffmpeg_command = (
+            "ffmpeg -hide_banner -reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 300 -ss 120.0 "
+            "-i https://domain.com/path/videos/raw_video.mp4"
+            " -c:a aac -b:a 48000 -c:v h264 -preset fast -s 360x640 -b:v 500000 -format hls "
+            "-hls_list_size 0 -hls_time 10 -hls_flags temp_file "
+            "-hls_segment_filename tests/ffmpeg/data/1232/360p/video_%d.ts "
+            '-start_number 12 -force_key_frames "expr:gte(t,n_forced*10)" -max_muxing_queue_size 9999 '
+            "-output_ts_offset 120.0 tests/ffmpeg/data/1232/360p.resume/video.m3u8"
+        )
+
+        self.assertEqual(ffmpeg_command, CommandGenerator(data).generate())
+
+    @override_settings(TRANSCODED_VIDEOS_PATH="tests/ffmpeg/data")
+    def test_output_should_be_written_to_upload_url_when_it_is_set(self):
+        data = self.data
+        del data["encryption"]
+        data["upload_url"] = "http://127.0.0.1:8000"
+        ffmpeg_command = (
+            "ffmpeg -hide_banner -reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 300 "
+            "-i https://domain.com/path/videos/raw_video.mp4"
+            " -c:a aac -b:a 48000 -c:v h264 -preset fast -s 360x640 -b:v 500000 -format hls "
+            "-hls_list_size 0 -hls_time 10 -hls_segment_filename http://127.0.0.1:8000/360p/video_%d.ts "
+            "-method PUT -http_persistent 1 -max_muxing_queue_size 9999 http://127.0.0.1:8000/360p/video.m3u8"
+        )
+
+        self.assertEqual(ffmpeg_command, CommandGenerator(data).generate())
+
+    def test_playlist_of_progressive_output_should_be_event_playlist(self):
+        data = self.data
+        data["progressive"] = True
+
+        self.assertEqual("event", CommandGenerator(data).media_options["hls_playlist_type"])
+
+    @override_settings(TRANSCODED_VIDEOS_PATH="tests/ffmpeg/data")
+    def test_mp4_should_be_fragmented_when_written_to_upload_url(self):
+        data = self.data
+        data.update({"format": "mp4", "file_name": "video.mp4", "upload_url": "http://127.0.0.1:8000"})
+        command = CommandGenerator(data).generate()
+
+        self.assertIn("-format mp4 -movflags frag_keyframe+empty_moov+default_base_moof -method PUT", command)
+        self.assertTrue(command.endswith(" http://127.0.0.1:8000/360p/video.mp4"))
+
+    def test_keyframes_should_be_aligned_to_segments_when_frame_rate_is_probed(self):
+        data = self.data
+        data["probe"] = {"duration": 600, "frame_rate": 29.97}
+
+        self.assertEqual(300, CommandGenerator(data).media_options["g"])
+
+    @property
+    def matching_probe(self):
+        return {
+            "duration": 600,
+            "frame_rate": 25,
+            "width": 360,
+            "height": 640,
+            "video_codec": "h264",
+            "video_bitrate": 450000,
+            "keyframe_interval": 2,
+            "audio_codec": "aac",
+            "audio_bitrate": 48000,
+        }
+
+    def test_streams_matching_output_should_be_copied_when_passthrough_is_allowed(self):
+        data = self.data
+        data.update(passthrough=True, probe=self.matching_probe)
+        media_options = CommandGenerator(data).media_options
+
+        self.assertEqual("copy", media_options["c:v"])
+        self.assertEqual("copy", media_options["c:a"])
+        self.assertNotIn("s", media_options)
+        self.assertNotIn("g", media_options)
+
+    def test_streams_should_be_encoded_when_passthrough_is_not_allowed(self):
+        data = self.data
+        data["probe"] = self.matching_probe
+
+        self.assertEqual("h264", CommandGenerator(data).media_options["c:v"])
+
+    def test_video_should_be_encoded_when_keyframes_are_sparser_than_segments(self):
+        data = self.data
+        data.update(passthrough=True, probe=dict(self.matching_probe, keyframe_interval=12))
+        media_options = CommandGenerator(data).media_options
+
+        self.assertEqual("h264", media_options["c:v"])
+        self.assertEqual("copy", media_options["c:a"])
+
+    def test_video_should_be_encoded_when_input_bitrate_is_higher_than_output(self):
+        data = self.data
+        data.update(passthrough=True, probe=dict(self.matching_probe, video_bitrate=900000))
+
+        self.assertEqual("h264", CommandGenerator(data).media_options["c:v"])
+
+    def test_video_output_should_not_have_audio_when_audio_is_shared(self):
+        data = self.data
+        data["shared_audio"] = True
+        media_options = CommandGenerator(data).media_options
+
+        self.assertIn("an", media_options)
+        self.assertNotIn("c:a", media_options)
+
+    def test_audio_only_output_should_not_have_video(self):
+        data = self.data
+        data.update(shared_audio=True, probe={"frame_rate": 25})
+        del data["output"]["video"]
+        media_options = CommandGenerator(data).media_options
+
+        self.assertIn("vn", media_options)
+        self.assertEqual("aac", media_options["c:a"])
+        self.assertNotIn("g", media_options)
+
+    def test_threads_should_be_limited_to_allocated_threads(self):
+        data = self.data
+        data["threads"] = 4
+        command_generator = CommandGenerator(data)
+
+        self.assertEqual(4, command_generator.input_argument["filter_threads"])
+        self.assertEqual(4, command_generator.media_options["threads"])
+
+    def test_x265_thread_pool_should_be_limited_to_allocated_threads(self):
+        data = self.data
+        data["threads"] = 4
+        data["output"]["video"]["codec"] = "libx265"
+
+        self.assertEqual("pools=4", CommandGenerator(data).media_options["x265-params"])
+
     @override_settings(TRANSCODED_VIDEOS_PATH="tests/ffmpeg/data")
     def test_output_path_should_use_path_from_settings(self):
         output_path = "tests/ffmpeg/data/1232/360p/video.m3u8"
@@ -81,6 +235,106 @@ class TestCommandGenerator(SimpleTestCase):
         self.assertEqual(output_path + "video.m3u8", self.command_generator.output_path)
 
 
+class TestLadderCommandGenerator(SimpleTestCase):
+    @property
+    def data(self):
+        return {
+            "id": "1232",
+            "input": "/videos/raw_video.mp4",
+            "format": "HLS",
+            "file_name": "video.m3u8",
+            "outputs": [
+                {
+                    "name": "360p",
+                    "url": "s3://bucket/transcoded/360p",
+                    "video": {"width": 640, "height": 360, "codec": "h264", "bitrate": 500000},
+                    "audio": {"codec": "aac", "bitrate": "48000"},
+                },
+                {
+                    "name": "720p",
+                    "url": "s3://bucket/transcoded/720p",
+                    "video": {"width": 1280, "height": 720, "codec": "h264", "bitrate": 1500000},
+                    "audio": {"codec": "aac", "bitrate": "48000"},
+                },
+            ],
+        }
+
+    @override_settings(TRANSCODED_VIDEOS_PATH="tests/ffmpeg/data")
+    def test_ladder_command_should_decode_input_once_for_all_outputs(self):
+        ffmpeg_command = (
+            "ffmpeg -hide_banner -i /videos/raw_video.mp4 "
+            '-filter_complex "[0:v]split=2[s0][s1];[s0]scale=640:360[v0];[s1]scale=1280:720[v1]" '
+            "-map [v0] -map 0:a? -c:a aac -b:a 48000 -c:v h264 -preset fast -b:v 500000 -format hls "
+            "-hls_list_size 0 -hls_time 10 -hls_flags temp_file "
+            "-hls_segment_filename tests/ffmpeg/data/1232/360p/video_%d.ts "
+            "-max_muxing_queue_size 9999 tests/ffmpeg/data/1232/360p/video.m3u8 "
+            "-map [v1] -map 0:a? -c:a aac -b:a 48000 -c:v h264 -preset fast -b:v 1500000 -format hls "
+            "-hls_list_size 0 -hls_time 10 -hls_flags temp_file "
+            "-hls_segment_filename tests/ffmpeg/data/1232/720p/video_%d.ts "
+            "-max_muxing_queue_size 9999 tests/ffmpeg/data/1232/720p/video.m3u8"
+        )
+
+        self.assertEqual(ffmpeg_command, LadderCommandGenerator(self.data).generate())
+
+    @override_settings(TRANSCODED_VIDEOS_PATH="tests/ffmpeg/data")
+    def test_ladder_should_map_input_video_for_copied_rendition(self):
+        data = self.data
+        data["passthrough"] = True
+        data["probe"] = {
+            "width": 1280,
+            "height": 720,
+            "video_codec": "h264",
+            "video_bitrate": 1400000,
+            "keyframe_interval": 2,
+            "audio_codec": "aac",
+            "audio_bitrate": 128000,
+        }
+        ffmpeg_command = (
+            "ffmpeg -hide_banner -i /videos/raw_video.mp4 "
+            '-filter_complex "[0:v]split=1[s0];[s0]scale=640:360[v0]" '
+            "-map [v0] -map 0:a? -c:a aac -b:a 48000 -c:v h264 -preset fast -b:v 500000 -format hls "
+            "-hls_list_size 0 -hls_time 10 -hls_flags temp_file "
+            "-hls_segment_filename tests/ffmpeg/data/1232/360p/video_%d.ts "
+            "-max_muxing_queue_size 9999 tests/ffmpeg/data/1232/360p/video.m3u8 "
+            "-map 0:v:0 -map 0:a? -c:a aac -b:a 48000 -c:v copy -format hls "
+            "-hls_list_size 0 -hls_time 10 -hls_flags temp_file "
+            "-hls_segment_filename tests/ffmpeg/data/1232/720p/video_%d.ts "
+            "-max_muxing_queue_size 9999 tests/ffmpeg/data/1232/720p/video.m3u8"
+        )
+
+        self.assertEqual(ffmpeg_command, LadderCommandGenerator(data).generate())
+
+    def test_ladder_renditions_should_share_threads_of_the_process(self):
+        data = self.data
+        data["threads"] = 8
+        generator = LadderCommandGenerator(data)
+
+        self.assertEqual(8, generator.input_argument["filter_threads"])
+        self.assertEqual([4, 4], [rendition.media_options["threads"] for rendition in generator.rendition_generators])
+
+    @override_settings(TRANSCODED_VIDEOS_PATH="tests/ffmpeg/data")
+    def test_ladder_should_encode_shared_audio_into_its_own_rendition(self):
+        data = self.data
+        data["shared_audio"] = True
+        data["outputs"] = data["outputs"][:1] + [
+            {"name": "audio", "url": "s3://bucket/transcoded/audio", "audio": {"codec": "aac", "bitrate": "48000"}}
+        ]
+        ffmpeg_command = (
+            "ffmpeg -hide_banner -i /videos/raw_video.mp4 "
+            '-filter_complex "[0:v]split=1[s0];[s0]scale=640:360[v0]" '
+            "-map [v0] -an -c:v h264 -preset fast -b:v 500000 -format hls "
+            "-hls_list_size 0 -hls_time 10 -hls_flags temp_file "
+            "-hls_segment_filename tests/ffmpeg/data/1232/360p/video_%d.ts "
+            "-max_muxing_queue_size 9999 tests/ffmpeg/data/1232/360p/video.m3u8 "
+            "-map 0:a? -c:a aac -b:a 48000 -vn -format hls "
+            "-hls_list_size 0 -hls_time 10 -hls_flags temp_file "
+            "-hls_segment_filename tests/ffmpeg/data/1232/audio/video_%d.ts "
+            "-max_muxing_queue_size 9999 tests/ffmpeg/data/1232/audio/video.m3u8"
+        )
+
+        self.assertEqual(ffmpeg_command, LadderCommandGenerator(data).generate())
+
+
 class TestHLSKeyInfoFile(SimpleTestCase):
     def setUp(self) -> None:
         self.key = "abcde12345"
@@ -1,38 +1,100 @@
+import io
+
 from django.test import SimpleTestCase
 
-from apps.ffmpeg.log_parser import LogParser, FFmpegEvent, Observer, ProgressObserver
+from apps.ffmpeg.log_parser import LogParser, FFmpegEvent, Observer, ProgressObserver, ProgressParser
 from .utils import ProcessMock
 
+PROGRESS = (
+    "frame=0\nfps=0.00\nbitrate=N/A\ntotal_size=N/A\nout_time_us=-9223372036854775807\n"
+    "out_time=-577014:32:22.775808\nspeed=N/A\nprogress=continue\n"
+    "frame=125\nfps=41.67\nstream_0_0_q=28.0\nbitrate= 512.3kbits/s\ntotal_size=320256\n"
+    "out_time_us=5005000\nout_time_ms=5005000\nout_time=00:00:05.005000\ndup_frames=0\ndrop_frames=0\n"
+    "speed=1.67x\nprogress=end\n"
+)
+
 
 class ObserverMock(Observer):
     def __init__(self, event_type):
         self.called = False
         self.type = event_type
+        self.data = []
 
-    def notify(self, *args, **kwargs):
+    def notify(self, data, **kwargs):
         self.called = True
+        self.data.append(data)
 
     @property
     def event_type(self):
         return self.type
 
 
+class TestProgressParser(SimpleTestCase):
+    def test_block_of_progress_stream_should_be_parsed_into_progress(self):
+        parser = ProgressParser()
+        progresses = [parser.feed(line) for line in io.StringIO(PROGRESS)]
+        progress = progresses[-1]
+
+        self.assertEqual(2, len([progress for progress in progresses if progress is not None]))
+        self.assertEqual(5.005, progress.out_time)
+        self.assertEqual(125, progress.frame)
+        self.assertEqual(41.67, progress.fps)
+        self.assertEqual(512.3, progress.bitrate)
+        self.assertEqual(1.67, progress.speed)
+        self.assertEqual(320256, progress.total_size)
+        self.assertTrue(progress.is_ended)
+
+    def test_values_unknown_to_ffmpeg_should_be_none(self):
+        parser = ProgressParser()
+        progress = [parser.feed(line) for line in io.StringIO(PROGRESS)][7]
+
+        self.assertIsNone(progress.out_time)
+        self.assertIsNone(progress.bitrate)
+        self.assertIsNone(progress.speed)
+        self.assertEqual(0, progress.frame)
+
+
 class TestMonitor(SimpleTestCase):
+    def run_log_parser(self, observer, duration=None, process=None):
+        log_parser = LogParser(process or ProcessMock(), io.StringIO(PROGRESS), duration)
+        log_parser.register(observer)
+        # The log is drained first, like ffmpeg writes the input and its duration to it before any progress.
+        log_parser.log_thread.start()
+        log_parser.log_thread.join()
+        log_parser.run()
+        return log_parser
+
     def test_observer_should_get_called_for_correct_event(self):
         self.observer = ObserverMock(FFmpegEvent.PROGRESS_EVENT)
-        log_parser = LogParser(ProcessMock())
-        log_parser.register(self.observer)
-        log_parser.run()
+        self.run_log_parser(self.observer, duration=20)
+
+        self.assertEqual([0, 25], self.observer.data)
+
+    def test_duration_should_be_read_from_log_when_unknown(self):
+        observer = ObserverMock(FFmpegEvent.PROGRESS_EVENT)
+        self.run_log_parser(observer)
+
+        self.assertEqual(50, observer.data[-1])
 
-        self.assertTrue(self.observer.called)
+    def test_stats_should_be_sent_to_observers(self):
+        observer = ObserverMock(FFmpegEvent.STATS_EVENT)
+        log_parser = self.run_log_parser(observer)
+
+        self.assertEqual(125, observer.data[-1].frame)
+        self.assertEqual(observer.data[-1], log_parser.progress)
 
     def test_output_event_should_get_triggered_once_log_is_finished(self):
         self.output_event_observer = ObserverMock(FFmpegEvent.OUTPUT_EVENT)
-        log_parser = LogParser(ProcessMock())
-        log_parser.register(self.output_event_observer)
-        log_parser.run()
+        self.run_log_parser(self.output_event_observer)
+
+        self.assertEqual([False, True], self.output_event_observer.data)
+
+    def test_only_last_lines_of_log_should_be_kept(self):
+        log = "".join("line {}\n".format(number) for number in range(LogParser.LOG_SIZE + 10))
+        log_parser = self.run_log_parser(ObserverMock(FFmpegEvent.PROGRESS_EVENT), process=ProcessMock(log))
 
-        self.assertTrue(self.output_event_observer.called)
+        self.assertEqual(LogParser.LOG_SIZE, len(log_parser.log))
+        self.assertEqual("line 10", log_parser.log[0])
 
 
 class TestProgressObserver(SimpleTestCase):
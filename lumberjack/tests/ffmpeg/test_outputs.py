@@ -1,10 +1,20 @@
-from mock import patch
+import errno
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from botocore.exceptions import ClientError
+from mock import Mock, call, patch
 
 from moto import mock_s3
 
-from django.test import SimpleTestCase
+from django.test import SimpleTestCase, override_settings
 
-from apps.ffmpeg.outputs import OutputFileFactory, LocalFileStorage, S3
+from apps.ffmpeg import clients
+from apps.ffmpeg.outputs import OutputFileFactory, LocalFileStorage, S3, UploadLedger, get_file_etag
 
 
 class TestOutputFactory(SimpleTestCase):
@@ -21,6 +31,9 @@ class TestOutputFactory(SimpleTestCase):
 
 class TestS3Storage(SimpleTestCase):
     def setUp(self) -> None:
+        # Clients built before moto is started, or while it is, are cached for the whole process.
+        clients.clear()
+        self.addCleanup(clients.clear)
         self.s3_mock = mock_s3()
         self.s3_mock.start()
         self.s3_storage = S3("s3://somebucket/folder")
@@ -34,5 +47,367 @@ class TestS3Storage(SimpleTestCase):
         self.assertEqual(200, s3_response["ResponseMetadata"]["HTTPStatusCode"])
         self.assertTrue(mock_os_remove.called)
 
+    def test_delete_files_should_delete_objects_under_destination(self):
+        for key in ("folder/chunk_0.m3u8", "folder/chunk_1.m3u8", "folder/video_0.ts"):
+            self.s3_storage.client.put_object(Bucket="somebucket", Key=key, Body=b"")
+
+        self.s3_storage.delete_files(["chunk_0.m3u8", "chunk_1.m3u8"])
+
+        objects = self.s3_storage.client.list_objects(Bucket="somebucket")["Contents"]
+        self.assertEqual(["folder/video_0.ts"], [s3_object["Key"] for s3_object in objects])
+
+    @patch("os.remove")
+    def test_save_files_should_upload_only_given_files(self, mock_os_remove):
+        self.s3_storage.save_files("tests/ffmpeg/data", ["tests/ffmpeg/data/video.mp4"])
+
+        objects = self.s3_storage.client.list_objects(Bucket="somebucket")["Contents"]
+        self.assertEqual(["folder/video.mp4"], [s3_object["Key"] for s3_object in objects])
+        mock_os_remove.assert_called_once_with("tests/ffmpeg/data/video.mp4")
+
+    def test_only_files_which_were_uploaded_should_be_removed(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        for name in ("video_0.ts", "video_1.ts"):
+            open(os.path.join(directory, name), "w").close()
+
+        def upload_file(path, source_directory):
+            if path.endswith("video_1.ts"):
+                raise ClientError({"Error": {"Code": "500"}}, "PutObject")
+
+        with patch.object(self.s3_storage, "upload_file", side_effect=upload_file):
+            with self.assertRaises(ClientError):
+                self.s3_storage.save(directory)
+
+        self.assertEqual(["video_1.ts"], os.listdir(directory))
+
+    def test_file_which_failed_to_upload_should_be_uploaded_by_next_save(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.addCleanup(os.remove, directory + ".uploads")
+        open(os.path.join(directory, "video_0.ts"), "w").close()
+        error = ClientError({"Error": {"Code": "AccessDenied"}}, "PutObject")
+
+        with patch.object(self.s3_storage.upload_client, "put_object", side_effect=error):
+            with self.assertRaises(ClientError):
+                self.s3_storage.save(directory)
+        self.s3_storage.save(directory)
+
+        self.assertEqual([], os.listdir(directory))
+        self.s3_storage.client.head_object(Bucket="somebucket", Key="folder/video_0.ts")
+
+    def test_files_in_ledger_should_not_be_uploaded_again(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, "video_0.ts")
+        open(path, "w").close()
+        UploadLedger(directory).add("folder/video_0.ts", os.stat(path), None)
+        self.addCleanup(os.remove, directory + ".uploads")
+
+        with patch.object(self.s3_storage.upload_client, "put_object") as mock_put_object:
+            self.s3_storage.save(directory)
+
+        self.assertFalse(mock_put_object.called)
+        self.assertFalse(os.path.exists(path))
+
+    def test_uploads_should_wait_for_bandwidth_of_job_in_order_of_segments(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.addCleanup(os.remove, directory + ".uploads")
+        for name in ("video_1.ts", "video_0.ts"):
+            with open(os.path.join(directory, name), "w") as file:
+                file.write("segment")
+        self.s3_storage.limiter = Mock()
+        self.s3_storage.max_workers = 1
+
+        self.s3_storage.save(directory)
+
+        self.assertEqual([call(7, 0), call(7, 1)], self.s3_storage.limiter.acquire.call_args_list)
+
+    def test_files_identical_to_objects_of_earlier_run_should_not_be_uploaded_again(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.addCleanup(os.remove, directory + ".uploads")
+        for name, content in (("video_0.ts", "segment"), ("video_1.ts", "changed")):
+            self.s3_storage.client.put_object(Bucket="somebucket", Key="folder/" + name, Body="segment")
+            with open(os.path.join(directory, name), "w") as file:
+                file.write(content)
+
+        with patch.object(
+            self.s3_storage.upload_client, "put_object", return_value={"ETag": '"etag"'}
+        ) as mock_put_object:
+            self.s3_storage.save(directory)
+
+        self.assertEqual(["folder/video_1.ts"], [kwargs["Key"] for _, kwargs in mock_put_object.call_args_list])
+        self.assertEqual(1, self.s3_storage.metrics["upload_deduplicated_files"])
+        self.assertEqual([], os.listdir(directory))
+
+    def test_objects_not_listed_by_completed_playlist_should_be_reported_as_stale(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        for name in ("video_0.ts", "video_1.ts"):
+            self.s3_storage.client.put_object(Bucket="somebucket", Key="folder/" + name, Body="segment")
+        with open(os.path.join(directory, "video.m3u8"), "w") as file:
+            file.write("#EXTM3U\n#EXTINF:10.0,\nvideo_0.ts\n#EXT-X-ENDLIST\n")
+
+        self.s3_storage.save(directory)
+
+        self.assertEqual(0, self.s3_storage.metrics["upload_stale_objects"])
+
+        self.s3_storage.save(directory, is_transcode_completed=True)
+
+        self.assertEqual(1, self.s3_storage.metrics["upload_stale_objects"])
+        self.assertEqual(["folder/video_1.ts"], self.s3_storage.metrics["upload_stale_keys"])
+
+    def test_playlists_should_be_uploaded_once_segments_are_uploaded(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        for name in ("video.m3u8", "video_0.ts", "video_1.ts"):
+            open(os.path.join(directory, name), "w").close()
+        failing_names = {"video_1.ts"}
+        uploaded_names = []
+
+        def upload_file(path, source_directory):
+            if os.path.basename(path) in failing_names:
+                raise ClientError({"Error": {"Code": "AccessDenied"}}, "PutObject")
+            uploaded_names.append(os.path.basename(path))
+
+        with patch.object(self.s3_storage, "upload_file", side_effect=upload_file):
+            with self.assertRaises(ClientError):
+                self.s3_storage.save(directory, is_transcode_completed=True)
+
+            self.assertEqual(["video.m3u8", "video_1.ts"], sorted(os.listdir(directory)))
+
+            failing_names.clear()
+            self.s3_storage.save(directory, is_transcode_completed=True)
+
+        self.assertEqual(["video_0.ts", "video_1.ts", "video.m3u8"], uploaded_names)
+
+    def test_ledger_should_be_removed_once_output_is_completed(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        open(os.path.join(directory, "video_0.ts"), "w").close()
+
+        self.s3_storage.save(directory)
+
+        self.assertTrue(os.path.exists(directory + ".uploads"))
+
+        self.s3_storage.save(directory, is_transcode_completed=True)
+
+        self.assertFalse(os.path.exists(directory + ".uploads"))
+
+    def test_etag_of_file_larger_than_part_should_be_computed_like_multipart_upload(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, "video.mp4")
+        with open(path, "wb") as file:
+            file.write(b"abc")
+        part_digests = hashlib.md5(b"ab").digest() + hashlib.md5(b"c").digest()
+
+        self.assertEqual("{}-2".format(hashlib.md5(part_digests).hexdigest()), get_file_etag(path, 2))
+        self.assertEqual(hashlib.md5(b"abc").hexdigest(), get_file_etag(path, 4))
+
+    @override_settings(UPLOAD_RETRY_DELAY=0)
+    def test_upload_should_be_retried_after_throttling(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        open(os.path.join(directory, "video_0.ts"), "w").close()
+        throttling_error = ClientError({"Error": {"Code": "SlowDown"}}, "PutObject")
+
+        with patch.object(self.s3_storage, "upload_file", side_effect=[throttling_error, None]):
+            self.s3_storage.save(directory)
+
+        self.assertEqual([], os.listdir(directory))
+        self.assertEqual(1, self.s3_storage.metrics["upload_retries"])
+        self.assertEqual(0, self.s3_storage.metrics["upload_failures"])
+
+    @override_settings(UPLOAD_RETRY_DELAY=0, UPLOAD_RETRIES=2)
+    def test_upload_should_fail_once_retries_are_exhausted(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        open(os.path.join(directory, "video_0.ts"), "w").close()
+        throttling_error = ClientError({"Error": {"Code": "SlowDown"}}, "PutObject")
+
+        with patch.object(self.s3_storage, "upload_file", side_effect=throttling_error):
+            with self.assertRaises(ClientError):
+                self.s3_storage.save(directory)
+
+        self.assertEqual(["video_0.ts"], os.listdir(directory))
+        self.assertEqual(2, self.s3_storage.metrics["upload_retries"])
+        self.assertEqual(1, self.s3_storage.metrics["upload_failures"])
+
+    def test_multipart_upload_should_carry_on_from_last_part_after_restart(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.addCleanup(os.remove, directory + ".uploads")
+        path = os.path.join(directory, "video.mp4")
+        with open(path, "wb") as file:
+            file.write(os.urandom(S3.MULTIPART_THRESHOLD + 1024))
+        etag = get_file_etag(path, S3.MULTIPART_THRESHOLD)
+        # Left behind by a worker which died after uploading the first part.
+        client = self.s3_storage.upload_client
+        upload_id = client.create_multipart_upload(Bucket="somebucket", Key="folder/video.mp4")["UploadId"]
+        with open(path, "rb") as file:
+            body = file.read(S3.MULTIPART_THRESHOLD)
+        response = client.upload_part(
+            Body=body, Bucket="somebucket", Key="folder/video.mp4", UploadId=upload_id, PartNumber=1
+        )
+        ledger = UploadLedger(directory)
+        ledger.start_multipart_upload("folder/video.mp4", os.stat(path), upload_id)
+        ledger.add_part("folder/video.mp4", upload_id, 1, response["ETag"])
+
+        storage = S3("s3://somebucket/folder")
+        with patch.object(storage.upload_client, "upload_part", wraps=client.upload_part) as mock_upload_part:
+            storage.save(directory)
+
+        self.assertEqual([2], [kwargs["PartNumber"] for _, kwargs in mock_upload_part.call_args_list])
+        response = storage.client.head_object(Bucket="somebucket", Key="folder/video.mp4")
+        self.assertEqual('"{}"'.format(etag), response["ETag"])
+
+    def test_multipart_upload_which_failed_for_good_should_be_aborted(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.addCleanup(os.remove, directory + ".uploads")
+        with open(os.path.join(directory, "video.mp4"), "wb") as file:
+            file.write(os.urandom(S3.MULTIPART_THRESHOLD + 1024))
+        error = ClientError({"Error": {"Code": "AccessDenied"}}, "UploadPart")
+
+        with patch.object(self.s3_storage.upload_client, "upload_part", side_effect=error):
+            with self.assertRaises(ClientError):
+                self.s3_storage.save(directory)
+
+        self.assertNotIn("Uploads", self.s3_storage.client.list_multipart_uploads(Bucket="somebucket"))
+        self.assertEqual({}, UploadLedger(directory).multipart_uploads)
+
+    def test_multipart_upload_of_file_which_changed_should_be_aborted(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.addCleanup(os.remove, directory + ".uploads")
+        path = os.path.join(directory, "video.mp4")
+        with open(path, "wb") as file:
+            file.write(os.urandom(S3.MULTIPART_THRESHOLD + 1024))
+        upload_id = self.s3_storage.client.create_multipart_upload(Bucket="somebucket", Key="folder/video.mp4")[
+            "UploadId"
+        ]
+        UploadLedger(directory).start_multipart_upload("folder/video.mp4", os.stat(path), upload_id)
+        os.utime(path, (0, 0))
+
+        with patch.object(self.s3_storage.client, "abort_multipart_upload") as mock_abort:
+            self.s3_storage.save(directory)
+
+        mock_abort.assert_called_once_with(Bucket="somebucket", Key="folder/video.mp4", UploadId=upload_id)
+        self.assertEqual([], os.listdir(directory))
+
+    def test_parts_of_all_files_should_share_upload_concurrency(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.addCleanup(os.remove, directory + ".uploads")
+        for name in ("video_0.mp4", "video_1.mp4"):
+            with open(os.path.join(directory, name), "wb") as file:
+                file.write(b"0123456789ab")
+        storage = S3("s3://somebucket/folder")
+        storage.MULTIPART_THRESHOLD = 4
+        storage.upload_slots = threading.BoundedSemaphore(2)
+        lock = threading.Lock()
+        requests = {"in_flight": 0, "max_in_flight": 0}
+
+        def upload_part(**kwargs):
+            with lock:
+                requests["in_flight"] += 1
+                requests["max_in_flight"] = max(requests["max_in_flight"], requests["in_flight"])
+            time.sleep(0.05)
+            with lock:
+                requests["in_flight"] -= 1
+            return {"ETag": '"etag"'}
+
+        with patch.object(storage.upload_client, "upload_part", side_effect=upload_part), patch.object(
+            storage.upload_client, "complete_multipart_upload", return_value={"ETag": '"etag"'}
+        ):
+            storage.save(directory)
+
+        self.assertEqual(2, requests["max_in_flight"])
+        self.assertEqual([], os.listdir(directory))
+
+    def test_progressive_playlist_should_be_saved_as_standard_storage(self):
+        S3("s3://somebucket/folder/video.m3u8").save_text("#EXTM3U\n", is_progressive=True)
+        S3("s3://somebucket/folder/manifest.m3u8").save_text("#EXTM3U\n")
+
+        objects = self.s3_storage.client.list_objects(Bucket="somebucket")["Contents"]
+        self.assertEqual(
+            {"folder/manifest.m3u8": "STANDARD_IA", "folder/video.m3u8": "STANDARD"},
+            {s3_object["Key"]: s3_object["StorageClass"] for s3_object in objects},
+        )
+
     def tearDown(self) -> None:
         self.s3_mock.stop()
+        if os.path.exists("tests/ffmpeg/data.uploads"):
+            os.remove("tests/ffmpeg/data.uploads")
+
+
+class TestLocalFileStorage(SimpleTestCase):
+    def setUp(self):
+        self.source = tempfile.mkdtemp()
+        self.destination = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.source)
+        self.addCleanup(shutil.rmtree, self.destination)
+        self.storage = LocalFileStorage("file://" + self.destination)
+        for name, content in (("video_0.ts", "segment"), ("video_1.ts.tmp", "partial"), ("video.m3u8", "#EXTM3U")):
+            with open(os.path.join(self.source, name), "w") as file:
+                file.write(content)
+
+    def read(self, name):
+        with open(os.path.join(self.destination, name)) as file:
+            return file.read()
+
+    def test_completed_files_should_be_moved_while_playlists_wait_for_transcode(self):
+        self.storage.save(self.source)
+
+        self.assertEqual(["video_0.ts"], os.listdir(self.destination))
+        self.assertEqual(["video.m3u8", "video_1.ts.tmp"], sorted(os.listdir(self.source)))
+
+        self.storage.save(self.source, is_transcode_completed=True)
+
+        self.assertEqual("#EXTM3U", self.read("video.m3u8"))
+
+    def test_playlists_should_be_moved_after_segments_once_transcode_is_completed(self):
+        with patch.object(self.storage, "move_file") as mock_move_file:
+            self.storage.save(self.source, is_transcode_completed=True)
+
+        moved_names = [os.path.basename(args[0]) for args, _ in mock_move_file.call_args_list]
+        self.assertEqual(["video_0.ts", "video.m3u8"], moved_names)
+
+    def test_files_should_be_copied_to_other_filesystem(self):
+        with patch("os.rename", side_effect=OSError(errno.EXDEV, "Invalid cross-device link")):
+            self.storage.save_files(self.source, [os.path.join(self.source, "video_0.ts")])
+
+        self.assertEqual("segment", self.read("video_0.ts"))
+        self.assertFalse(os.path.exists(os.path.join(self.source, "video_0.ts")))
+
+    def test_file_being_written_should_only_be_copied_to_other_filesystem_once_transcode_is_completed(self):
+        path = os.path.join(self.source, "video.mp4")
+        with patch("os.rename", side_effect=OSError(errno.EXDEV, "Invalid cross-device link")):
+            with open(path, "w") as file:
+                file.write("head")
+                file.flush()
+                self.storage.save(self.source)
+                self.storage.save_files(self.source, [path])
+                file.write("tail")
+
+            self.assertFalse(os.path.exists(os.path.join(self.destination, "video.mp4")))
+
+            self.storage.save(self.source, is_transcode_completed=True)
+
+        self.assertEqual("headtail", self.read("video.mp4"))
+        self.assertFalse(os.path.exists(path))
+
+    def test_text_should_replace_file_at_once(self):
+        LocalFileStorage(os.path.join(self.destination, "video.m3u8")).save_text("#EXTM3U")
+
+        self.assertEqual(["video.m3u8"], os.listdir(self.destination))
+        self.assertEqual("#EXTM3U", self.read("video.m3u8"))
+
+    def test_delete_files_should_skip_missing_files(self):
+        self.storage.save_files(self.source, [os.path.join(self.source, "video_0.ts")])
+
+        self.storage.delete_files(["video_0.ts", "video_1.ts"])
+
+        self.assertEqual([], os.listdir(self.destination))
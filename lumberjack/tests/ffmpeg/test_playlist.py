@@ -0,0 +1,39 @@
+from django.test import SimpleTestCase
+
+from apps.ffmpeg.playlist import MediaPlaylist
+
+
+class TestMediaPlaylist(SimpleTestCase):
+    def playlist_content(self, media_sequence, segments):
+        content = "#EXTM3U\n#EXT-X-VERSION:3\n#EXT-X-TARGETDURATION:10\n"
+        content += "#EXT-X-MEDIA-SEQUENCE:{}\n".format(media_sequence)
+        for number in segments:
+            content += "#EXTINF:10.000000,\nvideo_{}.ts\n".format(number)
+        return content + "#EXT-X-ENDLIST\n"
+
+    def test_loads_should_parse_segments_of_playlist(self):
+        playlist = MediaPlaylist.loads(self.playlist_content(2, [2, 3]))
+
+        self.assertEqual(2, playlist.media_sequence)
+        self.assertEqual(["video_2.ts", "video_3.ts"], [segment["uri"] for segment in playlist.segments])
+        self.assertEqual(20, playlist.duration)
+        self.assertTrue(playlist.is_ended)
+
+    def test_tags_before_segment_should_be_preserved(self):
+        content = self.playlist_content(0, [0]).replace(
+            "#EXTINF", '#EXT-X-KEY:METHOD=AES-128,URI="https://domain.com/key"\n#EXTINF'
+        )
+        playlist = MediaPlaylist.loads(content)
+
+        self.assertIn('#EXT-X-KEY:METHOD=AES-128,URI="https://domain.com/key"', playlist.dumps())
+
+    def test_extended_playlist_should_contain_segments_of_both_playlists(self):
+        playlist = MediaPlaylist.loads(self.playlist_content(0, [0, 1]))
+        playlist.extend(MediaPlaylist.loads(self.playlist_content(2, [2, 3])))
+
+        expected_content = (
+            "#EXTM3U\n#EXT-X-VERSION:3\n#EXT-X-TARGETDURATION:10\n#EXT-X-MEDIA-SEQUENCE:0\n"
+            "#EXT-X-PLAYLIST-TYPE:VOD\n#EXTINF:10.000000,\nvideo_0.ts\n#EXTINF:10.000000,\nvideo_1.ts\n"
+            "#EXTINF:10.000000,\nvideo_2.ts\n#EXTINF:10.000000,\nvideo_3.ts\n#EXT-X-ENDLIST\n"
+        )
+        self.assertEqual(expected_content, playlist.dumps())
@@ -0,0 +1,89 @@
+import re
+import shutil
+import tempfile
+import threading
+
+import requests
+import responses
+
+from django.test import SimpleTestCase
+
+from apps.ffmpeg.prefetch import RangedDownloader, PrefetchServer
+
+
+class TestRangedDownloader(SimpleTestCase):
+    url = "https://domain.com/videos/raw_video.mp4"
+    content = bytes(range(256)) * 40
+
+    def setUp(self) -> None:
+        self.directory = tempfile.mkdtemp()
+        self.downloader = RangedDownloader(self.url, self.directory + "/input", part_size=1000, max_workers=4)
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.directory)
+
+    def serve_range(self, request):
+        start, end = map(int, re.match(r"bytes=(\d+)-(\d+)", request.headers["Range"]).groups())
+        headers = {"Content-Range": "bytes {}-{}/{}".format(start, end, len(self.content))}
+        return 206, headers, self.content[start : end + 1]
+
+    @responses.activate
+    def test_input_should_be_downloaded_in_parts(self):
+        responses.add_callback(responses.GET, self.url, callback=self.serve_range)
+        self.downloader.download()
+
+        with open(self.downloader.path, "rb") as file:
+            self.assertEqual(self.content, file.read())
+        self.assertEqual(set(range(11)), self.downloader.completed_parts)
+        self.assertEqual(12, len(responses.calls))  # Including the request made to find the size
+
+    @responses.activate
+    def test_input_downloaded_by_another_task_should_be_reused(self):
+        responses.add_callback(responses.GET, self.url, callback=self.serve_range)
+        self.downloader.download()
+        downloader = RangedDownloader(self.url, self.downloader.path, part_size=1000, max_workers=4)
+        downloader.download()
+
+        self.assertEqual(12, len(responses.calls))
+        self.assertEqual(len(self.content), downloader.wait_for_size())
+
+    @responses.activate
+    def test_input_without_ranged_requests_should_raise_error(self):
+        responses.add(responses.GET, self.url, body=self.content)
+
+        with self.assertRaises(ValueError):
+            self.downloader.download()
+        with self.assertRaises(IOError):
+            self.downloader.wait_for_size()
+
+    def test_readers_waiting_for_parts_should_be_woken_up_on_cancel(self):
+        self.downloader.set_size(len(self.content))
+        errors = []
+
+        def read_part():
+            try:
+                self.downloader.wait_for_part(0)
+            except IOError as error:
+                errors.append(error)
+
+        reader = threading.Thread(target=read_part)
+        reader.start()
+        self.downloader.cancel()
+        reader.join(1)
+
+        self.assertFalse(reader.is_alive())
+        self.assertEqual(1, len(errors))
+
+    def test_server_should_serve_requested_range_of_input(self):
+        with responses.RequestsMock() as mock:
+            mock.add_callback(responses.GET, self.url, callback=self.serve_range)
+            self.downloader.download()
+        server = PrefetchServer(self.downloader)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        response = requests.get(server.url, headers={"Range": "bytes=990-1009"})
+
+        self.assertEqual(206, response.status_code)
+        self.assertEqual(self.content[990:1010], response.content)
@@ -0,0 +1,56 @@
+import json
+
+import mock
+from django.test import SimpleTestCase
+
+from apps.ffmpeg.probe import InputProbe
+
+
+class TestInputProbe(SimpleTestCase):
+    @property
+    def format_and_streams(self):
+        return {
+            "format": {"duration": "725.500000", "bit_rate": "2500000"},
+            "streams": [
+                {
+                    "index": 0,
+                    "codec_type": "video",
+                    "codec_name": "h264",
+                    "width": 1280,
+                    "height": 720,
+                    "avg_frame_rate": "30000/1001",
+                    "bit_rate": "2300000",
+                },
+                {"index": 1, "codec_type": "audio", "codec_name": "aac", "bit_rate": "128000"},
+            ],
+        }
+
+    @property
+    def keyframes(self):
+        return {"frames": [{"best_effort_timestamp_time": str(time)} for time in [0.0, 2.0, 4.0, 6.0]]}
+
+    @mock.patch("apps.ffmpeg.probe.subprocess.run")
+    def test_probe_should_return_details_of_input(self, mock_run):
+        mock_run.side_effect = [
+            mock.Mock(stdout=json.dumps(self.format_and_streams)),
+            mock.Mock(stdout=json.dumps(self.keyframes)),
+        ]
+        probe = InputProbe("/videos/video.mp4").run()
+
+        self.assertEqual(725.5, probe["duration"])
+        self.assertEqual((1280, 720), (probe["width"], probe["height"]))
+        self.assertEqual(29.97, probe["frame_rate"])
+        self.assertEqual(("h264", "aac"), (probe["video_codec"], probe["audio_codec"]))
+        self.assertEqual(2300000, probe["video_bitrate"])
+        self.assertEqual(2.0, probe["keyframe_interval"])
+        self.assertEqual(["video", "audio"], [stream["type"] for stream in probe["streams"]])
+
+    @mock.patch("apps.ffmpeg.probe.subprocess.run")
+    def test_probe_of_audio_only_input_should_not_have_video_details(self, mock_run):
+        info = self.format_and_streams
+        del info["streams"][0]
+        mock_run.return_value = mock.Mock(stdout=json.dumps(info))
+        probe = InputProbe("/videos/audio.mp4").run()
+
+        self.assertNotIn("width", probe)
+        self.assertEqual(1, mock_run.call_count)
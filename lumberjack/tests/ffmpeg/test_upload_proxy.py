@@ -0,0 +1,94 @@
+import http.client
+import os
+import shutil
+import tempfile
+import threading
+
+from moto import mock_s3
+
+from django.test import SimpleTestCase
+
+from apps.ffmpeg import clients
+from apps.ffmpeg.outputs import LocalFileStorage, S3
+from apps.ffmpeg.upload_proxy import UploadProxyServer
+
+
+class TestUploadProxyServer(SimpleTestCase):
+    def setUp(self):
+        self.local_path = tempfile.mkdtemp()
+        self.destination = tempfile.mkdtemp()
+        self.server = UploadProxyServer(self.local_path, {"360p": LocalFileStorage(self.destination)})
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.connection = http.client.HTTPConnection(*self.server.server_address)
+
+    def tearDown(self):
+        self.connection.close()
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.local_path)
+        shutil.rmtree(self.destination)
+
+    def put(self, path, body, **kwargs):
+        self.connection.request("PUT", path, body=body, **kwargs)
+        response = self.connection.getresponse()
+        response.read()
+        return response.status
+
+    def read(self, *paths):
+        with open(os.path.join(*paths), "rb") as file:
+            return file.read()
+
+    def test_segment_should_be_saved_to_storage_of_output(self):
+        status = self.put("/360p/video_0.ts", b"segment")
+
+        self.assertEqual(201, status)
+        self.assertEqual(b"segment", self.read(self.destination, "video_0.ts"))
+        self.assertFalse(os.path.exists(os.path.join(self.local_path, "360p", "video_0.ts")))
+
+    def test_files_saved_to_storage_should_be_recorded(self):
+        self.put("/360p/video_0.ts", b"segment")
+        self.put("/360p/video.m3u8", b"#EXTM3U\n#EXTINF:10.0,\nvideo_0.ts\n")
+        self.put("/360p.resume/video.m3u8", b"#EXTM3U\n#EXT-X-ENDLIST\n")
+
+        self.assertEqual({"360p/video_0.ts"}, self.server.saved_files)
+
+    def test_chunked_body_should_be_saved_whole(self):
+        status = self.put("/360p/video_1.ts", iter([b"seg", b"ment"]), encode_chunked=True)
+
+        self.assertEqual(201, status)
+        self.assertEqual(b"segment", self.read(self.destination, "video_1.ts"))
+
+    def test_playlist_should_be_saved_to_storage_only_once_it_is_complete(self):
+        self.put("/360p/video.m3u8", b"#EXTM3U\n#EXTINF:10.0,\nvideo_0.ts\n")
+
+        self.assertEqual(b"#EXTM3U\n#EXTINF:10.0,\nvideo_0.ts\n", self.read(self.local_path, "360p", "video.m3u8"))
+        self.assertFalse(os.path.exists(os.path.join(self.destination, "video.m3u8")))
+
+        self.put("/360p/video.m3u8", b"#EXTM3U\n#EXTINF:10.0,\nvideo_0.ts\n#EXT-X-ENDLIST\n")
+
+        self.assertIn(b"#EXT-X-ENDLIST", self.read(self.destination, "video.m3u8"))
+        self.assertEqual(2, self.server.playlist_updates)
+
+    def test_file_outside_of_outputs_should_be_written_locally(self):
+        self.put("/360p.resume/video.m3u8", b"#EXTM3U\n#EXT-X-ENDLIST\n")
+
+        self.assertEqual(b"#EXTM3U\n#EXT-X-ENDLIST\n", self.read(self.local_path, "360p.resume", "video.m3u8"))
+
+    def test_path_outside_of_job_folder_should_be_rejected(self):
+        self.assertEqual(400, self.put("/../video_0.ts", b"segment"))
+
+    @mock_s3
+    def test_file_larger_than_a_part_should_be_uploaded_to_s3_while_it_is_sent(self):
+        clients.clear()
+        self.addCleanup(clients.clear)
+        storage = S3("s3://bucket/transcoded/360p")
+        storage.client.create_bucket(Bucket="bucket")
+        self.server.storages["360p"] = storage
+        part = b"x" * 1024 * 1024
+
+        status = self.put("/360p/video.mp4", iter([part] * 9), encode_chunked=True)
+
+        self.assertEqual(201, status)
+        response = storage.client.head_object(Bucket="bucket", Key="transcoded/360p/video.mp4")
+        self.assertEqual(9 * len(part), response["ContentLength"])
+        self.assertTrue(response["ETag"].endswith('-2"'))
@@ -30,7 +30,7 @@ class TestVideoTranscodeManager(TestCase, Mixin):
         }
 
     def setUp(self) -> None:
-        self.job = self.create_job(settings=self.job_settings)
+        self.job = self.create_job(settings=self.job_settings, probe={"duration": 600})
         self.create_output(self.job)
         self.manager = VideoTranscoder(self.job)
 
@@ -84,3 +84,108 @@ class TestVideoTranscodeManager(TestCase, Mixin):
         mock_celery_task.apply_async.assert_called_with(
             kwargs={"job_id": self.job.id, "output_id": self.job.outputs.last().id}, queue="transcoding"
         )
+
+    @mock.patch("apps.jobs.tasks.LadderTranscoderTask")
+    @mock.patch("apps.jobs.tasks.VideoTranscoderTask")
+    def test_single_decode_job_should_start_one_task_for_all_outputs(self, mock_celery_task, mock_ladder_task):
+        mock_ladder_task.apply_async().task_id = "4c1761d8-c0cd-4068-a997-ccab60592943"
+        self.job.settings = dict(self.job_settings, execution_mode=Job.SINGLE_DECODE)
+        self.job.save()
+        self.manager.start()
+
+        mock_celery_task.apply_async.assert_not_called()
+        mock_ladder_task.apply_async.assert_called_with(kwargs={"job_id": self.job.id}, queue="transcoding")
+        self.assertFalse(self.job.outputs.exclude(background_task_id=self.job.background_task_id).exists())
+
+    @mock.patch("apps.jobs.tasks.InputProbeTask")
+    @mock.patch("apps.jobs.tasks.VideoTranscoderTask")
+    def test_outputs_should_be_started_only_after_input_is_probed(self, mock_celery_task, mock_probe_task):
+        mock_probe_task.apply_async().task_id = "4c1761d8-c0cd-4068-a997-ccab60592943"
+        self.job.probe = None
+        self.job.save()
+        self.manager.start()
+
+        mock_celery_task.apply_async.assert_not_called()
+        mock_probe_task.apply_async.assert_called_with(
+            kwargs={"job_id": self.job.id, "queue": "transcoding", "sync": False, "create_outputs": True},
+            queue="transcoding",
+        )
+
+    @mock.patch("apps.jobs.tasks.InputProbeTask")
+    @mock.patch("apps.jobs.models.app.control")
+    def test_restart_of_job_without_outputs_should_create_them_once_probed(self, mock_control, mock_probe_task):
+        mock_probe_task.apply_async().task_id = "4c1761d8-c0cd-4068-a997-ccab60592943"
+        job = self.create_job(settings=self.job_settings)
+        VideoTranscoder(job).restart()
+
+        mock_probe_task.apply_async.assert_called_with(
+            kwargs={"job_id": job.id, "queue": "transcoding", "sync": False, "create_outputs": True},
+            queue="transcoding",
+        )
+
+    def test_bitrate_given_as_string_should_be_capped_to_input(self):
+        job = self.create_job(settings=self.job_settings, probe={"video_bitrate": "1000000"})
+        video_settings = {"bitrate": "1500000"}
+        job.cap_video_bitrate(video_settings)
+
+        self.assertEqual(1000000, video_settings["bitrate"])
+
+    @mock.patch("apps.jobs.tasks.VideoTranscoderTask")
+    def test_outputs_larger_than_input_should_be_skipped(self, mock_celery_task):
+        mock_celery_task.apply_async().task_id = "4c1761d8-c0cd-4068-a997-ccab60592943"
+        job_settings = self.job_settings
+        job_settings["outputs"].append(
+            {
+                "name": "720p",
+                "audio": {"codec": "aac", "bitrate": 128000},
+                "video": {"codec": "h264", "width": 1280, "height": 720, "preset": "faster", "bitrate": 2500000},
+            }
+        )
+        job = self.create_job(settings=job_settings, probe={"width": 854, "height": 480, "video_bitrate": 1000000})
+        VideoTranscoder(job).start()
+
+        self.assertEqual(Output.SKIPPED, job.outputs.get(name="720p").status)
+        self.assertEqual(1000000, job.outputs.get(name="360p").video_bitrate)
+        self.assertEqual(2, mock_celery_task.apply_async.call_count)  # Including the call made to set task_id
+        mock_celery_task.apply_async.assert_called_with(
+            kwargs={"job_id": job.id, "output_id": job.outputs.get(name="360p").id}, queue="transcoding"
+        )
+
+    def test_smallest_output_should_be_kept_even_if_larger_than_input(self):
+        job = self.create_job(settings=self.job_settings, probe={"width": 320, "height": 180})
+        job.create_outputs()
+
+        self.assertEqual(Output.NOT_STARTED, job.outputs.get(name="360p").status)
+
+    def test_shared_audio_should_be_encoded_once_in_audio_only_output(self):
+        job_settings = dict(self.job_settings, shared_audio=True)
+        job_settings["outputs"].append(
+            {
+                "name": "720p",
+                "audio": {"codec": "aac", "bitrate": 192000},
+                "video": {"codec": "h264", "width": 1280, "height": 720, "preset": "faster", "bitrate": 2500000},
+            }
+        )
+        job = self.create_job(settings=job_settings, probe={"duration": 600, "audio_codec": "aac"})
+        job.create_outputs()
+
+        audio_output = job.outputs.get(is_audio_only=True)
+        self.assertEqual(3, job.outputs.count())
+        self.assertEqual(192000, audio_output.audio_bitrate)
+        self.assertNotIn("video", audio_output.settings["output"])
+
+    def test_shared_audio_should_not_be_created_for_input_without_audio(self):
+        job = self.create_job(settings=dict(self.job_settings, shared_audio=True), probe={"duration": 600})
+        job.create_outputs()
+
+        self.assertFalse(job.outputs.filter(is_audio_only=True).exists())
+
+    def test_shared_audio_should_ignore_outputs_without_audio_bitrate(self):
+        job = self.create_job(settings=dict(self.job_settings, shared_audio=True), probe={"duration": 600})
+        output_ladder = [
+            {"name": "360p", "audio": {"codec": "aac", "bitrate": None}},
+            {"name": "720p", "audio": {"codec": "aac", "bitrate": 192000}},
+        ]
+        audio_output = job.create_audio_output(dict(job.settings), output_ladder, set())
+
+        self.assertEqual(192000, audio_output.audio_bitrate)
@@ -0,0 +1,55 @@
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+from django.utils.timezone import now
+
+from apps.jobs.models import Job, Output
+from apps.jobs.preset_selection import PresetSelector
+from .mixins import Mixin
+
+
+class TestPresetSelector(Mixin, TestCase):
+    video = {"codec": "h264", "width": 1280, "height": 720, "preset": "faster", "bitrate": 1500000}
+
+    def create_encoded_output(self, preset, encoding_time):
+        job = self.create_job(probe={"duration": 600})
+        start_time = now() - timedelta(hours=1)
+        Output.objects.filter(id=self.create_output(job).id).update(
+            status=Output.COMPLETED,
+            video_encoder="h264",
+            video_preset=preset,
+            start_time=start_time,
+            end_time=start_time + timedelta(seconds=encoding_time),
+        )
+
+    def test_preset_of_output_should_be_kept_by_fixed_policy(self):
+        self.create_encoded_output("medium", 600)
+        job = self.create_job(settings={"preset_policy": Job.FIXED_PRESET})
+
+        self.assertEqual("faster", PresetSelector(job).select(self.video, 600))
+
+    def test_preset_of_output_should_be_kept_without_history(self):
+        job = self.create_job(settings={"preset_policy": Job.SPEED_PRESET})
+
+        self.assertEqual("faster", PresetSelector(job).select(self.video, 600))
+
+    def test_slowest_preset_encoding_in_realtime_should_be_picked_by_speed_policy(self):
+        self.create_encoded_output("medium", 600)
+        job = self.create_job(settings={"preset_policy": Job.SPEED_PRESET})
+
+        self.assertEqual("medium", PresetSelector(job).select(self.video, 600))
+
+    def test_faster_preset_should_be_picked_for_close_deadline(self):
+        self.create_encoded_output("medium", 600)
+        job = self.create_job(deadline=now() + timedelta(seconds=160))
+
+        self.assertEqual(Job.DEADLINE_PRESET, job.preset_policy)
+        self.assertEqual("veryfast", PresetSelector(job).select(self.video, 600))
+
+    @override_settings(TRANSCODER_BACKLOG_THRESHOLD=0)
+    def test_next_faster_preset_should_be_picked_when_cluster_is_behind(self):
+        self.create_encoded_output("medium", 600)
+        self.create_output(self.create_job(status=Job.QUEUED))
+        job = self.create_job(settings={"preset_policy": Job.SPEED_PRESET})
+
+        self.assertEqual("fast", PresetSelector(job).select(self.video, 600))
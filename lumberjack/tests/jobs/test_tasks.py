@@ -1,25 +1,83 @@
 import json
+import os
+import shutil
+import tempfile
 
 import boto3
 import mock
 import responses
-from celery.exceptions import SoftTimeLimitExceeded
+from botocore.exceptions import ClientError
+from celery.exceptions import Retry, SoftTimeLimitExceeded
 from moto import mock_s3
 from requests.exceptions import ConnectionError
 from smart_open import parse_uri
 
 from django.conf import settings
 from django.core.serializers.json import DjangoJSONEncoder
-from django.test import TestCase
+from django.test import TestCase, override_settings
 
 from apps.api.v1.jobs.serializers import JobSerializer
 from apps.executors.base import Status
-from apps.jobs.models import Job, Output
-from apps.jobs.runnables import VideoTranscoderRunnable, ManifestGeneratorRunnable
-from apps.jobs.tasks import PostDataToWebhookTask
+from apps.executors.resources import CPUBudget
+from apps.ffmpeg import clients
+from apps.ffmpeg.playlist import MediaPlaylist
+from apps.jobs.models import Job, Output, OutputChunk
+from apps.jobs.runnables import (
+    InputProbeRunnable,
+    VideoTranscoderRunnable,
+    LadderTranscoderRunnable,
+    ChunkPlannerRunnable,
+    ChunkTranscoderRunnable,
+    OutputPackagerRunnable,
+    ManifestGeneratorRunnable,
+)
+from apps.jobs.tasks import PostDataToWebhookTask, VideoTranscoderTask
 from .mixins import Mixin
 
 
+class TestInputProbe(Mixin, TestCase):
+    @mock.patch("apps.jobs.models.Job.start_outputs")
+    @mock.patch("apps.jobs.runnables.get_input_fingerprint", return_value='"abc":1024')
+    @mock.patch("apps.jobs.runnables.InputProbe")
+    def test_probe_should_be_saved_on_job_before_starting_outputs(self, mock_probe, mock_fingerprint, mock_start):
+        mock_probe().run.return_value = {"duration": 600}
+        InputProbeRunnable(job_id=self.job.id, queue="transcoding").run()
+
+        self.job.refresh_from_db()
+        self.assertEqual({"duration": 600, "fingerprint": '"abc":1024'}, self.job.probe)
+        mock_start.assert_called_with("transcoding", None)
+
+    @mock.patch("apps.jobs.models.Job.start_outputs")
+    @mock.patch("apps.jobs.runnables.get_input_fingerprint", return_value='"abc":1024')
+    @mock.patch("apps.jobs.runnables.InputProbe")
+    def test_probe_of_unchanged_input_should_be_reused(self, mock_probe, mock_fingerprint, mock_start):
+        self.create_job(probe={"duration": 300, "fingerprint": '"abc":1024'})
+        InputProbeRunnable(job_id=self.job.id).run()
+
+        self.job.refresh_from_db()
+        self.assertEqual(300, self.job.probe["duration"])
+        mock_probe().run.assert_not_called()
+
+    @mock.patch("apps.jobs.runnables.get_input_fingerprint", return_value=None)
+    @mock.patch("apps.jobs.runnables.InputProbe")
+    def test_job_should_be_errored_if_input_cannot_be_probed(self, mock_probe, mock_fingerprint):
+        mock_probe().run.side_effect = ValueError("Invalid data found when processing input")
+        InputProbeRunnable(job_id=self.job.id).run()
+
+        self.job.refresh_from_db()
+        self.assertEqual(Job.ERROR, self.job.status)
+
+    @mock.patch("apps.jobs.models.Job.notify_webhook")
+    @mock.patch("apps.jobs.runnables.get_input_fingerprint")
+    def test_job_should_be_errored_if_input_is_missing_from_s3(self, mock_fingerprint, mock_notify_webhook):
+        mock_fingerprint.side_effect = ClientError({"Error": {"Code": "404"}}, "HeadObject")
+        InputProbeRunnable(job_id=self.job.id).run()
+
+        self.job.refresh_from_db()
+        self.assertEqual(Job.ERROR, self.job.status)
+        mock_notify_webhook.assert_called_once()
+
+
 class TestVideoTranscoder(Mixin, TestCase):
     @property
     def output_settings(self):
@@ -61,10 +119,93 @@ class TestVideoTranscoder(Mixin, TestCase):
     def test_runnable_should_run_ffmpeg_manager(self, mock_ffmpeg_manager, mock_controller, mock_ouptput_factory):
         mock_ffmpeg_manager().check_status.return_value = Status.Finished
         mock_controller().check_status.return_value = Status.Finished
+        mock_controller().is_output_errored = False
         self.video_transcoder.do_run()
 
         self.assertTrue(mock_ffmpeg_manager.called)
 
+    @mock.patch("apps.jobs.runnables.CPUBudget.detect", return_value=CPUBudget(cpus=list(range(8)), concurrency=2))
+    @mock.patch("apps.jobs.runnables.LumberjackController")
+    def test_threads_allocated_to_output_should_be_recorded(self, mock_controller, mock_detect):
+        mock_controller().check_status.return_value = Status.Finished
+        mock_controller().is_output_errored = False
+        self.video_transcoder.do_run()
+
+        self.output.refresh_from_db()
+        self.assertEqual(4, self.output.threads)
+        self.assertEqual(4, mock_controller().start.call_args[0][0]["threads"])
+
+    def test_resumed_transcode_should_start_after_checkpointed_segments(self):
+        self.output.checkpoint = {
+            "segments": [
+                {"uri": "video_0.ts", "duration": 10.0, "tags": []},
+                {"uri": "video_1.ts", "duration": 4.5, "tags": []},
+            ]
+        }
+        self.video_transcoder.cpu_budget = CPUBudget(cpus=[0])
+        controller = mock.MagicMock()
+        self.video_transcoder.start_controller(controller)
+
+        self.assertEqual({"start": 14.5, "start_number": 2}, controller.start.call_args[0][0]["resume"])
+
+    def test_segments_uploaded_and_removed_from_disk_should_be_checkpointed(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        os.makedirs(directory + "/1232/360p")
+        segments = [{"uri": "video_%d.ts" % index, "duration": 10.0, "tags": []} for index in range(3)]
+        with open(directory + "/1232/360p/video.m3u8", "w") as playlist:
+            playlist.write(MediaPlaylist(segments=segments).dumps(is_ended=False))
+        open(directory + "/1232/360p/video_2.ts", "w").close()
+        self.video_transcoder.transcoder_settings = self.output_settings
+        self.video_transcoder.resumed_segments = []
+
+        with override_settings(TRANSCODED_VIDEOS_PATH=directory):
+            self.video_transcoder.update_checkpoint()
+
+        self.output.refresh_from_db()
+        self.assertEqual(segments[:2], self.output.checkpoint["segments"])
+
+    def test_only_segments_saved_to_storage_should_be_checkpointed_for_direct_upload(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        os.makedirs(directory + "/1232/360p")
+        segments = [{"uri": "video_%d.ts" % index, "duration": 10.0, "tags": []} for index in range(3)]
+        with open(directory + "/1232/360p/video.m3u8", "w") as playlist:
+            playlist.write(MediaPlaylist(segments=segments).dumps(is_ended=False))
+        self.video_transcoder.transcoder_settings = self.output_settings
+        self.video_transcoder.resumed_segments = []
+
+        with override_settings(TRANSCODED_VIDEOS_PATH=directory):
+            self.video_transcoder.update_checkpoint({"360p/video_0.ts", "360p/video_2.ts"})
+
+        self.output.refresh_from_db()
+        self.assertEqual(segments[:1], self.output.checkpoint["segments"])
+
+    @override_settings(PROGRESSIVE_MIN_SEGMENTS=2)
+    @mock.patch("apps.jobs.runnables.ManifestGeneratorRunnable")
+    @mock.patch("apps.jobs.runnables.OutputFileFactory")
+    def test_uploaded_segments_of_progressive_output_should_be_published(self, mock_output_factory, mock_manifest):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        os.makedirs(directory + "/1232/360p")
+        segments = [{"uri": "video_%d.ts" % index, "duration": 10.0, "tags": []} for index in range(3)]
+        with open(directory + "/1232/360p/video.m3u8", "w") as playlist:
+            playlist.write(MediaPlaylist(segments=segments).dumps(is_ended=False))
+        open(directory + "/1232/360p/video_2.ts", "w").close()
+        self.output.settings = dict(self.output_settings, progressive=True)
+        self.video_transcoder.transcoder_settings = self.output.settings
+        self.video_transcoder.resumed_segments = []
+
+        with override_settings(TRANSCODED_VIDEOS_PATH=directory):
+            self.video_transcoder.update_checkpoint()
+
+        published_playlist = MediaPlaylist.loads(mock_output_factory.create().save_text.call_args[0][0])
+        self.assertEqual(MediaPlaylist.EVENT, published_playlist.playlist_type)
+        self.assertFalse(published_playlist.is_ended)
+        self.assertEqual(segments[:2], published_playlist.segments)
+        mock_manifest.assert_called_with(job_id=self.output.job.id, is_progressive=True)
+        self.assertEqual({"is_progressive": True}, mock_output_factory.create().save_text.call_args[1])
+
     def test_update_progress_should_update_progress_of_output_and_job(self):
         self.video_transcoder.update_progress(20)
 
@@ -107,6 +248,7 @@ class TestVideoTranscoder(Mixin, TestCase):
         self, mock_controller, mock_webhook, mock_manifest_generator
     ):
         mock_controller().check_status.return_value = Status.Finished
+        mock_controller().is_output_errored = False
         self.job.webhook_url = "google.com"
         self.job.save()
         self.video_transcoder.do_run()
@@ -115,17 +257,181 @@ class TestVideoTranscoder(Mixin, TestCase):
         self.assertEqual(self.job.status, Job.COMPLETED)
         mock_webhook.apply_async.assert_called_with(args=(JobSerializer(instance=self.job).data, "google.com"))
 
+    @mock.patch("apps.jobs.runnables.ManifestGeneratorRunnable")
+    @mock.patch("apps.jobs.runnables.LumberjackController")
+    @mock.patch("apps.jobs.models.app.control")
+    def test_output_should_be_errored_if_its_files_fail_to_be_saved_on_stopping(
+        self, mock_celery_control, mock_controller, mock_manifest_generator
+    ):
+        mock_controller().check_status.return_value = Status.Finished
+        mock_controller().is_output_errored = True
+        self.video_transcoder.do_run()
+
+        self.output.refresh_from_db()
+        self.job.refresh_from_db()
+        self.assertEqual(Output.ERROR, self.output.status)
+        self.assertEqual(Job.ERROR, self.job.status)
+        mock_manifest_generator.assert_not_called()
+
     @mock.patch("apps.jobs.runnables.ManifestGeneratorRunnable")
     @mock.patch("apps.jobs.runnables.LumberjackController")
     def test_manifest_generator_should_be_called_on_transcoding_completion(
         self, mock_controller, mock_manifest_generator
     ):
         mock_controller().check_status.return_value = Status.Finished
+        mock_controller().is_output_errored = False
         self.video_transcoder.do_run()
 
         mock_manifest_generator.assert_called()
 
 
+class TestLadderTranscoder(Mixin, TestCase):
+    def setUp(self) -> None:
+        self.job.settings = {"id": "1232", "input": "file://abc", "format": "HLS", "destination": "file:///abc"}
+        self.job.save()
+        for name in ["360p", "720p"]:
+            output = self.create_output(self.job)
+            output.name = name
+            output.settings = {"output": {"name": name, "url": "file:///abc/" + name}}
+            output.save()
+        self.ladder_transcoder = LadderTranscoderRunnable(job_id=self.job.id, task_id=13)
+
+    @mock.patch("apps.jobs.runnables.ManifestGeneratorRunnable")
+    @mock.patch("apps.jobs.runnables.LumberjackController")
+    def test_runnable_should_transcode_all_outputs_with_single_controller(self, mock_controller, mock_manifest):
+        mock_controller().check_status.return_value = Status.Finished
+        mock_controller().is_output_errored = False
+        self.ladder_transcoder.do_run()
+
+        ladder_settings = mock_controller().start_ladder.call_args[0][0]
+        self.assertEqual(["360p", "720p"], [output["name"] for output in ladder_settings["outputs"]])
+        self.assertFalse(self.job.outputs.exclude(status=Output.COMPLETED).exists())
+        mock_manifest.assert_called()
+
+    def test_metrics_of_each_output_should_be_merged_into_its_stored_metrics(self):
+        self.job.outputs.filter(name="360p").update(metrics={"transcoder_speed": 2.0})
+        controller = mock.MagicMock()
+        controller.get_output_metrics.side_effect = lambda name: {"upload_retries": {"360p": 1, "720p": 2}[name]}
+        self.ladder_transcoder.initialize()
+        self.ladder_transcoder.save_metrics(controller)
+
+        self.assertEqual({"transcoder_speed": 2.0, "upload_retries": 1}, self.job.outputs.get(name="360p").metrics)
+        self.assertEqual({"upload_retries": 2}, self.job.outputs.get(name="720p").metrics)
+
+    def test_update_progress_should_update_progress_of_all_outputs(self):
+        self.ladder_transcoder.initialize()
+        self.ladder_transcoder.update_progress(20)
+
+        self.job.refresh_from_db()
+        self.assertEqual(20, self.job.progress)
+        self.assertFalse(self.job.outputs.exclude(progress=20).exists())
+
+
+class TestChunkedTranscoding(Mixin, TestCase):
+    def setUp(self) -> None:
+        self.job.settings = {"format": "HLS", "execution_mode": Job.CHUNKED}
+        self.job.save()
+        self.output.settings = {
+            "id": self.job.id.hex,
+            "format": "HLS",
+            "output": {"name": "720p", "url": "s3://bucket/output_key/720p"},
+        }
+        self.output.save()
+
+    def chunk_playlist(self, start_number):
+        return (
+            "#EXTM3U\n#EXT-X-VERSION:3\n#EXT-X-TARGETDURATION:10\n#EXT-X-MEDIA-SEQUENCE:{0}\n"
+            "#EXTINF:10.000000,\nvideo_{0}.ts\n#EXT-X-ENDLIST\n".format(start_number)
+        )
+
+    @mock.patch("apps.jobs.tasks.ChunkTranscoderTask")
+    def test_planner_should_start_task_for_every_chunk(self, mock_chunk_task):
+        mock_chunk_task.apply_async().task_id = "4c1761d8-c0cd-4068-a997-ccab60592943"
+        self.job.probe = {"duration": 725.5}
+        self.job.save()
+        ChunkPlannerRunnable(job_id=self.job.id, output_id=self.output.id, queue="transcoding").run()
+
+        chunks = self.output.chunks.all()
+        self.assertEqual([0, 300, 600], [chunk.start for chunk in chunks])
+        self.assertEqual([0, 30, 60], [chunk.start_number for chunk in chunks])
+        self.assertEqual(125.5, chunks[2].duration)
+        self.assertEqual(4, mock_chunk_task.apply_async.call_count)
+
+    @mock.patch("apps.jobs.runnables.PresetSelector")
+    @mock.patch("apps.jobs.tasks.ChunkTranscoderTask")
+    def test_planner_should_pick_preset_once_for_every_chunk(self, mock_chunk_task, mock_selector):
+        mock_chunk_task.apply_async().task_id = "4c1761d8-c0cd-4068-a997-ccab60592943"
+        mock_selector().select.return_value = "slow"
+        self.job.probe = {"duration": 725.5}
+        self.job.save()
+        self.output.settings["output"]["video"] = {"codec": "h264", "height": 720, "preset": "faster"}
+        self.output.save()
+        ChunkPlannerRunnable(job_id=self.job.id, output_id=self.output.id, queue="transcoding").run()
+
+        mock_selector().select.assert_called_once_with(mock.ANY, 725.5)
+        self.output.refresh_from_db()
+        self.assertEqual("slow", self.output.video_preset)
+        for chunk in self.output.chunks.all():
+            self.assertEqual("slow", chunk.settings["output"]["video"]["preset"])
+
+    @mock.patch("apps.jobs.runnables.transaction.on_commit", side_effect=lambda callback: callback())
+    @mock.patch("apps.jobs.runnables.ChunkTranscoderRunnable.start_packager_task")
+    @mock.patch("apps.jobs.runnables.ChunkTranscoderRunnable.read_playlist", return_value="")
+    @mock.patch("apps.jobs.runnables.LumberjackController")
+    def test_last_completed_chunk_should_start_packaging(
+        self, mock_controller, mock_read_playlist, mock_packager, mock_on_commit
+    ):
+        mock_controller().check_status.return_value = Status.Finished
+        mock_controller().is_output_errored = False
+        chunks = self.output.create_chunks(20, 10, 10)
+        for chunk in chunks:
+            ChunkTranscoderRunnable(job_id=self.job.id, output_id=self.output.id, chunk_id=chunk.id).run()
+
+        self.assertFalse(self.output.chunks.exclude(status=OutputChunk.COMPLETED).exists())
+        self.assertEqual(1, mock_packager.call_count)
+
+    @mock.patch("apps.jobs.runnables.ManifestGeneratorRunnable")
+    @mock.patch("apps.jobs.runnables.OutputFileFactory")
+    def test_packager_should_upload_stitched_playlist_and_complete_output(self, mock_output_factory, mock_manifest):
+        for chunk in self.output.create_chunks(20, 10, 10):
+            chunk.playlist = self.chunk_playlist(chunk.start_number)
+            chunk.save()
+        OutputPackagerRunnable(job_id=self.job.id, output_id=self.output.id).run()
+
+        mock_output_factory.create.assert_any_call("s3://bucket/output_key/720p/video.m3u8")
+        uploaded_content = mock_output_factory.create().save_text.call_args[0][0]
+        self.assertIn("video_0.ts\n#EXTINF:10.000000,\nvideo_1.ts\n#EXT-X-ENDLIST", uploaded_content)
+        self.output.refresh_from_db()
+        self.assertEqual(Output.COMPLETED, self.output.status)
+        mock_manifest.assert_called()
+
+    @mock.patch("apps.jobs.runnables.ManifestGeneratorRunnable")
+    @mock.patch("apps.jobs.runnables.OutputFileFactory")
+    def test_packager_should_delete_chunk_playlists_once_stitched(self, mock_output_factory, mock_manifest):
+        for chunk in self.output.create_chunks(20, 10, 10):
+            chunk.playlist = self.chunk_playlist(chunk.start_number)
+            chunk.save()
+        OutputPackagerRunnable(job_id=self.job.id, output_id=self.output.id).run()
+
+        mock_output_factory.create.assert_any_call("s3://bucket/output_key/720p")
+        deleted_names = mock_output_factory.create().delete_files.call_args[0][0]
+        self.assertEqual(["chunk_0.m3u8", "chunk_1.m3u8"], sorted(deleted_names))
+
+    @mock.patch("apps.jobs.runnables.ManifestGeneratorRunnable")
+    @mock.patch("apps.jobs.runnables.OutputFileFactory")
+    def test_packager_should_complete_output_when_chunk_playlists_are_not_deleted(
+        self, mock_output_factory, mock_manifest
+    ):
+        mock_output_factory.create().delete_files.side_effect = OSError
+        for chunk in self.output.create_chunks(20, 10, 10):
+            chunk.playlist = self.chunk_playlist(chunk.start_number)
+            chunk.save()
+        OutputPackagerRunnable(job_id=self.job.id, output_id=self.output.id).run()
+
+        self.output.refresh_from_db()
+        self.assertEqual(Output.COMPLETED, self.output.status)
+
+
 class TestManifestGenerator(Mixin, TestCase):
     def setUp(self) -> None:
         self.job.settings = {"format": "HLS"}
@@ -147,6 +453,13 @@ class TestManifestGenerator(Mixin, TestCase):
 
         self.assertDictEqual(self.media_details[0], media_details[0])
 
+    def test_skipped_outputs_should_not_be_listed_in_manifest(self):
+        skipped_output = self.create_output()
+        skipped_output.status = Output.SKIPPED
+        skipped_output.save()
+
+        self.assertEqual(1, len(self.manifest_generator.get_media_details()))
+
     def test_generate_manifest_content_should_generate_hls_content(self):
         self.manifest_generator.generate_manifest_content()
 
@@ -156,6 +469,47 @@ class TestManifestGenerator(Mixin, TestCase):
         )
         self.assertEqual(expected_manifest_content, self.manifest_generator.manifest_content)
 
+    def test_shared_audio_should_be_listed_as_audio_group(self):
+        self.output
+        audio_output = self.create_output()
+        audio_output.name = "audio"
+        audio_output.is_audio_only = True
+        audio_output.save()
+        self.manifest_generator.generate_manifest_content()
+
+        expected_manifest_content = (
+            '#EXTM3U\n#EXT-X-VERSION:3\n#EXT-X-MEDIA:TYPE=AUDIO,GROUP-ID="audio",NAME="audio",'
+            'DEFAULT=YES,AUTOSELECT=YES,URI="audio/video.m3u8"\n\n'
+            '#EXT-X-STREAM-INF:BANDWIDTH=1500000,RESOLUTION=1280x720,AUDIO="audio"\n720p/video.m3u8\n\n'
+        )
+        self.assertEqual(expected_manifest_content, self.manifest_generator.manifest_content)
+
+    @override_settings(PROGRESSIVE_MIN_SEGMENTS=2)
+    def test_progressive_manifest_should_list_outputs_with_enough_uploaded_segments(self):
+        segment = {"uri": "video_0.ts", "duration": 10.0, "tags": []}
+        self.output.status = Output.PROCESSING
+        self.output.checkpoint = {"segments": [segment, segment]}
+        self.output.save()
+        pending_output = self.create_output()
+        pending_output.status = Output.PROCESSING
+        pending_output.checkpoint = {"segments": [segment]}
+        pending_output.save()
+        self.manifest_generator.is_progressive = True
+
+        self.assertTrue(self.manifest_generator.is_playable())
+        self.assertEqual([self.output], list(self.manifest_generator.get_outputs()))
+
+    def test_progressive_manifest_should_wait_for_shared_audio(self):
+        self.output.status = Output.COMPLETED
+        self.output.save()
+        audio_output = self.create_output()
+        audio_output.is_audio_only = True
+        audio_output.status = Output.PROCESSING
+        audio_output.save()
+        self.manifest_generator.is_progressive = True
+
+        self.assertFalse(self.manifest_generator.is_playable())
+
     def test_upload(self):
         self.start_s3_mock()
         self.manifest_generator.generate_manifest_content()
@@ -164,6 +518,17 @@ class TestManifestGenerator(Mixin, TestCase):
         uploaded_content = self.get_file_from_s3(self.job.output_url).read().decode("utf-8")
         self.assertEqual(uploaded_content, self.manifest_generator.manifest_content)
 
+    @mock.patch("apps.jobs.runnables.transaction.on_commit")
+    @mock.patch("apps.jobs.runnables.OutputFileFactory")
+    def test_manifest_should_be_uploaded_once_transaction_is_committed(self, mock_output_factory, mock_on_commit):
+        self.manifest_generator.run()
+
+        mock_output_factory.create().save_text.assert_not_called()
+        mock_on_commit.call_args[0][0]()
+        mock_output_factory.create().save_text.assert_called_once_with(
+            self.manifest_generator.manifest_content, is_progressive=False
+        )
+
     def test_file_name_should_be_generated_for_relative_output_url(self):
         self.start_s3_mock()
         self.job.output_url = "s3://bucket/output_key/"
@@ -176,8 +541,11 @@ class TestManifestGenerator(Mixin, TestCase):
         self.assertEqual(uploaded_content, self.manifest_generator.manifest_content)
 
     def start_s3_mock(self):
+        clients.clear()
+        self.addCleanup(clients.clear)
         s3_mock = mock_s3()
         s3_mock.start()
+        self.addCleanup(s3_mock.stop)
         conn = boto3.resource("s3", region_name=settings.AWS_S3_REGION_CODE)
         conn.create_bucket(Bucket="bucket")
 
@@ -187,6 +555,18 @@ class TestManifestGenerator(Mixin, TestCase):
         return conn.Object(s3_path.bucket_id, s3_path.key_id).get()["Body"]
 
 
+class TestTranscoderTask(Mixin, TestCase):
+    @mock.patch("apps.jobs.tasks.VideoTranscoderTask.retry", side_effect=Retry)
+    @mock.patch("apps.jobs.tasks.is_disk_available", return_value=False)
+    @mock.patch("apps.jobs.tasks.VideoTranscoderRunnable")
+    def test_output_should_not_be_admitted_without_free_disk_space(self, mock_runnable, mock_disk, mock_retry):
+        with self.assertRaises(Retry):
+            VideoTranscoderTask.run(job_id=self.job.id, output_id=self.output.id)
+
+        mock_runnable.assert_not_called()
+        self.assertIsNone(mock_retry.call_args[1]["max_retries"])
+
+
 class TestPostDataToWebhook(Mixin, TestCase):
     @property
     def url(self):